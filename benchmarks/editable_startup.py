@@ -0,0 +1,101 @@
+"""Measure interpreter startup & import time with many editable installs
+
+This makes a number of small projects, installs them all in editable mode into
+a fresh virtualenv, and times running Python in that environment. It compares
+.pth files (``flit install --pth-file``) with import hooks
+(``flit install --import-hook``).
+
+Run from the root of the flit repository::
+
+    python benchmarks/editable_startup.py --projects 80
+"""
+import argparse
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+import venv
+
+from flit import find_python_executable
+from flit.install import Installer
+
+PYPROJECT = """\
+[build-system]
+requires = ["flit_core >=4,<5"]
+build-backend = "flit_core.buildapi"
+
+[project]
+name = "{name}"
+version = "0.1"
+description = "Benchmark project {i}"
+"""
+
+MODES = {
+    'pth': {'pth': True},
+    'import-hook': {'import_hook': True},
+}
+
+
+def make_projects(root: Path, n):
+    ini_paths = []
+    for i in range(n):
+        proj = root / f'proj{i}'
+        pkg = proj / f'bench_pkg{i}'
+        pkg.mkdir(parents=True)
+        (pkg / '__init__.py').write_text(f'"""Package {i}"""\n', 'utf-8')
+        (proj / 'pyproject.toml').write_text(
+            PYPROJECT.format(name=f'bench-pkg{i}', i=i), 'utf-8'
+        )
+        ini_paths.append(proj / 'pyproject.toml')
+    return ini_paths
+
+
+def time_run(python, code, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([python, '-c', code], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--projects', type=int, default=50)
+    ap.add_argument('--repeat', type=int, default=20)
+    args = ap.parse_args(argv)
+
+    # We're only installing into a throwaway virtualenv
+    os.environ.setdefault('FLIT_ROOT_INSTALL', '1')
+
+    n = args.projects
+    timings = {
+        'startup': 'pass',
+        'import all projects': '; '.join(f'import bench_pkg{i}' for i in range(n)),
+        'failed import': 'exec("try:\\n import no_such_module\\nexcept ImportError: pass")',
+    }
+
+    with TemporaryDirectory() as td:
+        td = Path(td)
+        ini_paths = make_projects(td / 'projects', n)
+
+        print(f"{n} editable projects, median of {args.repeat} runs (ms)")
+        print(f"{'mode':<12}" + ''.join(f"{name:>22}" for name in timings))
+        for mode, kwargs in MODES.items():
+            env_dir = td / f'env-{mode}'
+            venv.create(env_dir, with_pip=False)
+            python = find_python_executable(str(env_dir))
+            for ini_path in ini_paths:
+                Installer.from_ini_path(
+                    ini_path, python=python, user=False, deps='none', **kwargs
+                ).install_directly()
+
+            results = [time_run(python, code, args.repeat) for code in timings.values()]
+            print(f"{mode:<12}" + ''.join(f"{t * 1000:>22.1f}" for t in results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""Benchmarks of how flit scales with the size & shape of a project
+
+This generates a synthetic project (see projects.py for the options), and
+times building it with each PEP 517 hook, building wheels & sdists directly,
+listing files from git, matching sdist include/exclude patterns, and
+installing it. Each run is a separate process, so the peak memory use is
+measured too, and the time is broken down using flit's tracing spans.
+
+Results can be saved as JSON and compared with a baseline; see __main__.py.
+"""
@@ -0,0 +1,198 @@
+"""Run the scaling benchmarks, or compare two sets of results
+
+Run from the root of the flit repository::
+
+    python -m benchmarks.scaling run --shape medium -o results.json
+    python -m benchmarks.scaling run --shape large --files 50000 --baseline base.json
+    python -m benchmarks.scaling compare base.json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+import venv
+
+from flit import find_python_executable
+
+from .projects import SHAPES, get_shape, make_project
+from .results import summarise, save, load, compare, print_comparison
+from .worker import CASES
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+#: A frontend building a wheel calls these hooks, each in a new process
+HOOK_SEQUENCE = [
+    'hook:get_requires_for_build_wheel',
+    'hook:prepare_metadata_for_build_wheel',
+    'hook:build_wheel',
+]
+
+
+def worker_env():
+    env = os.environ.copy()
+    # Benchmark the flit & flit_core in this repository
+    paths = [str(REPO_ROOT), str(REPO_ROOT / 'flit_core')]
+    if env.get('PYTHONPATH'):
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    env['FLIT_ROOT_INSTALL'] = '1'  # We only install into a throwaway venv
+    env.pop('FLIT_TRACE', None)
+    env.pop('FLIT_BUILD_SERVER', None)
+    return env
+
+
+def run_worker(case, project, scratch_root, python=None):
+    """Run one case in a new process; returns its results"""
+    scratch = Path(scratch_root, f'run-{time.perf_counter_ns()}')
+    scratch.mkdir()
+    cmd = [sys.executable, '-m', 'benchmarks.scaling.worker', case,
+           str(project), str(scratch)] + ([python] if python else [])
+    start = time.perf_counter()
+    out = subprocess.run(cmd, env=worker_env(), cwd=str(REPO_ROOT), check=True,
+                         stdout=subprocess.PIPE).stdout
+    result = json.loads(out)
+    result['wall'] = time.perf_counter() - start
+    return result
+
+
+def run_hook_sequence(project, scratch_root):
+    """Call the hooks to build a wheel as a frontend would"""
+    runs = [run_worker(case, project, scratch_root) for case in HOOK_SEQUENCE]
+    rss = [r['peak_rss'] for r in runs if r['peak_rss'] is not None]
+    spans = {}
+    for r in runs:
+        for name, t in r['spans'].items():
+            spans[name] = spans.get(name, 0) + t
+    return {
+        'time': sum(r['time'] for r in runs),
+        'wall': sum(r['wall'] for r in runs),
+        'peak_rss': max(rss) if rss else None,
+        'spans': spans,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=str(REPO_ROOT), check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_run(args):
+    shape = get_shape(
+        args.shape, files=args.files, size_median=args.size_median,
+        depth=args.depth, data_files=args.data_files, patterns=args.patterns,
+        commits=args.commits,
+    )
+    cases = args.cases or sorted(CASES) + ['hook sequence']
+
+    with TemporaryDirectory() as td:
+        td = Path(td)
+        print(f"Generating project: {shape}")
+        t0 = time.perf_counter()
+        files = make_project(td / 'project', shape, seed=args.seed)
+        print(f"{len(files)} files in {time.perf_counter() - t0:.1f} s")
+
+        python = None
+        if 'install' in cases:
+            venv.create(td / 'env', with_pip=False)
+            python = find_python_executable(str(td / 'env'))
+
+        results = {}
+        for case in cases:
+            runs = []
+            for _ in range(args.repeat):
+                if case == 'hook sequence':
+                    r = run_hook_sequence(td / 'project', td)
+                else:
+                    r = run_worker(case, td / 'project', td, python)
+                runs.append(r)
+            if runs[0].get('skipped'):
+                print(f"{case:<40} skipped: {runs[0]['skipped']}")
+                continue
+            results[case] = summarise(runs)
+            rss = results[case]['peak_rss']
+            print(f"{case:<40}{results[case]['median'] * 1000:>10.1f} ms"
+                  f"{results[case]['wall_median'] * 1000:>10.1f} ms wall"
+                  + (f"{rss / 1e6:>10.1f} MB" if rss else ''))
+
+    data = {
+        'meta': {
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': sys.version,
+            'platform': platform.platform(),
+            'shape_name': args.shape,
+            'shape': shape.as_dict(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        save(args.output, data)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        rows = compare(load(args.baseline), data, args.threshold)
+        print()
+        print_comparison(rows)
+        if any(r[-1] for r in rows):
+            return 1
+    return 0
+
+
+def cmd_compare(args):
+    baseline, current = load(args.baseline), load(args.current)
+    if baseline['meta']['shape'] != current['meta']['shape']:
+        print("Warning: the results are for differently shaped projects")
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows)
+    return 1 if any(r[-1] for r in rows) else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m benchmarks.scaling')
+    subparsers = ap.add_subparsers(dest='cmd', required=True)
+
+    run = subparsers.add_parser('run', help="Run benchmarks on a synthetic project")
+    run.add_argument('--shape', choices=sorted(SHAPES), default='small')
+    # These override parts of the chosen shape
+    run.add_argument('--files', type=int)
+    run.add_argument('--size-median', type=int)
+    run.add_argument('--depth', type=int)
+    run.add_argument('--data-files', type=int)
+    run.add_argument('--patterns', type=int)
+    run.add_argument('--commits', type=int)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--cases', nargs='+',
+                     choices=sorted(CASES) + ['hook sequence'])
+    run.add_argument('-o', '--output', help="Save results as JSON")
+    run.add_argument('--baseline', help="Compare with results saved earlier")
+
+    cmp = subparsers.add_parser('compare', help="Compare two sets of results")
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+
+    for p in (run, cmp):
+        p.add_argument('--threshold', type=float, default=0.1,
+                       help="Fraction slower or bigger to count as a regression")
+
+    args = ap.parse_args(argv)
+    if args.cmd == 'run':
+        return cmd_run(args)
+    else:
+        return cmd_compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
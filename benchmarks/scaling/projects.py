@@ -0,0 +1,160 @@
+"""Generate synthetic projects of a given shape to benchmark flit on"""
+from dataclasses import dataclass, asdict, replace
+import math
+from pathlib import Path
+import random
+import shutil
+import subprocess
+
+PYPROJECT = """\
+[build-system]
+requires = ["flit_core >=4,<5"]
+build-backend = "flit_core.buildapi"
+
+[project]
+name = "bench-scaling"
+version = "1.0"
+description = "Synthetic project for benchmarking flit"
+requires-python = ">=3.8"
+dependencies = ["requests"]
+
+[project.scripts]
+bench-scaling = "bench_scaling:main"
+{data_dir}
+[tool.flit.sdist]
+include = [{includes}]
+exclude = [{excludes}]
+"""
+
+
+@dataclass(frozen=True)
+class Shape:
+    """What a synthetic project looks like"""
+    #: Number of files in the package
+    files: int = 200
+    #: Median file size in bytes; sizes are log-normally distributed
+    size_median: int = 4000
+    #: Spread of file sizes (sigma of the log-normal distribution)
+    size_sigma: float = 1.0
+    #: Maximum depth of subpackages
+    depth: int = 3
+    #: Number of files in the external data directory (0 for none)
+    data_files: int = 0
+    #: Number of sdist include patterns (each has an exclude pattern too)
+    patterns: int = 0
+    #: Number of git commits the files are added in (0 for no git repo)
+    commits: int = 1
+
+    def as_dict(self):
+        return asdict(self)
+
+
+SHAPES = {
+    'small': Shape(files=50, depth=2, patterns=2, data_files=5, commits=2),
+    'medium': Shape(files=1000, depth=4, patterns=10, data_files=100, commits=10),
+    'large': Shape(files=10000, depth=6, patterns=50, data_files=1000, commits=20),
+    'big-files': Shape(files=50, size_median=2_000_000, size_sigma=0.5, commits=1),
+}
+
+
+def get_shape(name, **overrides):
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    return replace(SHAPES[name], **overrides)
+
+
+def _file_sizes(shape, rng):
+    mu = math.log(shape.size_median)
+    return [max(1, int(rng.lognormvariate(mu, shape.size_sigma)))
+            for _ in range(shape.files)]
+
+
+def _module_source(size, rng):
+    """Python-like text of about size bytes, so it compresses like code"""
+    lines = ['"""Generated module"""', '']
+    length = sum(len(l) + 1 for l in lines)
+    while length < size:
+        name = ''.join(rng.choice('abcdefghijklmnop') for _ in range(8))
+        line = f"def {name}(x, y={rng.randrange(1000)}):\n    return x * y + {rng.random()!r}\n"
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+
+def _package_dirs(shape, rng):
+    """Make a list of subpackage paths (relative), with nesting up to depth"""
+    dirs = [Path()]
+    n_dirs = max(1, shape.files // 20)
+    for i in range(n_dirs - 1):
+        parent = rng.choice(dirs)
+        if len(parent.parts) < shape.depth:
+            dirs.append(parent / f'sub{i}')
+    return dirs
+
+
+def _git(directory, *args, input=None):
+    subprocess.run(
+        ['git', *args], cwd=str(directory), check=True, input=input,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def make_project(root: Path, shape: Shape, seed=0):
+    """Create a project in root, which should not exist yet
+
+    Returns the list of files created, relative to root.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True)
+    created = []
+
+    def write(rel_path, content):
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(content, 'utf-8')
+        created.append(rel_path)
+
+    dirs = _package_dirs(shape, rng)
+    for d in dirs[1:]:
+        write(Path('bench_scaling', d, '__init__.py'), '')
+    write(Path('bench_scaling', '__init__.py'), '"""Benchmark"""\ndef main(): pass\n')
+
+    for i, size in enumerate(_file_sizes(shape, rng)):
+        d = rng.choice(dirs)
+        write(Path('bench_scaling', d, f'mod{i}.py'), _module_source(size, rng))
+
+    data_dir = ''
+    if shape.data_files:
+        data_dir = '\n[tool.flit.external-data]\ndirectory = "data"\n'
+        for i in range(shape.data_files):
+            size = rng.randrange(100, 5000)
+            write(Path('data', 'share', f'd{i % 10}', f'file{i}.dat'),
+                  rng.getrandbits(size * 8).to_bytes(size, 'little'))
+
+    includes, excludes = [], []
+    for i in range(shape.patterns):
+        includes.append(f'"docs/section{i}/*.txt"')
+        excludes.append(f'"docs/section{i}/skip*.txt"')
+        for j in range(5):
+            write(Path('docs', f'section{i}', f'page{j}.txt'), 'Docs\n' * 50)
+        write(Path('docs', f'section{i}', 'skip_me.txt'), 'Draft\n')
+
+    write(Path('pyproject.toml'), PYPROJECT.format(
+        data_dir=data_dir, includes=', '.join(includes), excludes=', '.join(excludes),
+    ))
+
+    if shape.commits and shutil.which('git'):
+        _git(root, 'init', '-q')
+        _git(root, 'config', 'user.email', 'bench@example.com')
+        _git(root, 'config', 'user.name', 'Benchmark')
+        # Add the files in batches, to give the repository some history
+        batch = math.ceil(len(created) / shape.commits)
+        for i in range(0, len(created), batch):
+            paths = '\0'.join(p.as_posix() for p in created[i:i + batch])
+            _git(root, 'add', '--pathspec-from-file=-', '--pathspec-file-nul',
+                 input=paths.encode('utf-8'))
+            _git(root, 'commit', '-q', '-m', f'Commit {i // batch}')
+
+    return created
@@ -0,0 +1,69 @@
+"""Store benchmark results as JSON, and compare them with a baseline"""
+import json
+import statistics
+
+
+def summarise(runs):
+    """Combine the results of repeated runs of one case"""
+    times = [r['time'] for r in runs]
+    walls = [r['wall'] for r in runs]
+    span_names = sorted({name for r in runs for name in r['spans']})
+    rss = [r['peak_rss'] for r in runs if r['peak_rss'] is not None]
+    return {
+        'median': statistics.median(times),
+        'min': min(times),
+        'times': times,
+        # Including Python startup & imports
+        'wall_median': statistics.median(walls),
+        'peak_rss': max(rss) if rss else None,
+        'spans': {
+            name: statistics.median([r['spans'].get(name, 0) for r in runs])
+            for name in span_names
+        },
+    }
+
+
+def save(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare results for cases in both sets
+
+    Returns a list of (case, metric, old, new, regressed) tuples. A result is
+    a regression if it's more than threshold (a fraction) worse than the
+    baseline. Times use the fastest run, which is less affected by noise than
+    the median.
+    """
+    rows = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        for metric in ('min', 'wall_median', 'peak_rss'):
+            a, b = old.get(metric), new.get(metric)
+            if not a or b is None:
+                continue
+            rows.append((name, metric, a, b, b > a * (1 + threshold)))
+    return rows
+
+
+def _fmt(metric, value):
+    if metric == 'peak_rss':
+        return f"{value / 1e6:.1f} MB"
+    return f"{value * 1000:.1f} ms"
+
+
+def print_comparison(rows):
+    print(f"{'case':<40}{'metric':<13}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, metric, old, new, regressed in rows:
+        change = f"{(new / old - 1) * 100:+.1f}%"
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<40}{metric:<13}{_fmt(metric, old):>12}"
+              f"{_fmt(metric, new):>12}{change:>9}{flag}")
@@ -0,0 +1,142 @@
+"""Run one benchmark case in this process, and print the results as JSON
+
+The runner starts a new process for each run of a case, so each run starts
+with nothing imported, and its peak memory use can be measured.
+
+Usage: python -m benchmarks.scaling.worker CASE PROJECT_DIR SCRATCH_DIR [PYTHON]
+"""
+import json
+import os
+from pathlib import Path
+import sys
+import time
+
+CASES = {}
+
+
+class Skip(Exception):
+    """Raised when a case doesn't apply to a project (e.g. no git repo)"""
+
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+def _hook_case(hook_name, output_dir=True):
+    def run(project, scratch, python):
+        from flit_core import buildapi
+        args = [str(scratch)] if output_dir else []
+        getattr(buildapi, hook_name)(*args)
+    CASES['hook:' + hook_name] = run
+
+
+_hook_case('get_requires_for_build_wheel', output_dir=False)
+_hook_case('prepare_metadata_for_build_wheel')
+_hook_case('build_wheel')
+_hook_case('build_sdist')
+_hook_case('build_editable')
+
+
+@case('wheel')
+def build_wheel(project, scratch, python):
+    from flit_core.wheel import make_wheel_in
+    make_wheel_in(project / 'pyproject.toml', scratch)
+
+
+@case('sdist')
+def build_sdist(project, scratch, python):
+    """flit's sdist, with the files listed by git"""
+    from flit.sdist import SdistBuilder
+    if not (project / '.git').exists():
+        raise Skip("not a git repository")
+    SdistBuilder.from_ini_path(project / 'pyproject.toml').build(scratch)
+
+
+@case('vcs list')
+def vcs_list(project, scratch, python):
+    from flit.vcs import git
+    if not (project / '.git').exists():
+        raise Skip("not a git repository")
+    git.list_tracked_files(project)
+    git.list_untracked_deleted_files(project)
+
+
+@case('file patterns')
+def file_patterns(project, scratch, python):
+    """Expand the sdist include/exclude patterns, and match every file"""
+    from flit_core.config import read_flit_config
+    from flit_core.sdist import FilePatterns
+    cfg = read_flit_config(project / 'pyproject.toml')
+    includes = FilePatterns(cfg.sdist_include_patterns, str(project))
+    excludes = FilePatterns(cfg.sdist_exclude_patterns, str(project))
+    n_included = 0
+    for dirpath, dirs, files in os.walk(project):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for f in files:
+            rel = os.path.relpath(os.path.join(dirpath, f), project)
+            if includes.match_file(rel) and not excludes.match_file(rel):
+                n_included += 1
+    assert n_included > 0 or not cfg.sdist_include_patterns
+
+
+@case('install')
+def install(project, scratch, python):
+    """Install (copying files) into a virtualenv, including writing dist-info"""
+    from flit.install import Installer
+    if python is None:
+        raise Skip("no virtualenv to install into")
+    Installer.from_ini_path(
+        project / 'pyproject.toml', python=python, user=False, deps='none',
+    ).install_directly()
+
+
+def peak_rss():
+    """Peak memory use (resident set size) of this process, in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def span_totals(trace_file):
+    """Total time (seconds) for each kind of span in a trace file"""
+    with open(trace_file, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    totals = {}
+    for e in events:
+        if e['ph'] == 'X':
+            totals[e['name']] = totals.get(e['name'], 0) + e['dur'] / 1e6
+    return totals
+
+
+def main(argv=None):
+    case_name, project, scratch, *python = argv or sys.argv[1:]
+    project, scratch = Path(project).resolve(), Path(scratch).resolve()
+    fn = CASES[case_name]
+    os.chdir(project)  # PEP 517 hooks run in the project directory
+
+    # Use flit's own tracing to break the time down into steps. Memory
+    # tracking slows things down a lot, so that's off.
+    os.environ['FLIT_TRACE_MEMORY'] = '0'
+    from flit_core import tracing
+    finish_trace = tracing.enable(case_name, str(scratch / 'trace'))
+
+    result = {}
+    start = time.perf_counter()
+    try:
+        fn(project, scratch, python[0] if python else None)
+    except Skip as e:
+        result['skipped'] = str(e)
+    result['time'] = time.perf_counter() - start
+    result['spans'] = span_totals(finish_trace())
+    result['peak_rss'] = peak_rss()
+    json.dump(result, sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Measure how ``python -m flit.sdist_rules`` scales with the size of a repo
+
+This makes synthetic lists of tracked & untracked paths, shaped roughly like a
+large monorepo (nested folders, some untracked build output), and times
+choosing the include & exclude rules for them. It doesn't need git or files
+on disk: the time to run git itself isn't included.
+
+Run from the root of the flit repository::
+
+    python benchmarks/sdist_rules_scaling.py --sizes 1000 10000 100000 200000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from flit.sdist_rules import find_rules
+
+
+def make_paths(n, seed=0):
+    rng = random.Random(seed)
+    tracked, untracked = [], []
+    for i in range(n):
+        depth = rng.randrange(1, 7)
+        folders = [f'd{rng.randrange(8)}' for _ in range(depth)]
+        path = '/'.join(folders + [f'f{i}.py'])
+        r = rng.random()
+        if r < 0.9:
+            tracked.append(path)
+        elif r < 0.97:
+            untracked.append(path)
+        else:
+            untracked.append('/'.join(folders + ['build/']))
+    return tracked, untracked
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', type=int, nargs='+',
+                    default=[1000, 10000, 100000, 200000])
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args(argv)
+
+    print(f"Median of {args.repeat} runs")
+    print(f"{'paths':>10}{'rules':>10}{'time (ms)':>12}{'µs/path':>10}")
+    for n in args.sizes:
+        tracked, untracked = make_paths(n)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            includes, excludes = find_rules(tracked, untracked)
+            times.append(time.perf_counter() - start)
+        t = statistics.median(times)
+        n_rules = len(includes) + len(excludes)
+        print(f"{n:>10}{n_rules:>10}{t * 1000:>12.1f}{t * 1e6 / n:>10.2f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
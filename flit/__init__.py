@@ -1,5 +1,6 @@
 """A simple packaging tool for simple packages."""
 import argparse
+import atexit
 import logging
 import os
 import pathlib
@@ -8,7 +9,7 @@ import subprocess
 import sys
 from typing import Optional
 
-from flit_core import common
+from flit_core import common, tracing
 from .config import ConfigError
 from .log import enable_colourful_output
 
@@ -55,6 +56,14 @@ def find_python_executable(python: Optional[str] = None) -> str:
         ) from e
 
 
+def positive_int(value):
+    """argparse type for options which must be at least 1"""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {n}")
+    return n
+
+
 def add_shared_install_options(parser: argparse.ArgumentParser):
     parser.add_argument('--user', action='store_true', default=None,
         help="Do a user-local install (default if site.ENABLE_USER_SITE is True)"
@@ -101,6 +110,56 @@ def add_shared_build_options(parser: argparse.ArgumentParser):
     )
 
 
+def workspace_main(args):
+    from . import workspace
+    try:
+        ini_paths = workspace.discover_projects(args.projects, args.projects_file)
+    except (workspace.NoProjectsError, OSError) as e:
+        sys.exit(str(e))
+    log.info("Found %d projects", len(ini_paths))
+
+    if args.workspace_cmd == 'build':
+        results = workspace.build_projects(
+            ini_paths, formats=set(args.format or []), use_vcs=args.use_vcs,
+            jobs=args.jobs,
+        )
+        failed = [r for r in results if not r.ok]
+        log.info("Built %d projects, %d failed", len(results) - len(failed), len(failed))
+        for r in failed:
+            log.error("Failed: %s", r.ini_path)
+        if failed:
+            sys.exit(1)
+
+    elif args.workspace_cmd == 'install':
+        from .install import DependencyError, RootInstallError
+        try:
+            results = workspace.install_projects(
+                ini_paths,
+                only_deps=args.only_deps,
+                user=args.user,
+                python=find_python_executable(args.python),
+                symlink=args.symlink,
+                deps=args.deps,
+                extras=args.extras,
+                pth=args.pth_file,
+                import_hook=args.import_hook,
+            )
+        except (ConfigError, PythonNotFoundError, DependencyError, RootInstallError,
+                common.NoDocstringError, common.NoVersionError) as e:
+            sys.exit(str(e))
+        failed = [r for r in results if not r.ok]
+        log.info("Installed %d projects, %d failed", len(results) - len(failed), len(failed))
+        for r in failed:
+            log.error("Failed: %s", r.ini_path)
+        if failed:
+            sys.exit(1)
+
+
+def _write_trace(finish_trace):
+    path = finish_trace()
+    log.info("Wrote trace to %s", path)
+
+
 def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument('-f', '--ini-file', type=pathlib.Path, default='pyproject.toml')
@@ -118,6 +177,9 @@ def main(argv=None):
     )
 
     add_shared_build_options(parser_build)
+    parser_build.add_argument('--watch', action='store_true',
+        help="Keep running, and build again when the project's files change"
+    )
 
     # flit publish --------------------------------------------
     parser_publish = subparsers.add_parser('publish',
@@ -133,6 +195,26 @@ def main(argv=None):
     parser_publish.add_argument('--repository',
         help="Name of the repository to upload to (must be in the specified .pypirc file)"
     )
+    parser_publish.add_argument('--dist-dir', type=pathlib.Path,
+        help="Upload the wheel and sdist already built in this directory, "
+             "instead of building them"
+    )
+    parser_publish.add_argument('--skip-existing', action='store_true',
+        help="Skip files which are already on the index, and fail before "
+             "uploading if a file there has different contents"
+    )
+    parser_publish.add_argument('--chunk-size', type=positive_int, metavar='MIB',
+        help="Upload files in chunks of this many MiB, so uploads can resume "
+             "after errors, if the index supports it"
+    )
+    parser_publish.add_argument('-j', '--jobs', type=positive_int, default=4,
+        help="Number of files to upload at once (default: 4)"
+    )
+    parser_publish.add_argument('--pipeline', action='store_true',
+        help="Upload each file as soon as it's built, rather than building all "
+             "files before uploading any. If a later build fails, the files "
+             "already uploaded stay on the index."
+    )
 
     # flit install --------------------------------------------
     parser_install = subparsers.add_parser('install',
@@ -144,8 +226,67 @@ def main(argv=None):
     parser_install.add_argument('--pth-file', action='store_true',
         help="Add .pth file for the module/package to site packages instead of copying it"
     )
+    parser_install.add_argument('--import-hook', action='store_true',
+        help="Add an import hook for the module/package to site packages instead of copying it"
+    )
+    parser_install.add_argument('--compile', action='store_true',
+        help="Compile the module/package to bytecode after installing it"
+    )
+    parser_install.add_argument('--watch', action='store_true',
+        help="Keep running, and update the installed package when its files change"
+    )
+    parser_install.add_argument('--optimize', action='append', type=int, choices=[0, 1, 2],
+        help="Optimization level for --compile. Can be given more than once (default: 0)"
+    )
     add_shared_install_options(parser_install)
 
+    # flit workspace --------------------------------------------
+    parser_workspace = subparsers.add_parser('workspace',
+        help="Build or install several projects at once",
+    )
+    workspace_subparsers = parser_workspace.add_subparsers(
+        title='workspace subcommands', dest='workspace_cmd'
+    )
+    parser_ws_build = workspace_subparsers.add_parser('build',
+        help="Build wheels and sdists for all the projects, in parallel",
+    )
+    add_shared_build_options(parser_ws_build)
+    parser_ws_build.add_argument('-j', '--jobs', type=positive_int,
+        help="Number of projects to build at once (default: number of CPUs)"
+    )
+    parser_ws_install = workspace_subparsers.add_parser('install',
+        help="Install all the projects, with one pip command for their dependencies",
+    )
+    parser_ws_install.add_argument('-s', '--symlink', action='store_true',
+        help="Symlink the modules/packages into site packages instead of copying them"
+    )
+    parser_ws_install.add_argument('--pth-file', action='store_true',
+        help="Add .pth files for the modules/packages to site packages instead of copying them"
+    )
+    parser_ws_install.add_argument('--import-hook', action='store_true',
+        help="Add an import hook for the modules/packages to site packages instead of copying them"
+    )
+    add_shared_install_options(parser_ws_install)
+    for p in (parser_ws_build, parser_ws_install):
+        p.add_argument('projects', nargs='*', metavar='PATTERN',
+            help="Glob pattern matching project folders or their pyproject.toml files"
+        )
+        p.add_argument('--projects-file', type=pathlib.Path,
+            help="File listing project folders or pyproject.toml files, one per line"
+        )
+
+    # flit verify --------------------------------------------
+    parser_verify = subparsers.add_parser('verify',
+        help="Check built wheels and sdists, e.g. before publishing them",
+    )
+    parser_verify.add_argument('--dist-dir', type=pathlib.Path,
+        help="Directory containing the files to check "
+             "(default: dist next to pyproject.toml)"
+    )
+    parser_verify.add_argument('-j', '--jobs', type=positive_int,
+        help="Number of files to check at once (default: number of CPUs)"
+    )
+
     # flit init --------------------------------------------
     parser_init = subparsers.add_parser('init',
         help="Prepare pyproject.toml for a new package"
@@ -157,13 +298,21 @@ def main(argv=None):
         sys.exit("flit.ini format is no longer supported. You can use "
                  "'python3 -m flit.tomlify' to convert it to pyproject.toml")
 
-    if args.subcmd not in {'init'} and not args.ini_file.is_file():
+    if args.subcmd == 'publish' and args.dist_dir is not None:
+        pass  # Publishing files which are already built
+    elif args.subcmd not in {'init', 'workspace', 'verify'} and not args.ini_file.is_file():
         sys.exit(f'Config file {args.ini_file} does not exist')
 
     enable_colourful_output(logging.DEBUG if args.debug else logging.INFO)
 
     log.debug("Parsed arguments %r", args)
 
+    trace_dir = tracing.trace_dir_setting()
+    if trace_dir:
+        finish_trace = tracing.enable(f'flit {args.subcmd}', trace_dir)
+        if finish_trace is not None:
+            atexit.register(_write_trace, finish_trace)
+
     if args.logo:
         from .logo import clogo
         print(clogo.format(version=__version__))
@@ -172,38 +321,83 @@ def main(argv=None):
     if args.subcmd == 'build':
         from .build import main
         try:
-            main(args.ini_file, formats=set(args.format or []),
-                 use_vcs=args.use_vcs)
+            if args.watch:
+                from .watch import watch_build
+                watch_build(args.ini_file, formats=set(args.format or []),
+                            use_vcs=args.use_vcs)
+            else:
+                main(args.ini_file, formats=set(args.format or []),
+                     use_vcs=args.use_vcs)
         except(common.NoDocstringError, common.VCSError, common.NoVersionError) as e:
             sys.exit(e.args[0])
     elif args.subcmd == 'publish':
         if args.deprecated_repository:
             log.warning("Passing --repository before the 'upload' subcommand is deprecated: pass it after")
         repository = args.repository or args.deprecated_repository
-        from .upload import main
-        main(args.ini_file, repository, args.pypirc, formats=set(args.format or []),
-             use_vcs=args.use_vcs)
+        from .upload import main, main_dist_dir, ExistingFileMismatch
+        chunk_size = args.chunk_size and args.chunk_size * 1024 * 1024
+        from .artifacts import InvalidDistribution
+        try:
+            if args.dist_dir is not None:
+                main_dist_dir(args.dist_dir, repository, args.pypirc,
+                              formats=set(args.format or []), jobs=args.jobs,
+                              skip_existing=args.skip_existing,
+                              chunk_size=chunk_size)
+            else:
+                main(args.ini_file, repository, args.pypirc,
+                     formats=set(args.format or []), use_vcs=args.use_vcs,
+                     jobs=args.jobs, skip_existing=args.skip_existing,
+                     chunk_size=chunk_size, pipeline=args.pipeline)
+        except (InvalidDistribution, ExistingFileMismatch) as e:
+            sys.exit(str(e))
 
     elif args.subcmd == 'install':
         from .install import Installer
+        if args.watch and args.only_deps:
+            sys.exit("--watch can't be used with --only-deps")
         try:
             python = find_python_executable(args.python)
-            installer = Installer.from_ini_path(
-                args.ini_file,
-                user=args.user,
-                python=python,
-                symlink=args.symlink,
-                deps=args.deps,
-                extras=args.extras,
-                pth=args.pth_file
-            )
-            if args.only_deps:
-                installer.install_requirements()
+
+            def make_installer():
+                return Installer.from_ini_path(
+                    args.ini_file,
+                    user=args.user,
+                    python=python,
+                    symlink=args.symlink,
+                    deps=args.deps,
+                    extras=args.extras,
+                    pth=args.pth_file,
+                    compile_bytecode=args.compile,
+                    optimize_levels=tuple(args.optimize or (0,)),
+                    import_hook=args.import_hook,
+                )
+            if args.watch:
+                from .watch import watch_install
+                watch_install(args.ini_file, make_installer)
+            elif args.only_deps:
+                make_installer().install_requirements()
             else:
-                installer.install()
+                make_installer().install()
         except (ConfigError, PythonNotFoundError, common.NoDocstringError, common.NoVersionError) as e:
             sys.exit(e.args[0])
 
+    elif args.subcmd == 'verify':
+        from .verify import main
+        from .artifacts import InvalidDistribution
+        dist_dir = args.dist_dir or args.ini_file.parent / 'dist'
+        try:
+            ok = main(dist_dir, jobs=args.jobs)
+        except InvalidDistribution as e:
+            sys.exit(str(e))
+        if not ok:
+            sys.exit(1)
+
+    elif args.subcmd == 'workspace':
+        if not args.workspace_cmd:
+            parser_workspace.print_help()
+            sys.exit(1)
+        workspace_main(args)
+
     elif args.subcmd == 'init':
         from .init import TerminalIniter
         TerminalIniter().initialise()
@@ -0,0 +1,32 @@
+"""Compile .py files to bytecode; run as a script in the target Python.
+
+This is a separate file, rather than code passed with -c, because cmd.exe
+cuts a -c argument off at the first newline. Running it in the target Python
+means the bytecode matches its version. The checked hash invalidation mode
+keeps the .pyc files correct as the source is edited, without relying on
+mtimes.
+
+Usage: python _compile_bytecode.py PATH OPTIMIZE_LEVEL...
+"""
+import compileall
+import os
+import py_compile
+import sys
+
+
+def compile_path(path, levels):
+    mode = py_compile.PycInvalidationMode.CHECKED_HASH
+    ok = True
+    for level in levels:
+        if os.path.isdir(path):
+            ok &= bool(compileall.compile_dir(path, quiet=1, workers=0,
+                                              optimize=level, invalidation_mode=mode))
+        else:
+            ok &= bool(compileall.compile_file(path, quiet=1, optimize=level,
+                                               invalidation_mode=mode))
+    return ok
+
+
+if __name__ == '__main__':
+    ok = compile_path(sys.argv[1], [int(l) for l in sys.argv[2:]])
+    sys.exit(0 if ok else 1)
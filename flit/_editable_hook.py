@@ -0,0 +1,58 @@
+"""Import hook for all projects installed by flit install --import-hook
+
+The hook is written to site-packages as __flit_editable__.py, and imported by
+a single .pth file. It's made from the finder in flit_core._editable_finder,
+followed by the code below the marker in this module, and a call to
+install_registry(). It reads one registry file mapping import names to source
+locations, so interpreter startup costs the same however many projects are
+registered.
+
+The code below the marker must not import anything from flit, and should
+import as little as possible, as it runs at every interpreter startup.
+"""
+import os
+import sys
+
+from flit_core._editable_finder import EditableFinder
+
+# --- Copied into the hook module from here ---
+REGISTRY_FILE = '__flit_editable__.txt'
+
+
+def read_registry(site_dir):
+    """Read the registry in site_dir
+
+    Returns a list of (dist_info, import_name, path) tuples.
+    """
+    try:
+        with open(os.path.join(site_dir, REGISTRY_FILE), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    return [tuple(l.split('\t')) for l in lines if l and not l.startswith('#')]
+
+
+class RegistryFinder(EditableFinder):
+    """Finder for the projects in the registry
+
+    Projects whose dist-info folder is gone (e.g. uninstalled by pip since
+    they were registered) are skipped.
+    """
+    def __init__(self, site_dir, entries):
+        super().__init__({name: path for _, name, path in entries})
+        self.site_dir = site_dir
+        self.dist_infos = {name: dist_info for dist_info, name, _ in entries}
+
+    def find_spec(self, fullname, path=None, target=None):
+        dist_info = self.dist_infos.get(fullname)
+        if dist_info is not None and not os.path.isdir(
+                os.path.join(self.site_dir, dist_info)):
+            return None
+        return super().find_spec(fullname, path, target)
+
+
+def install_registry():
+    """Add a finder for the registry next to this file to sys.meta_path"""
+    site_dir = os.path.dirname(os.path.abspath(__file__))
+    # Added at the end, like an entry in sys.path would be
+    sys.meta_path.append(RegistryFinder(site_dir, read_registry(site_dir)))
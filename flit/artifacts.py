@@ -0,0 +1,112 @@
+"""Find built distributions and read their metadata
+
+This lets flit publish upload files built earlier, e.g. by a previous CI
+stage, without reading pyproject.toml or building them again. The metadata
+is read from the wheel's .dist-info/METADATA or the sdist's PKG-INFO, so the
+upload describes exactly the files being uploaded.
+"""
+from email.parser import Parser
+import logging
+from pathlib import Path
+import tarfile
+import zipfile
+
+from flit_core.common import Metadata
+
+log = logging.getLogger(__name__)
+
+# Core metadata fields which can appear more than once -> Metadata attributes
+MULTI_USE_FIELDS = {
+    'Platform': 'platform',
+    'Supported-Platform': 'supported_platform',
+    'Classifier': 'classifiers',
+    'Provides': 'provides',
+    'Requires': 'requires',
+    'Obsoletes': 'obsoletes',
+    'Project-URL': 'project_urls',
+    'Provides-Dist': 'provides_dist',
+    'Requires-Dist': 'requires_dist',
+    'Obsoletes-Dist': 'obsoletes_dist',
+    'Requires-External': 'requires_external',
+    'Provides-Extra': 'provides_extra',
+    'License-File': 'license_files',
+    'Dynamic': 'dynamic',
+    'Import-Name': 'import_name',
+    'Import-Namespace': 'import_namespace',
+}
+
+
+class InvalidDistribution(Exception):
+    pass
+
+
+def parse_metadata(fp) -> Metadata:
+    """Parse a core metadata file (METADATA or PKG-INFO) from a binary file"""
+    msg = Parser().parsestr(fp.read().decode('utf-8'))
+    data = {}
+    for field in set(msg.keys()):
+        values = msg.get_all(field)
+        if field in MULTI_USE_FIELDS:
+            data[MULTI_USE_FIELDS[field]] = values
+            continue
+
+        attr = field.lower().replace('-', '_')
+        if attr in ('name', 'version') or hasattr(Metadata, attr):
+            data[attr] = values[0]
+        else:
+            log.debug("Ignoring unknown metadata field %s", field)
+
+    body = msg.get_payload()
+    if body.strip():
+        data['description'] = body.rstrip('\n')
+
+    if 'name' not in data or 'version' not in data:
+        raise InvalidDistribution("Metadata does not contain Name and Version")
+    return Metadata(data)
+
+
+def read_wheel_metadata(path: Path) -> Metadata:
+    with zipfile.ZipFile(path) as zf:
+        for name in zf.namelist():
+            parts = name.split('/')
+            if len(parts) == 2 and parts[0].endswith('.dist-info') \
+                    and parts[1] == 'METADATA':
+                with zf.open(name) as f:
+                    return parse_metadata(f)
+    raise InvalidDistribution(f"No .dist-info/METADATA found in {path}")
+
+
+def read_sdist_metadata(path: Path) -> Metadata:
+    # Stream the tarball, and stop as soon as we find PKG-INFO
+    with tarfile.open(path, 'r|gz') as tf:
+        for member in tf:
+            parts = member.name.split('/')
+            if len(parts) == 2 and parts[1] == 'PKG-INFO' and member.isfile():
+                return parse_metadata(tf.extractfile(member))
+    raise InvalidDistribution(f"No PKG-INFO found in {path}")
+
+
+def read_metadata(path: Path) -> Metadata:
+    """Read the metadata from a wheel or sdist file"""
+    if path.suffix == '.whl':
+        return read_wheel_metadata(path)
+    elif path.name.endswith('.tar.gz'):
+        return read_sdist_metadata(path)
+    raise InvalidDistribution(f"Unknown distribution type: {path}")
+
+
+def find_dists(dist_dir: Path, formats=None):
+    """Find wheels and sdists in dist_dir
+
+    Returns a list of (path, metadata) pairs, wheels before sdists.
+    """
+    from .build import ALL_FORMATS
+    formats = formats or ALL_FORMATS
+    paths = []
+    if 'wheel' in formats:
+        paths += sorted(dist_dir.glob('*.whl'))
+    if 'sdist' in formats:
+        paths += sorted(dist_dir.glob('*.tar.gz'))
+    if not paths:
+        raise InvalidDistribution(f"No distributions to upload found in {dist_dir}")
+    return [(p, read_metadata(p)) for p in paths]
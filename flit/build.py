@@ -9,6 +9,8 @@ from tempfile import TemporaryDirectory
 from types import SimpleNamespace
 import sys
 
+from flit_core.digests import record_digests
+
 from .config import read_flit_config, ConfigError
 from .sdist import SdistBuilder
 from .wheel import make_wheel_in
@@ -28,8 +30,14 @@ def unpacked_tarball(path):
         assert len(files) == 1, files
         yield os.path.join(tmpdir, files[0])
 
-def main(ini_file: Path, formats=None, use_vcs=True):
-    """Build wheel and sdist"""
+def main(ini_file: Path, formats=None, use_vcs=True, on_built=None):
+    """Build wheel and sdist
+
+    The digests of each file are recorded in the dist folder (see
+    flit_core.digests). If on_built is given, it's called with the info for
+    each file (the same as the attributes of the return value) as soon as that
+    file is built, so the caller can start using it while the next one is built.
+    """
     if not formats:
         formats = ALL_FORMATS
     elif not formats.issubset(ALL_FORMATS):
@@ -39,6 +47,11 @@ def main(ini_file: Path, formats=None, use_vcs=True):
     dist_dir = ini_file.parent / 'dist'
     dist_dir.mkdir(parents=True, exist_ok=True)
 
+    def built(info):
+        record_digests(info.file, info.digests)
+        if on_built is not None:
+            on_built(info)
+
     try:
         # Load the config file to make sure it gets validated
         read_flit_config(ini_file)
@@ -46,7 +59,9 @@ def main(ini_file: Path, formats=None, use_vcs=True):
         if 'sdist' in formats:
             sb = SdistBuilder.from_ini_path(ini_file, use_vcs=use_vcs)
             sdist_file = sb.build(dist_dir)
-            sdist_info = SimpleNamespace(builder=sb, file=sdist_file)
+            sdist_info = SimpleNamespace(builder=sb, file=sdist_file,
+                                         digests=sb.digests)
+            built(sdist_info)
             # When we're building both, build the wheel from the unpacked sdist.
             # This helps ensure that the sdist contains all the necessary files.
             if 'wheel' in formats:
@@ -56,6 +71,8 @@ def main(ini_file: Path, formats=None, use_vcs=True):
                     wheel_info = make_wheel_in(tmp_ini_file, dist_dir)
         elif 'wheel' in formats:
             wheel_info = make_wheel_in(ini_file, dist_dir)
+        if wheel_info is not None:
+            built(wheel_info)
     except ConfigError as e:
         sys.exit(f'Config error: {e}')
 
@@ -0,0 +1,145 @@
+"""Resumable uploads, sending a file in chunks
+
+This follows the style of the proposed upload API 2.0 (PEP 694) and the
+resumable uploads draft it builds on:
+
+1. POST a JSON description of the file (name, size, sha256, and the same
+   metadata as a legacy upload) to the upload URL, with the Content-Type
+   ``application/vnd.pypi.upload.v2+json``. An index supporting this replies
+   with the same content type, and the URL of an upload resource in the
+   Location header. Any other response means the index doesn't support it,
+   and the legacy upload is used instead. If the same file was already being
+   uploaded, the index returns the existing upload resource.
+2. HEAD the upload resource: the ``Upload-Offset`` header says how many bytes
+   the index has already received.
+3. PATCH the upload resource with each chunk from that offset, with headers
+   ``Upload-Offset``, ``Content-Digest`` (the chunk's sha256, RFC 9530), and
+   ``Upload-Complete: ?1`` on the last chunk. The index checks the digest of
+   each chunk, and the sha256 of the whole file when it's complete.
+
+If a chunk fails (e.g. the connection drops), steps 2 and 3 are repeated to
+resume from what the index has acknowledged.
+"""
+import base64
+import hashlib
+import logging
+from pathlib import Path
+from urllib.parse import urljoin
+
+import requests
+
+from .upload import check_cancelled
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/vnd.pypi.upload.v2+json'
+#: Give up if this many chunks in a row fail
+MAX_CHUNK_ATTEMPTS = 5
+
+
+class ChunkedUploadNotSupported(Exception):
+    pass
+
+
+def start_upload(session, repo, file: Path, data):
+    """Create (or find) the upload resource for a file; returns its URL"""
+    resp = session.post(repo.url, auth=(repo.username, repo.password), json={
+        'meta': {'api-version': '2.0'},
+        'filename': file.name,
+        'size': file.stat().st_size,
+        'hashes': {'sha256': data['sha256_digest']},
+        'metadata': data,
+    }, headers={'Content-Type': CONTENT_TYPE, 'Accept': CONTENT_TYPE})
+    if resp.status_code in (401, 403):
+        resp.raise_for_status()
+    if not resp.headers.get('Content-Type', '').startswith(CONTENT_TYPE):
+        raise ChunkedUploadNotSupported(
+            f"Index responded {resp.status_code} {resp.headers.get('Content-Type')}"
+        )
+    resp.raise_for_status()
+    return urljoin(repo.url, resp.headers['Location'])
+
+
+def uploaded_offset(session, repo, upload_url):
+    """Ask the index how much of the file it has, retrying if that fails"""
+    for attempt in range(1, MAX_CHUNK_ATTEMPTS + 1):
+        try:
+            resp = session.head(upload_url, auth=(repo.username, repo.password))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_CHUNK_ATTEMPTS:
+                raise
+            log.warning("Checking upload progress failed (%s); retrying", e)
+            continue
+        if resp.status_code >= 500 and attempt < MAX_CHUNK_ATTEMPTS:
+            log.warning("Checking upload progress failed (%d); retrying",
+                        resp.status_code)
+            continue
+        resp.raise_for_status()
+        return int(resp.headers['Upload-Offset'])
+
+
+def content_digest(chunk: bytes):
+    b64 = base64.b64encode(hashlib.sha256(chunk).digest()).decode('ascii')
+    return f'sha-256=:{b64}:'
+
+
+def send_chunk(session, repo, upload_url, offset, chunk, complete):
+    return session.patch(upload_url, data=chunk, auth=(repo.username, repo.password),
+        headers={
+            'Content-Type': 'application/partial-upload',
+            'Upload-Offset': str(offset),
+            'Upload-Complete': '?1' if complete else '?0',
+            'Content-Digest': content_digest(chunk),
+        },
+    )
+
+
+def upload_chunked(session, repo, file: Path, data, chunk_size, cancel=None):
+    """Upload file in chunks, resuming after errors
+
+    data is the form data for a legacy upload, including the digests.
+    Raises ChunkedUploadNotSupported if the index doesn't support this.
+    If cancel (a threading.Event) is set, it stops before the next chunk,
+    raising UploadCancelled.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
+    size = file.stat().st_size
+    upload_url = start_upload(session, repo, file, data)
+    offset = uploaded_offset(session, repo, upload_url)
+    if offset:
+        log.info("Resuming upload of %s from %d/%d bytes", file.name, offset, size)
+
+    failures = 0
+    with file.open('rb') as f:
+        while True:
+            check_cancelled(cancel, file)
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            complete = offset + len(chunk) >= size
+            resp = error = None
+            try:
+                resp = send_chunk(session, repo, upload_url, offset, chunk, complete)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if resp is not None and resp.ok:
+                if complete:
+                    return
+                offset += len(chunk)
+                failures = 0
+                log.debug("Uploaded %d/%d bytes of %s", offset, size, file.name)
+                continue
+
+            # 409 means the offset didn't match what the index has
+            if resp is not None and resp.status_code != 409 and resp.status_code < 500:
+                resp.raise_for_status()  # e.g. digest mismatch; don't retry
+            failures += 1
+            if failures >= MAX_CHUNK_ATTEMPTS:
+                if error is not None:
+                    raise error
+                resp.raise_for_status()
+            log.warning("Uploading a chunk of %s failed (%s); resuming",
+                        file.name, error or resp.status_code)
+            # Find out what the index has received, and carry on from there
+            offset = uploaded_offset(session, repo, upload_url)
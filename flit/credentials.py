@@ -0,0 +1,158 @@
+"""Look up upload credentials in keyring without blocking
+
+Finding a keyring backend can be slow, or hang, e.g. probing D-Bus for the
+Secret Service API on a headless machine. So lookups run in background
+threads: they can be started early (flit publish starts them before building)
+and are abandoned after a timeout. The threads are daemon threads, so a hung
+backend can't stop flit from exiting.
+
+Environment variables:
+
+- FLIT_KEYRING_TIMEOUT: seconds to wait for keyring (default 10)
+- FLIT_KEYRING_BACKEND: a keyring backend to use without auto-detection,
+  e.g. ``keyring.backends.SecretService.Keyring``, or ``none`` to not use
+  keyring at all
+"""
+from concurrent.futures import Future, TimeoutError
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+
+
+def keyring_timeout():
+    value = os.environ.get('FLIT_KEYRING_TIMEOUT', '')
+    try:
+        return float(value) if value else DEFAULT_TIMEOUT
+    except ValueError:
+        log.warning("Invalid FLIT_KEYRING_TIMEOUT=%r, using %d seconds",
+                    value, DEFAULT_TIMEOUT)
+        return DEFAULT_TIMEOUT
+
+
+def keyring_installed():
+    """Check if keyring can be imported (even if it's disabled)"""
+    try:
+        import keyring  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _load_backend():
+    """Get an object with get_password & set_password, or None"""
+    try:
+        import keyring
+    except ImportError:
+        return None
+    name = os.environ.get('FLIT_KEYRING_BACKEND', '')
+    if not name:
+        return keyring  # Module-level API, auto-detects the backend
+    elif name.lower() == 'none':
+        return None
+    from keyring.core import load_keyring
+    try:
+        return load_keyring(name)
+    except Exception as e:
+        log.warning("Could not load keyring backend FLIT_KEYRING_BACKEND=%r (%s: %s); "
+                    "not using keyring", name, type(e).__name__, e)
+        return None
+
+
+def _run_in_thread(fn, *args):
+    fut = Future()
+
+    def run():
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True, name='flit-keyring').start()
+    return fut
+
+
+class KeyringLookup:
+    """Look up passwords and tokens in keyring in background threads
+
+    Each (service, username) pair is looked up once, and the result kept in
+    memory, so one object can be shared to avoid repeated lookups, e.g. when
+    publishing several projects.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = keyring_timeout() if timeout is None else timeout
+        self._lock = threading.Lock()
+        self._backend = None  # Future
+        self._lookups = {}  # (service, username) -> Future
+        self._timed_out = False
+
+    def _get_backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = _run_in_thread(_load_backend)
+            return self._backend
+
+    def _get_password(self, service, username):
+        # Runs in a background thread
+        backend = self._get_backend().result()
+        if backend is None:
+            return None
+        import keyring.errors
+        try:
+            return backend.get_password(service, username)
+        except keyring.errors.KeyringError as e:
+            log.warning("Could not get password from keyring (%s)", e)
+            return None
+
+    def start(self, service, username):
+        """Start looking up a password, if it's not already started"""
+        with self._lock:
+            key = (service, username)
+            if key not in self._lookups:
+                self._lookups[key] = _run_in_thread(self._get_password, service, username)
+            return self._lookups[key]
+
+    def _wait(self, fut):
+        if self._timed_out:
+            return None  # Don't wait again for a keyring which isn't responding
+        try:
+            return fut.result(timeout=self.timeout)
+        except TimeoutError:
+            self._timed_out = True
+            log.warning(
+                "Timed out after %s seconds waiting for keyring. Set "
+                "FLIT_KEYRING_TIMEOUT to wait longer, or FLIT_KEYRING_BACKEND "
+                "to choose a backend ('none' to disable keyring).", self.timeout
+            )
+            return None
+
+    def get_password(self, service, username):
+        """Get a password from keyring
+
+        Returns None if it's not found, keyring isn't available, or the
+        lookup times out.
+        """
+        return self._wait(self.start(service, username))
+
+    def set_password(self, service, username, password):
+        """Store a password in keyring; returns True if it was stored"""
+        backend = self._wait(self._get_backend())
+        if backend is None:
+            return False
+        import keyring.errors
+        try:
+            backend.set_password(service, username, password)
+        except keyring.errors.KeyringError as e:
+            log.warning("Could not store password in keyring (%s)", e)
+            return False
+
+        with self._lock:
+            fut = self._lookups[(service, username)] = Future()
+            fut.set_result(password)
+        return True
+
+    def keyring_available(self):
+        return self._wait(self._get_backend()) is not None
@@ -0,0 +1,148 @@
+"""Maintain the shared registry of projects installed with an import hook
+
+Rather than a .pth file per project, ``flit install --import-hook`` records
+each project in one registry file in site-packages. A single .pth file loads
+one hook module, which reads the registry (see _editable_hook.py).
+
+The registry and hook are shared, so they're not listed in any project's
+RECORD. If a project is uninstalled by another tool, its entry is ignored
+because its dist-info folder is missing, and removed the next time the
+registry is updated. Once the last project is removed, so are the registry
+and the hook.
+"""
+from contextlib import contextmanager
+import logging
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from ._editable_hook import REGISTRY_FILE, read_registry
+
+log = logging.getLogger(__name__)
+
+HOOK_MODULE = '__flit_editable__'
+# The hook module is the flit_core finder, and _editable_hook.py after this
+HOOK_MARKER = '# --- Copied into the hook module from here ---\n'
+LOCK_FILE = '__flit_editable__.lock'
+
+REGISTRY_HEADER = (
+    "# Projects installed by 'flit install --import-hook' - do not edit\n"
+    "# dist-info folder, import name, source path (tab separated)\n"
+)
+
+
+class RegistryLockedError(Exception):
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+
+    def __str__(self):
+        return (f"Timed out waiting for the editable install registry lock "
+                f"({self.lock_path}). If no other installation is running, "
+                "delete this file and try again.")
+
+
+def _write_atomic(path: Path, content: str):
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix='.tmp-flit-')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, str(path))
+    except:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def _registry_lock(site_pkgs: Path, timeout=30):
+    lock_path = site_pkgs / LOCK_FILE
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise RegistryLockedError(lock_path)
+            time.sleep(0.05)
+        else:
+            break
+    try:
+        os.close(fd)
+        yield
+    finally:
+        os.unlink(str(lock_path))
+
+
+def _dist_name(dist_info):
+    # Normalised names in dist-info folders don't contain '-'
+    return dist_info.split('-', 1)[0]
+
+
+def _hook_files():
+    from flit_core import _editable_finder
+    finder_src = Path(_editable_finder.__file__).read_text('utf-8')
+    hook_src = Path(__file__).with_name('_editable_hook.py').read_text('utf-8')
+    registry_src = hook_src.split(HOOK_MARKER, 1)[1]
+    return {
+        f'{HOOK_MODULE}.py': f'{finder_src}\n{registry_src}\ninstall_registry()\n',
+        f'{HOOK_MODULE}.pth': f'import {HOOK_MODULE}\n',
+    }
+
+
+def _ensure_hook(site_pkgs: Path):
+    for filename, content in _hook_files().items():
+        path = site_pkgs / filename
+        try:
+            if path.read_text('utf-8') == content:
+                continue
+        except FileNotFoundError:
+            pass
+        log.debug("Writing editable import hook %s", path)
+        _write_atomic(path, content)
+
+
+def _remove_hook(site_pkgs: Path):
+    # The .pth file goes first, so new interpreters stop importing the hook
+    paths = [site_pkgs / f'{HOOK_MODULE}.pth', site_pkgs / f'{HOOK_MODULE}.py',
+             site_pkgs / REGISTRY_FILE]
+    log.debug("No projects left in the registry; removing the import hook")
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def update_registry(site_pkgs, dist_info, mapping=None):
+    """Replace the entries for a distribution in the registry
+
+    dist_info is the name of the distribution's .dist-info folder; entries for
+    any version of the same distribution are removed. mapping is a dict of
+    import names to source paths to register, or None to just remove it.
+    Entries for uninstalled distributions are also cleaned up. If no entries
+    are left, the registry and the import hook are removed from site-packages.
+    """
+    site_pkgs = Path(site_pkgs)
+    registry_path = site_pkgs / REGISTRY_FILE
+    if not mapping and not registry_path.is_file():
+        return
+
+    with _registry_lock(site_pkgs):
+        dist_name = _dist_name(dist_info)
+        entries = [
+            e for e in read_registry(str(site_pkgs))
+            if _dist_name(e[0]) != dist_name and (site_pkgs / e[0]).is_dir()
+        ]
+        for name, path in sorted((mapping or {}).items()):
+            entries.append((dist_info, name, str(path)))
+
+        if not entries:
+            _remove_hook(site_pkgs)
+            return
+
+        if mapping:
+            _ensure_hook(site_pkgs)
+        log.debug("Writing %d entries to %s", len(entries), registry_path)
+        _write_atomic(registry_path, REGISTRY_HEADER + ''.join(
+            '\t'.join(e) + '\n' for e in sorted(entries)
+        ))
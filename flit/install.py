@@ -11,10 +11,11 @@ import shutil
 import site
 import sys
 import tempfile
-from subprocess import check_call, check_output
+from subprocess import check_call, check_output, CalledProcessError, STDOUT
 import sysconfig
 
-from flit_core import common
+from flit_core import common, tracing
+from . import editable_registry
 from .config import read_flit_config
 from ._get_dirs import get_dirs
 
@@ -90,12 +91,16 @@ class DependencyError(Exception):
 
 class Installer:
     def __init__(self, directory, ini_info, user=None, python=sys.executable,
-                 symlink=False, deps='all', extras=(), pth=False):
+                 symlink=False, deps='all', extras=(), pth=False,
+                 compile_bytecode=False, optimize_levels=(0,), import_hook=False):
         self.directory = directory
         self.ini_info = ini_info
         self.python = python
         self.symlink = symlink
         self.pth = pth
+        self.import_hook = import_hook
+        self.compile_bytecode = compile_bytecode
+        self.optimize_levels = optimize_levels
         self.deps = deps
         self.extras = extras
         if deps != 'none' and os.environ.get('FLIT_NO_NETWORK', ''):
@@ -117,15 +122,21 @@ class Installer:
         log.debug('User install? %s', self.user)
 
         self.installed_files = []
+        self.installed_dirs = None
+        self._metadata = None
 
     @classmethod
     def from_ini_path(cls, ini_path, user=None, python=sys.executable,
-                      symlink=False, deps='all', extras=(), pth=False):
+                      symlink=False, deps='all', extras=(), pth=False,
+                      compile_bytecode=False, optimize_levels=(0,),
+                      import_hook=False):
         ini_info = read_flit_config(ini_path)
         return cls(ini_path.parent, ini_info, user=user, python=python,
-                   symlink=symlink, deps=deps, extras=extras, pth=pth)
+                   symlink=symlink, deps=deps, extras=extras, pth=pth,
+                   compile_bytecode=compile_bytecode,
+                   optimize_levels=optimize_levels, import_hook=import_hook)
 
-    def _run_python(self, code=None, file=None, extra_args=()):
+    def _run_python(self, code=None, file=None, extra_args=(), stderr=None):
         if code and file:
             raise ValueError('Specify code or file, not both')
         if not (code or file):
@@ -141,7 +152,7 @@ class Installer:
         # On Windows, shell needs to be True to pick up our local PATH
         # when finding the Python command.
         shell = (os.name == 'nt')
-        return check_output(args, shell=shell, env=env).decode('utf-8')
+        return check_output(args, shell=shell, env=env, stderr=stderr).decode('utf-8')
 
     def _auto_user(self, python):
         """Default guess for whether to do user-level install.
@@ -198,14 +209,22 @@ class Installer:
         for src_path in common.walk_data_dir(self.ini_info.data_directory):
             rel_path = os.path.relpath(src_path, self.ini_info.data_directory)
             dst_path = os.path.join(target_data_dir, rel_path)
-            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-            pathlib.Path(dst_path).unlink(missing_ok=True)
-            if self.symlink:
-                os.symlink(os.path.realpath(src_path), dst_path)
-            else:
-                shutil.copy2(src_path, dst_path)
+            self._install_data_file(src_path, dst_path)
             self.installed_files.append(dst_path)
 
+    @staticmethod
+    def _install_module_file(src_path, dst_path):
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        shutil.copy2(src_path, dst_path)
+
+    def _install_data_file(self, src_path, dst_path):
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        pathlib.Path(dst_path).unlink(missing_ok=True)
+        if self.symlink:
+            os.symlink(os.path.realpath(src_path), dst_path)
+        else:
+            shutil.copy2(src_path, dst_path)
+
     def _record_installed_directory(self, path):
         for dirpath, dirnames, files in os.walk(path):
             for f in files:
@@ -225,29 +244,34 @@ class Installer:
         log.info("Extras to install for deps %r: %s", self.deps, extras_to_install)
         return extras_to_install
 
-    def install_requirements(self):
-        """Install requirements of a package with pip.
-
-        Creates a temporary requirements.txt from requires_dist metadata.
-        """
+    def requirements_to_install(self):
+        """Get the requirements to install, in pip's requirements.txt format"""
         # construct the full list of requirements, including dev requirements
         requirements = []
 
         if self.deps == 'none':
-            return
+            return []
 
         for extra in self._extras_to_install():
             requirements.extend(self.ini_info.reqs_by_extra.get(extra, []))
 
-        # there aren't any requirements, so return
-        if len(requirements) == 0:
-            return
-
-        requirements = [
+        return [
             _requires_dist_to_pip_requirement(req_d)
             for req_d in requirements
         ]
 
+    def install_requirements(self):
+        """Install requirements of a package with pip.
+
+        Creates a temporary requirements.txt from requires_dist metadata.
+        """
+        self.pip_install_requirements(self.requirements_to_install())
+
+    def pip_install_requirements(self, requirements):
+        # there aren't any requirements, so return
+        if len(requirements) == 0:
+            return
+
         # install the requirements with pip
         cmd = [self.python, '-m', 'pip', 'install']
         if self.user:
@@ -281,6 +305,47 @@ class Installer:
             i2 = Installer(self.directory, self.ini_info, user=user, deps='production')
             i2.install_requirements()
 
+    def install_bytecode(self, path):
+        """Compile the .py files at path to bytecode in the target Python.
+
+        Directories are compiled on a process pool. The .pyc files are not
+        added to RECORD, but tools removing the package will clean up
+        __pycache__ folders.
+        """
+        levels = [str(l) for l in self.optimize_levels]
+        log.info("Compiling bytecode for %s (optimization levels: %s)",
+                 path, ', '.join(levels))
+        script = osp.join(osp.dirname(__file__), '_compile_bytecode.py')
+        try:
+            self._run_python(file=script, extra_args=[str(path)] + levels,
+                             stderr=STDOUT)
+        except CalledProcessError as e:
+            # e.g. a read-only source directory - the package still works
+            log.warning("Could not compile bytecode for all files in %s", path)
+            log.debug("compileall output:\n%s", e.output.decode('utf-8', 'replace'))
+
+    def _dist_info_name(self):
+        if self._metadata is None:
+            self._metadata = common.make_metadata(self.module, self.ini_info)
+        return common.dist_info_name(self._metadata.name, self._metadata.version)
+
+    def install_import_hook(self, site_pkgs):
+        """Register the module in the import hook shared by editable installs
+
+        The hook maps only the module's name to its source, instead of adding
+        its folder to sys.path.
+        """
+        log.info("Registering %s in editable import hook in %s",
+                 self.module.path, site_pkgs)
+        editable_registry.update_registry(
+            site_pkgs, self._dist_info_name(),
+            {self.module.name: self.module.path.resolve()}
+        )
+
+    @property
+    def editable(self):
+        return bool(self.symlink or self.pth or self.import_hook)
+
     def _get_dirs(self, user):
         if self.python == sys.executable:
             return get_dirs(user=user)
@@ -290,10 +355,11 @@ class Installer:
             args = ['--user'] if user else []
             return json.loads(self._run_python(file=path, extra_args=args))
 
-    def install_directly(self):
+    def install_directly(self, install_deps=True):
         """Install a module/package into site-packages, and create its scripts.
         """
         dirs = self._get_dirs(user=self.user)
+        self.installed_dirs = dirs
         os.makedirs(dirs['purelib'], exist_ok=True)
         os.makedirs(dirs['scripts'], exist_ok=True)
 
@@ -306,14 +372,20 @@ class Installer:
                 os.unlink(dst)
 
         # Install requirements to target environment
-        self.install_requirements()
+        if install_deps:
+            self.install_requirements()
 
         # Install requirements to this environment if we need them to
         # get docstring & version number.
         if self.python != sys.executable:
             self.install_reqs_my_python_if_needed()
 
+        if not self.import_hook:
+            # Drop any previous import hook install of this package
+            editable_registry.update_registry(dirs['purelib'], self._dist_info_name())
+
         src = self.module.path
+        installed_path = src.resolve() if self.editable else dst
         if self.symlink:
             if self.module.in_namespace_package:
                 ns_dir = os.path.dirname(dst)
@@ -329,22 +401,77 @@ class Installer:
             log.info("Adding .pth file %s for %s", pth_file, self.module.source_dir)
             pth_file.write_text(str(self.module.source_dir.resolve()), 'utf-8')
             self.installed_files.append(pth_file)
+        elif self.import_hook:
+            self.install_import_hook(dirs['purelib'])
         elif self.module.is_package:
             log.info("Copying directory %s -> %s", src, dst)
-            shutil.copytree(src, dst)
-            self._record_installed_directory(dst)
+            with tracing.span('copy package'):
+                shutil.copytree(src, dst)
+                self._record_installed_directory(dst)
         else:
             log.info("Copying file %s -> %s", src, dst)
             os.makedirs(osp.dirname(dst), exist_ok=True)
             shutil.copy2(src, dst)
             self.installed_files.append(dst)
 
+        if self.compile_bytecode:
+            self.install_bytecode(installed_path)
+
         scripts = self.ini_info.entrypoints.get('console_scripts', {})
         self.install_scripts(scripts, dirs['scripts'])
 
         self.install_data_dir(dirs['data'])
 
-        self.write_dist_info(dirs['purelib'])
+        with tracing.span('write dist-info') as sp:
+            self.write_dist_info(dirs['purelib'])
+            sp['files'] = len(self.installed_files)
+
+    def update_installed_files(self, changed_paths):
+        """Bring an install made by install_directly() up to date with its source
+
+        changed_paths are source files which have been modified, added or
+        deleted. Editable installs use the module from its source folder, so
+        only data files are updated for them; otherwise, changed module files
+        are copied as well. RECORD is rewritten to match.
+        """
+        dirs = self.installed_dirs
+        targets = []
+        if not self.editable:
+            module_rel_path = self.module.path.relative_to(self.module.source_dir)
+            targets.append((str(self.module.path),
+                            osp.join(dirs['purelib'], module_rel_path),
+                            self._install_module_file))
+        if self.ini_info.data_directory:
+            targets.append((str(self.ini_info.data_directory), dirs['data'],
+                            self._install_data_file))
+
+        for src in map(str, changed_paths):
+            for src_root, dst_root, install_file in targets:
+                if src == src_root:
+                    dst = dst_root
+                elif src.startswith(src_root + os.sep):
+                    dst = osp.join(dst_root, osp.relpath(src, src_root))
+                else:
+                    continue
+
+                if osp.isfile(src):
+                    log.info("Updating %s", dst)
+                    install_file(src, dst)
+                    if dst not in map(str, self.installed_files):
+                        self.installed_files.append(dst)
+                elif not osp.exists(src):
+                    log.info("Removing %s", dst)
+                    if osp.isdir(dst) and not osp.islink(dst):
+                        shutil.rmtree(dst)
+                    elif osp.lexists(dst):
+                        os.unlink(dst)
+                    self.installed_files = [
+                        p for p in self.installed_files
+                        if not (str(p) == dst or str(p).startswith(dst + os.sep))
+                    ]
+
+        with tracing.span('write dist-info'):
+            self.write_dist_info(dirs['purelib'])
 
     def install_with_pip(self):
         """Let pip install the project directory
@@ -368,11 +495,18 @@ class Installer:
         shell = (os.name == 'nt')
         check_call(cmd, shell=shell)
 
+    def dist_info_path(self):
+        """The .dist-info folder written by install_directly()"""
+        return pathlib.Path(self.installed_dirs['purelib'], self._dist_info_name())
+
     def write_dist_info(self, site_pkgs):
         """Write dist-info folder, according to PEP 376"""
-        metadata = common.make_metadata(self.module, self.ini_info)
-        dist_info = pathlib.Path(site_pkgs) / common.dist_info_name(
-                                                metadata.name, metadata.version)
+        dist_info = pathlib.Path(site_pkgs) / self._dist_info_name()
+        metadata = self._metadata
+        # Writing dist-info again (e.g. after updating files) replaces it
+        self.installed_files = [
+            p for p in self.installed_files if pathlib.Path(p).parent != dist_info
+        ]
         try:
             dist_info.mkdir()
         except FileExistsError:
@@ -400,7 +534,7 @@ class Installer:
             json.dump(
                 {
                     "url": self.directory.resolve().as_uri(),
-                    "dir_info": {"editable": bool(self.symlink or self.pth)}
+                    "dir_info": {"editable": self.editable}
                 },
                 f
             )
@@ -425,7 +559,7 @@ class Installer:
             cf.writerow(((dist_info / 'RECORD').relative_to(site_pkgs), '', ''))
 
     def install(self):
-        if self.symlink or self.pth:
+        if self.editable:
             self.install_directly()
         else:
             self.install_with_pip()
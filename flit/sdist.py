@@ -9,6 +9,7 @@ import tarfile
 
 from flit_core.sdist import SdistBuilder as SdistBuilderCore
 from flit_core.common import Module, VCSError
+from flit_core import tracing
 from flit.vcs import identify_vcs
 
 log = logging.getLogger(__name__)
@@ -170,7 +171,10 @@ class SdistBuilder(SdistBuilderCore):
 
         vcs_mod = identify_vcs(self.cfgdir)
         if vcs_mod is not None:
-            untracked_deleted = vcs_mod.list_untracked_deleted_files(self.cfgdir)
+            with tracing.span('VCS query', vcs=vcs_mod.name) as sp:
+                untracked_deleted = vcs_mod.list_untracked_deleted_files(self.cfgdir)
+                tracked = vcs_mod.list_tracked_files(self.cfgdir)
+                sp['files'] = len(tracked)
             if any(include_path(p) and not self.excludes.match_file(p)
                    for p in untracked_deleted):
                 raise VCSError(
@@ -178,8 +182,7 @@ class SdistBuilder(SdistBuilderCore):
                     "Commit, undo or ignore these files in your VCS.",
                     self.cfgdir)
 
-            files = [os.path.normpath(p)
-                     for p in vcs_mod.list_tracked_files(self.cfgdir)]
+            files = [os.path.normpath(p) for p in tracked]
             files = sorted(filter(include_path, files))
             log.info("Found %d files tracked in %s", len(files), vcs_mod.name)
         else:
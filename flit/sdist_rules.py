@@ -10,7 +10,6 @@ remove includes & excludes manually.
 """
 
 import argparse
-import glob
 import sys
 from pathlib import Path
 
@@ -18,37 +17,140 @@ import tomli_w
 
 from flit_core.common import Module
 from flit_core.config import read_flit_config
-from .vcs.git import list_tracked_files
+from .vcs.git import list_tracked_files, list_untracked_files
+
+# What the files in the tree are
+WANTED = 'wanted'  # Tracked in git; needs to be included
+AUTO = 'auto'  # Included in the sdist anyway (module, pyproject.toml, etc.)
+OTHER = 'other'  # Not tracked; must be excluded if it's in an included folder
+
+
+class _Dir:
+    """A folder in the trie of paths
+
+    Leaves (in ``files``) are files, or folders we don't need to look inside,
+    like the package folder or a folder with no tracked files.
+    """
+    __slots__ = ('dirs', 'files', 'keep', 'cost_listed', 'cost_included')
+
+    def __init__(self):
+        self.dirs = {}  # name -> _Dir
+        self.files = {}  # name -> (kind, is_dir)
+        # Computed by _count():
+        self.keep = False  # Anything in here must be in the sdist
+        self.cost_listed = 0  # Rules needed if the folder isn't included
+        self.cost_included = 0  # Rules needed if the folder is included
+
+    def add(self, parts, kind, is_dir=False):
+        node = self
+        for part in parts[:-1]:
+            if node.files.get(part, (None,))[0] == AUTO:
+                return  # Inside an auto-included folder
+            node.files.pop(part, None)  # Replace a leaf with a folder node
+            node = node.dirs.setdefault(part, _Dir())
+        name = parts[-1]
+        if kind == AUTO or name not in node.dirs:
+            node.files[name] = (kind, is_dir)
+            node.dirs.pop(name, None)
+
+    def _exclude_whole(self):
+        # Excluding the folder takes 1 rule, but we can only do that if there's
+        # nothing in it we need, and it's only worthwhile if it's not empty.
+        return (not self.keep) and self.cost_included > 0
+
+    def _count(self):
+        """Work out the costs of including this folder or not, bottom-up"""
+        keep = False
+        listed = included = 0
+        for kind, _ in self.files.values():
+            if kind == WANTED:
+                listed += 1
+            elif kind == OTHER:
+                included += 1
+            keep = keep or kind != OTHER
+
+        for d in self.dirs.values():
+            d._count()
+            keep = keep or d.keep
+            # Either the subfolder is included (1 rule + its excludes), or we
+            # look inside it. Including the folder is preferred in a tie.
+            listed += min(d.cost_listed, 1 + d.cost_included)
+            included += 1 if d._exclude_whole() else d.cost_included
+
+        self.keep = keep
+        self.cost_listed = listed
+        self.cost_included = included
+
+    def _rules_listed(self, path: Path, includes, excludes):
+        for name, (kind, is_dir) in self.files.items():
+            if kind == WANTED:
+                includes.append((path / name, is_dir))
+        for name, d in self.dirs.items():
+            if d.cost_listed < 1 + d.cost_included:
+                d._rules_listed(path / name, includes, excludes)
+            else:
+                includes.append((path / name, True))
+                d._rules_included(path / name, includes, excludes)
+
+    def _rules_included(self, path: Path, includes, excludes):
+        for name, (kind, is_dir) in self.files.items():
+            if kind == OTHER:
+                excludes.append((path / name, is_dir))
+        for name, d in self.dirs.items():
+            if d._exclude_whole():
+                excludes.append((path / name, True))
+            else:
+                d._rules_included(path / name, includes, excludes)
+
+    def rules(self):
+        """Find include & exclude rules covering the WANTED files
+
+        Returns two lists of (path, is_dir) tuples. This is a single pass
+        over the tree, so it scales linearly with the number of paths.
+        """
+        self._count()
+        includes, excludes = [], []
+        self._rules_listed(Path(), includes, excludes)
+        return includes, excludes
 
-def read_gitignore(path: Path):
-    rules = []
-    for line in path.read_text('utf-8').splitlines(keepends=False):
-        if (not line.strip()) or line.startswith('#'):
-            continue  # Blank line or comment
 
-    exclude = True
-    if line.startswith('!'):
-        exclude = False
-        line = line[1:]
+def auto_exclude(p: Path):
+    """Check if a path will be excluded regardless of config"""
+    return p.name == '__pycache__' or p.suffix == '.pyc'
 
-    # TODO: backslash escaping?
-    rules.append((exclude, glob.translate(line)))
 
+def find_rules(tracked, untracked, auto_inc_files=(), auto_inc_dirs=()):
+    """Choose include & exclude rules to put tracked files in the sdist
 
-def is_ignored(path: Path, rules):
-    # A later ! rule can re-include an excluded file, so we need to evaluate
-    # all the rules
-    ignored = False
-    for exclude, pattern in rules:
-        if pattern.match(path):
-            ignored = exclude
+    tracked & untracked are relative paths, as strings. Untracked paths ending
+    with '/' are folders without any tracked files in (as listed by
+    ``git ls-files --others --directory``). Files already included in the sdist
+    regardless of these rules are passed as auto_inc_files & auto_inc_dirs.
 
-    return ignored
+    Returns lists of include & exclude patterns.
+    """
+    root = _Dir()
+    for s in untracked:
+        p = Path(s)
+        if not auto_exclude(p):
+            root.add(p.parts, OTHER, is_dir=s.endswith('/'))
+    for s in tracked:
+        root.add(Path(s).parts, WANTED)
+    # Added last so they can replace subtrees of the other paths
+    for p in auto_inc_dirs:
+        root.add(Path(p).parts, AUTO, is_dir=True)
+    for p in auto_inc_files:
+        root.add(Path(p).parts, AUTO)
 
+    includes, excludes = root.rules()
 
-def auto_exclude(p: Path):
-    """Check if a path will be excluded regardless of config"""
-    return p.name == '__pycache__' or p.suffix == '.pyc'
+    def fmt_path(p: Path, is_dir) -> str:
+        return p.as_posix() + ('/' if is_dir else '')
+
+    return (
+        sorted([fmt_path(*i) for i in includes], key=str.lower),
+        sorted([fmt_path(*e) for e in excludes], key=str.lower),
+    )
 
 
 def main():
@@ -73,47 +175,22 @@ def main():
     if config.data_directory is not None:
         auto_inc_dirs.append(config.data_directory)
 
-    def auto_include(p: Path):
-        return p in auto_inc_files or any(p.is_relative_to(d) for d in auto_inc_dirs)
-
-    includes = [p for s in list_tracked_files(".") if not auto_include(p := Path(s))]
-    debug(f"{len(includes)} additional files to include in sdist")
-
-    # For each directory containing included files, does including the directory
-    # and excluding ignored files mean fewer rules overall
-    candidate_dirs = set()
-    for path in includes:
-        candidate_dirs.update(path.parents[:-1])  # slice off Path(".")
-
-    new_includes = set(includes)
-    new_excludes = set()
-
-    for dir in sorted(candidate_dirs, key=lambda p: (-len(p.parts), p)):
-        debug(f"Evaluating {dir}")
-        included_matches = [p for p in new_includes if p.is_relative_to(dir)]
-        add_excludes = [p for p in dir.iterdir()
-                        if p not in included_matches and not auto_exclude(p)]
-
-        debug(f"Could replace {len(included_matches)} includes: "
-              f"{[str(p.relative_to(dir)) for p in included_matches]}")
-        debug(f"Would require {len(add_excludes)} additional excludes: "
-              f"{[str(p.relative_to(dir)) for p in add_excludes]}")
-        if len(included_matches) > len(add_excludes):
-            debug("Replacing")
-            new_includes -= set(included_matches)
-            new_includes.add(dir)
-            new_excludes |= set(add_excludes)
-        debug()
-
-    def fmt_path(p: Path) -> str:
-        return p.as_posix() + ('/' if p.is_dir() else '')
+    # Ignored files are listed as untracked too: the sdist doesn't know about
+    # .gitignore, so anything ignored inside an included folder must be
+    # excluded explicitly. git lists folders with nothing tracked in them as
+    # a single entry, so we don't need to walk them.
+    tracked = list_tracked_files(".")
+    untracked = list_untracked_files(".")
+    debug(f"{len(tracked)} tracked & {len(untracked)} untracked paths")
+
+    includes, excludes = find_rules(
+        tracked, untracked, auto_inc_files, auto_inc_dirs
+    )
+    debug(f"{len(includes)} include & {len(excludes)} exclude rules")
 
     print("# The TOML table below can be copied into your pyproject.toml\n")
     print("[tool.flit.sdist]")
-    print(tomli_w.dumps({
-        "include": sorted([fmt_path(p) for p in new_includes], key=str.lower),
-        "exclude": sorted([fmt_path(p) for p in new_excludes], key=str.lower),
-    }))
+    print(tomli_w.dumps({"include": includes, "exclude": excludes}))
 
 
 if __name__ == "__main__":
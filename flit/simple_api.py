@@ -0,0 +1,91 @@
+"""Query which files an index already has, using the simple repository API
+
+This uses the JSON form of the API (PEP 691) where the index supports it,
+falling back to the HTML form (PEP 503).
+"""
+from html.parser import HTMLParser
+import logging
+import re
+from urllib.parse import urlparse, urlunparse, urljoin
+
+log = logging.getLogger(__name__)
+
+ACCEPT = ('application/vnd.pypi.simple.v1+json, '
+          'application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.1')
+
+
+def simple_index_url(upload_url):
+    """Guess the simple API URL from the legacy upload URL
+
+    This works for PyPI, TestPyPI and other indexes following the same
+    pattern (e.g. https://upload.example.com/legacy/ ->
+    https://example.com/simple/). Returns None for other URLs.
+    """
+    u = urlparse(upload_url)
+    path = u.path.rstrip('/')
+    if not path.endswith('/legacy'):
+        return None
+    netloc = u.netloc[7:] if u.netloc.startswith('upload.') else u.netloc
+    return urlunparse(u._replace(netloc=netloc, path=path[:-6] + 'simple/'))
+
+
+def normalise_project_name(name):
+    # https://packaging.python.org/en/latest/specifications/name-normalization/
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._href = dict(attrs).get('href', '')
+            self._text = []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._href is not None:
+            filename = ''.join(self._text).strip()
+            fragment = urlparse(self._href).fragment
+            sha256 = fragment[7:] if fragment.startswith('sha256=') else None
+            self.files[filename] = sha256
+            self._href = None
+
+
+def parse_project_page(content_type, body: bytes):
+    """Parse a project page from the simple API
+
+    Returns a dict of filenames to sha256 hashes (None if not given).
+    """
+    if content_type.startswith('application/vnd.pypi.simple.v1+json'):
+        import json
+        data = json.loads(body)
+        return {f['filename']: f.get('hashes', {}).get('sha256')
+                for f in data['files']}
+
+    parser = _LinkParser()
+    parser.feed(body.decode('utf-8', errors='replace'))
+    parser.close()
+    return parser.files
+
+
+def existing_files(session, simple_url, project_name):
+    """Get the files the index has for a project
+
+    Returns a dict of filenames to sha256 hashes, which is empty if the
+    project doesn't exist yet.
+    """
+    url = urljoin(simple_url, normalise_project_name(project_name) + '/')
+    log.debug("Checking for existing files at %s", url)
+    resp = session.get(url, headers={'Accept': ACCEPT})
+    if resp.status_code == 404:
+        return {}
+    resp.raise_for_status()
+    return parse_project_page(resp.headers.get('Content-Type', ''), resp.content)
@@ -12,12 +12,17 @@ from pathlib import Path
 import re
 import requests
 import sys
+import threading
+import time
 from dataclasses import dataclass
 from typing import Optional
 from urllib.parse import urlparse
 
 from flit_core.common import make_metadata, Metadata, Module
+from flit_core import tracing
+from flit_core.digests import lookup_digests
 from .config import read_flit_config
+from .credentials import KeyringLookup, keyring_installed
 
 log = logging.getLogger(__name__)
 
@@ -75,11 +80,17 @@ def get_repositories(file="~/.pypirc"):
     return repos
 
 
-def get_repository(pypirc_path="~/.pypirc", name=None, project_name=None):
+def get_repository(pypirc_path="~/.pypirc", name=None, project_name=None,
+                   credentials=None, wait_for_password=True):
     """Get the url, username and password for one repository.
 
     Returns a dict with keys 'url', 'username', 'password'.
 
+    credentials is a KeyringLookup object, to share keyring results between
+    calls. If wait_for_password is False, keyring lookups are started in the
+    background, and the password is left unset: pass the same credentials
+    object to resolve_password() later to fill it in.
+
     There is a hierarchy of possible sources of information:
 
     Index URL:
@@ -139,16 +150,30 @@ def get_repository(pypirc_path="~/.pypirc", name=None, project_name=None):
     if 'FLIT_PASSWORD' in os.environ:
         repo.password = os.environ['FLIT_PASSWORD']
 
-    if not repo.password:
-        token = find_token(repo, project_name)
-        if token is not None:
-            repo.username = '__token__'
-            repo.password = token
-        else:
-            repo.password = get_password(repo)
+    if credentials is None:
+        credentials = KeyringLookup()
+    if wait_for_password:
+        resolve_password(repo, project_name, credentials)
+    elif not repo.password:
+        for service, key in credential_keys(repo, project_name):
+            credentials.start(service, key)
 
     return repo
 
+
+def resolve_password(repo: RepoDetails, project_name, credentials=None):
+    """Fill in the password (or token) for repo, if it's not already set"""
+    if repo.password:
+        return
+    if credentials is None:
+        credentials = KeyringLookup()
+    token = find_token(repo, project_name, credentials)
+    if token is not None:
+        repo.username = '__token__'
+        repo.password = token
+    else:
+        repo.password = get_password(repo, credentials)
+
 def write_pypirc(repo, file="~/.pypirc"):
     """Write .pypirc if it doesn't already exist
     """
@@ -160,19 +185,17 @@ def write_pypirc(repo, file="~/.pypirc"):
         f.write("[pypi]\n"
                 f"username = {repo.username}\n")
 
-def get_password(repo: RepoDetails):
-    try:
-        import keyring, keyring.errors
-    except ImportError:  # pragma: no cover
-        log.warning("Install keyring to store tokens/passwords securely")
-        keyring = None
+def get_password(repo: RepoDetails, credentials=None):
+    if credentials is None:
+        credentials = KeyringLookup()
+    if not credentials.keyring_available():
+        # If keyring is installed, but disabled or not working, we've said why
+        if not keyring_installed():
+            log.warning("Install keyring to store tokens/passwords securely")
     else:
-        try:
-            stored_pw = keyring.get_password(repo.url, repo.username)
-            if stored_pw is not None:
-                return stored_pw
-        except keyring.errors.KeyringError as e:
-            log.warning("Could not get password from keyring (%s)", e)
+        stored_pw = credentials.get_password(repo.url, repo.username)
+        if stored_pw is not None:
+            return stored_pw
 
     if sys.stdin.isatty():
         pw = None
@@ -183,36 +206,41 @@ def get_password(repo: RepoDetails):
     else:
         raise Exception("Could not find password for upload.")
 
-    if keyring is not None:
-        try:
-            keyring.set_password(repo.url, repo.username, pw)
-            log.info("Stored password with keyring")
-        except keyring.errors.KeyringError as e:
-            log.warning("Could not store password in keyring (%s)", e)
+    if credentials.set_password(repo.url, repo.username, pw):
+        log.info("Stored password with keyring")
 
     return pw
 
 
-def find_token(repo: RepoDetails, project_name: str):
+def _token_keys(repo: RepoDetails, project_name: str):
     # https://packaging.python.org/en/latest/specifications/name-normalization/
     project_name = re.sub(r"[-_.]+", "-", project_name).lower()
     candidate_keys = [f"pypi_token:project:{project_name}"]
 
     if repo.username is not None:
         candidate_keys.append(f"pypi_token:user:{repo.username}")
+    return candidate_keys
 
-    try:
-        import keyring, keyring.errors
-    except ImportError:  # pragma: no cover
-        pass
-    else:
-        try:
-            for key in candidate_keys:
-                token = keyring.get_password(repo.url, key)
-                if token is not None:
-                    return token
-        except keyring.errors.KeyringError as e:
-            log.warning("Could not get token from keyring (%s)", e)
+
+def credential_keys(repo: RepoDetails, project_name: str):
+    """The (service, username) pairs which may be looked up in keyring"""
+    keys = [(repo.url, key) for key in _token_keys(repo, project_name)]
+    if repo.username is not None:
+        keys.append((repo.url, repo.username))
+    return keys
+
+
+def find_token(repo: RepoDetails, project_name: str, credentials=None):
+    if credentials is None:
+        credentials = KeyringLookup()
+    candidate_keys = _token_keys(repo, project_name)
+    # Start all the lookups before waiting for any of them
+    for key in candidate_keys:
+        credentials.start(repo.url, key)
+    for key in candidate_keys:
+        token = credentials.get_password(repo.url, key)
+        if token is not None:
+            return token
 
 
 def build_post_data(action, metadata:Metadata):
@@ -257,9 +285,178 @@ def build_post_data(action, metadata:Metadata):
 
     return {k:v for k,v in d.items() if v}
 
-def upload_file(file:Path, metadata:Metadata, repo: RepoDetails):
+def file_digests(file: Path, chunk_size=1 << 20):
+    """Get the digests an index server wants
+
+    If flit built the file, the digests it recorded then are used, unless the
+    file has changed since. Otherwise, this reads the file once.
+    """
+    recorded = lookup_digests(file)
+    if recorded is not None and 'md5' in recorded:
+        log.debug("Using recorded digests for %s", file.name)
+        return {'md5_digest': recorded['md5'], 'sha256_digest': recorded['sha256']}
+
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with file.open('rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            md5.update(chunk)
+            sha256.update(chunk)
+    return {'md5_digest': md5.hexdigest(), 'sha256_digest': sha256.hexdigest()}
+
+
+class UploadCancelled(Exception):
+    """An upload was stopped part way, because another step failed"""
+    def __init__(self, file: Path):
+        self.file = file
+
+    def __str__(self):
+        return f"Upload of {self.file.name} was cancelled"
+
+
+def check_cancelled(cancel, file: Path):
+    if cancel is not None and cancel.is_set():
+        raise UploadCancelled(file)
+
+
+class MultipartEncoder:
+    """Stream a multipart/form-data body with form fields and one file
+
+    The fields are encoded up front, but the file is read from disk in chunks
+    as the body is sent, so memory use doesn't depend on the size of the file.
+    The length is known in advance, so requests sends a Content-Length header.
+
+    Each encoder can be read once; make a new one to send the body again.
+    If cancel (a threading.Event) is set while the file is being sent,
+    reading raises UploadCancelled, so the index never gets the whole body.
+    """
+    def __init__(self, fields: dict, file_field: str, file: Path,
+                 chunk_size=1 << 16, boundary=None, cancel=None):
+        self.boundary = boundary or os.urandom(16).hex()
+        self.cancel = cancel
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.chunk_size = chunk_size
+
+        head = []
+        for name, value in fields.items():
+            # Multiple values are sent as repeated fields, like requests does
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                head.append(self._part_header(f'name="{name}"'))
+                head.append(str(v).encode('utf-8') + b'\r\n')
+        head.append(self._part_header(
+            f'name="{file_field}"; filename="{file.name}"',
+            content_type='application/octet-stream',
+        ))
+        self._head = b''.join(head)
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+        self._file_size = file.stat().st_size
+        self._file = file
+        self._parts = self._iter_parts()
+        self._buffer = b''
+
+    def _part_header(self, disposition, content_type=None):
+        lines = [f'--{self.boundary}',
+                 f'Content-Disposition: form-data; {disposition}']
+        if content_type:
+            lines.append(f'Content-Type: {content_type}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def _iter_parts(self):
+        yield self._head
+        with self._file.open('rb') as f:
+            while True:
+                check_cancelled(self.cancel, self._file)
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self._tail
+
+    def __iter__(self):
+        return self._parts
+
+    def read(self, size=-1):
+        """Read up to size bytes of the body (file-like interface for http.client)"""
+        if size is None or size < 0:
+            data, self._buffer = self._buffer + b''.join(self._parts), b''
+            return data
+        while len(self._buffer) < size:
+            chunk = next(self._parts, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+#: Upload this many files at once by default
+DEFAULT_JOBS = 4
+#: Give up on a file after it has been rate limited this many times
+MAX_ATTEMPTS = 5
+#: Maximum time to wait before retrying a rate limited upload, in seconds
+MAX_RETRY_DELAY = 300
+
+
+def make_session(jobs=DEFAULT_JOBS):
+    """Make a requests session with a connection pool big enough for jobs"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=jobs)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def retry_delay(resp, attempt):
+    """How long to wait before retrying a request, in seconds
+
+    Returns None if the response doesn't indicate that it should be retried.
+    """
+    if resp.status_code not in (429, 503):
+        return None
+    retry_after = resp.headers.get('Retry-After')
+    if retry_after is None:
+        if resp.status_code == 503:
+            return None
+        delay = 2 ** attempt  # Exponential backoff
+    elif retry_after.strip().isdigit():
+        delay = int(retry_after)
+    else:
+        from email.utils import parsedate_to_datetime
+        from datetime import datetime, timezone
+        try:
+            when = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(delay, 0), MAX_RETRY_DELAY)
+
+
+def upload_file(file:Path, metadata:Metadata, repo: RepoDetails, session=None,
+                digests=None, chunk_size=None, cancel=None):
     """Upload a file to an index server, given the index server details.
+
+    If the server asks us to slow down (HTTP 429 or 503 with Retry-After), the
+    upload is retried after waiting. digests can be passed in if they have
+    already been calculated with file_digests().
+
+    If chunk_size is given, and the index supports it, the file is sent in
+    chunks of that many bytes, and the upload can resume after errors (see
+    chunked_upload.py). Otherwise it's sent in one POST request.
+
+    If cancel (a threading.Event) is set, the upload stops part way, raising
+    UploadCancelled.
     """
+    if session is None:
+        with requests.Session() as session:
+            return upload_file(file, metadata, repo, session, digests,
+                               chunk_size, cancel)
+
     data = build_post_data('file_upload', metadata)
     data['protocol_version'] = '1'
     if file.suffix == '.whl':
@@ -270,23 +467,48 @@ def upload_file(file:Path, metadata:Metadata, repo: RepoDetails):
     else:
         data['filetype'] = 'sdist'
 
-    with file.open('rb') as f:
-        content = f.read()
-        files = {'content': (file.name, content)}
-        data['md5_digest'] = hashlib.md5(content).hexdigest()
-        data['sha256_digest'] = hashlib.sha256(content).hexdigest()
+    data.update(digests or file_digests(file))
+
+    if chunk_size:
+        from .chunked_upload import upload_chunked, ChunkedUploadNotSupported
+        log.info('Uploading %s in chunks of %d bytes...', file, chunk_size)
+        try:
+            return upload_chunked(session, repo, file, data, chunk_size, cancel)
+        except ChunkedUploadNotSupported as e:
+            log.info("Chunked uploads not supported (%s); using a single request", e)
 
     log.info('Uploading %s...', file)
-    resp = requests.post(
-        repo.url, data=data, files=files, auth=(repo.username, repo.password),
-    )
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        check_cancelled(cancel, file)
+        body = MultipartEncoder(data, 'content', file, cancel=cancel)
+        resp = session.post(
+            repo.url, data=body, auth=(repo.username, repo.password),
+            headers={'Content-Type': body.content_type},
+        )
+        delay = retry_delay(resp, attempt)
+        if delay is None or attempt == MAX_ATTEMPTS:
+            break
+        log.warning("Server responded %d uploading %s, retrying in %.0f seconds",
+                    resp.status_code, file.name, delay)
+        if cancel is not None:
+            cancel.wait(delay)
+        else:
+            time.sleep(delay)
     resp.raise_for_status()
 
 
-def do_upload(file:Path, metadata:Metadata, repo: RepoDetails):
+def do_upload(file:Path, metadata:Metadata, repo: RepoDetails, session=None,
+              digests=None, chunk_size=None, cancel=None):
     """Upload a file to an index server.
     """
-    upload_file(file, metadata, repo)
+    size = file.stat().st_size
+    start = time.perf_counter()
+    with tracing.span('upload', file=file.name, bytes_out=size):
+        upload_file(file, metadata, repo, session=session, digests=digests,
+                    chunk_size=chunk_size, cancel=cancel)
+    elapsed = time.perf_counter() - start
+    size_mb = size / 1e6
+    log.info("Uploaded %s (%.1f MB) in %.1f s", file.name, size_mb, elapsed)
 
     if repo.is_pypi:
         domain = urlparse(repo.url).netloc
@@ -295,10 +517,116 @@ def do_upload(file:Path, metadata:Metadata, repo: RepoDetails):
         log.info("Package is at https://%s/project/%s/", domain, metadata.name)
     else:
         log.info("Package is at %s/%s", repo.url, metadata.name)
+    return elapsed
+
 
+class ExistingFileMismatch(Exception):
+    def __init__(self, file: Path):
+        self.file = file
 
-def main(ini_path, repo_name, pypirc_path=None, formats=None, use_vcs=True):
-    """Build and upload wheel and sdist."""
+    def __str__(self):
+        return (f"The index already has a file called {self.file.name}, "
+                "with different contents. Files on an index can't be replaced; "
+                "build with a new version number instead.")
+
+
+def find_existing(files, repo: RepoDetails, session):
+    """Check which files are already on the index, before uploading them
+
+    Returns a set of the files which the index has with the same sha256 hash,
+    and a dict of the digests calculated along the way (path -> dict).
+    Raises ExistingFileMismatch if a file with the same name
+    but different contents is already there.
+    """
+    from .simple_api import simple_index_url, existing_files
+    simple_url = simple_index_url(repo.url)
+    if simple_url is None:
+        log.warning("Can't tell where to check for existing files for %s; "
+                    "uploading all files", repo.url)
+        return set(), {}
+
+    on_index = {}  # project name -> {filename: sha256}
+    existing, digests = set(), {}
+    for file, metadata in files:
+        if metadata.name not in on_index:
+            on_index[metadata.name] = existing_files(session, simple_url, metadata.name)
+        if file.name not in on_index[metadata.name]:
+            continue
+
+        digests[file] = file_digests(file)
+        index_sha256 = on_index[metadata.name][file.name]
+        if index_sha256 not in (None, digests[file]['sha256_digest']):
+            raise ExistingFileMismatch(file)
+        if index_sha256 is None:
+            log.warning("Index doesn't give a hash for %s; assuming it matches",
+                        file.name)
+        existing.add(file)
+    return existing, digests
+
+
+def _upload_built(file, metadata, repo, session, skip_existing, chunk_size, cancel):
+    """Upload one file which flit publish has just built"""
+    check_cancelled(cancel, file)
+    digests = None
+    if skip_existing:
+        existing, found = find_existing([(file, metadata)], repo, session)
+        if existing:
+            log.info("Skipping %s, which is already on the index", file.name)
+            return None
+        digests = found.get(file)
+    return do_upload(file, metadata, repo, session, digests, chunk_size, cancel)
+
+
+def upload_files(files, repo: RepoDetails, jobs=DEFAULT_JOBS, skip_existing=False,
+                 chunk_size=None):
+    """Upload several files, up to jobs at a time, sharing connections
+
+    files is a list of (path, metadata) pairs. Returns a list of upload times
+    in seconds, in the same order. If any uploads fail, the others are still
+    completed before the first error is raised.
+
+    If skip_existing is True, files which the index already has (with the same
+    hash) are skipped, with None in place of their upload time. chunk_size is
+    passed to upload_file().
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    jobs = max(1, min(jobs, len(files)))
+    with make_session(jobs) as session:
+        existing, digests = set(), {}
+        if skip_existing:
+            existing, digests = find_existing(files, repo, session)
+            for file in existing:
+                log.info("Skipping %s, which is already on the index", file.name)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                None if f in existing else
+                pool.submit(do_upload, f, md, repo, session, digests.get(f),
+                            chunk_size)
+                for f, md in files
+            ]
+
+    for (file, _), fut in zip(files, futures):
+        if fut is not None and fut.exception() is not None:
+            log.error("Uploading %s failed: %s", file.name, fut.exception())
+    return [fut and fut.result() for fut in futures]  # Raises the first error
+
+
+def main(ini_path, repo_name, pypirc_path=None, formats=None, use_vcs=True,
+         jobs=DEFAULT_JOBS, skip_existing=False, chunk_size=None, pipeline=False):
+    """Build and upload wheel and sdist.
+
+    By default, everything is built before anything is uploaded, so nothing
+    is published unless all the builds succeed; the uploads then run at the
+    same time.
+
+    With pipeline=True, each file starts uploading as soon as it's built, so
+    the sdist uploads while the wheel is being built. If a build or an upload
+    fails, the other uploads are stopped part way, and no more files are
+    built. But a file which was already uploaded can't be taken back: e.g. the
+    sdist may be on the index even though the wheel failed to build from it.
+    """
     if pypirc_path is None:
         pypirc_path = PYPIRC_DEFAULT
     elif not os.path.isfile(pypirc_path):
@@ -308,14 +636,94 @@ def main(ini_path, repo_name, pypirc_path=None, formats=None, use_vcs=True):
     srcdir = ini_path.parent
     module = Module(ini_info.module, srcdir)
     metadata = make_metadata(module, ini_info)
-    repo = get_repository(pypirc_path, repo_name, project_name=metadata.name)
+    # Look up credentials in keyring while the build runs
+    credentials = KeyringLookup()
+    repo = get_repository(pypirc_path, repo_name, project_name=metadata.name,
+                          credentials=credentials, wait_for_password=False)
 
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
     from . import build
-    built = build.main(
-        ini_path, formats=formats, use_vcs=use_vcs
-    )
-
-    if built.wheel is not None:
-        do_upload(built.wheel.file, built.wheel.builder.metadata, repo)
-    if built.sdist is not None:
-        do_upload(built.sdist.file, built.sdist.builder.metadata, repo)
+
+    if not pipeline:
+        built = build.main(ini_path, formats=formats, use_vcs=use_vcs)
+        resolve_password(repo, metadata.name, credentials)
+        files = [(info.file, info.builder.metadata)
+                 for info in (built.wheel, built.sdist) if info is not None]
+        upload_files(files, repo, jobs=jobs, skip_existing=skip_existing,
+                     chunk_size=chunk_size)
+        return
+
+    cancel = threading.Event()
+    uploads = []  # (path, future) pairs
+    with make_session(jobs) as session, ThreadPoolExecutor(max_workers=jobs) as pool:
+        def start_upload(info):
+            # Called between builds: stop building if an upload already failed
+            for _, fut in uploads:
+                if fut.done() and fut.exception() is not None:
+                    raise fut.exception()
+            if not uploads:
+                resolve_password(repo, metadata.name, credentials)
+            uploads.append((info.file, pool.submit(
+                _upload_built, info.file, info.builder.metadata, repo, session,
+                skip_existing, chunk_size, cancel,
+            )))
+
+        build_failed = False
+        try:
+            build.main(ini_path, formats=formats, use_vcs=use_vcs,
+                       on_built=start_upload)
+            wait([fut for _, fut in uploads], return_when=FIRST_EXCEPTION)
+        except BaseException:
+            build_failed = True
+            raise
+        finally:
+            # Stop any uploads still running if something failed
+            cancel.set()
+            pool.shutdown()
+            _report_pipeline(uploads, build_failed)
+
+    for _, fut in uploads:
+        if fut.exception() is not None and not isinstance(fut.exception(), UploadCancelled):
+            raise fut.exception()
+
+
+def _report_pipeline(uploads, build_failed):
+    """Log what happened to each upload, after the pipeline in main() stops"""
+    failed = build_failed
+    uploaded = []
+    for file, fut in uploads:
+        if isinstance(fut.exception(), UploadCancelled):
+            log.warning("Upload of %s was cancelled", file.name)
+        elif fut.exception() is not None:
+            log.error("Uploading %s failed: %s", file.name, fut.exception())
+            failed = True
+        elif fut.result() is not None:  # None if skipped as already on the index
+            uploaded.append(file.name)
+    if failed and uploaded:
+        log.error(
+            "These files were uploaded before the failure, and are now on the "
+            "index. They can't be replaced, so fixing this may need a new "
+            "version number: %s", ", ".join(uploaded)
+        )
+
+
+def main_dist_dir(dist_dir, repo_name, pypirc_path=None, formats=None,
+                  jobs=DEFAULT_JOBS, skip_existing=False, chunk_size=None):
+    """Upload wheels and sdists which were already built to dist_dir"""
+    from .artifacts import find_dists, InvalidDistribution
+    if pypirc_path is None:
+        pypirc_path = PYPIRC_DEFAULT
+    elif not os.path.isfile(pypirc_path):
+        raise FileNotFoundError("The specified pypirc config file does not exist.")
+
+    files = find_dists(Path(dist_dir), formats)
+    names = {metadata.name for _, metadata in files}
+    if len(names) > 1:
+        # The project name is used to look up tokens in keyring
+        raise InvalidDistribution(
+            f"{dist_dir} contains distributions for several projects: "
+            + ", ".join(sorted(names))
+        )
+    repo = get_repository(pypirc_path, repo_name, project_name=names.pop())
+    upload_files(files, repo, jobs=jobs, skip_existing=skip_existing,
+                 chunk_size=chunk_size)
@@ -1,15 +1,18 @@
 """Validate various pieces of packaging data"""
 
 import errno
+import hashlib
 import io
+import json
 import logging
 import os
 from pathlib import Path
 import re
 import requests
 import sys
+import time
 
-from .vendorized.readme.rst import render
+from flit_core import tracing
 
 log = logging.getLogger(__name__)
 
@@ -42,42 +45,114 @@ def get_cache_dir() -> Path:
         return Path(local, 'flit')
 
 
+#: Where to get the current list of classifiers
+CLASSIFIERS_URL = 'https://pypi.org/pypi?%3Aaction=list_classifiers'
+#: How long a downloaded list is used without checking for updates (seconds)
+CLASSIFIERS_TTL = 24 * 60 * 60
+
+
+def _read_bundled_classifiers():
+    """Read the classifiers shipped with flit (see prepare_classifier_list.py)
+
+    Each line holds the length of the prefix it shares with the previous
+    line, then the rest of the classifier, which keeps the file compact.
+    """
+    classifiers = set()
+    prev = ''
+    path = Path(__file__).with_name('classifiers.txt')
+    for line in path.read_text('utf-8').splitlines():
+        if line.startswith('#'):
+            continue
+        n, rest = line.split(' ', 1)
+        prev = prev[:int(n)] + rest
+        classifiers.add(prev)
+    return classifiers
+
+
 def _read_classifiers_cached():
     """Reads classifiers from cached file"""
     with (get_cache_dir() / 'classifiers.lst').open(encoding='utf-8') as f:
         valid_classifiers = set(l.strip() for l in f)
+    valid_classifiers.discard('')
     return valid_classifiers
 
 
-def _download_and_cache_classifiers():
-    """Get the list of valid trove classifiers from PyPI"""
-    log.info('Fetching list of valid trove classifiers')
-    resp = requests.get(
-        'https://pypi.org/pypi?%3Aaction=list_classifiers')
-    resp.raise_for_status()
+def _read_cache_validators():
+    """Read the ETag, Last-Modified & fetch time of the cached classifiers"""
+    try:
+        with (get_cache_dir() / 'classifiers.json').open(encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    cache_dir = get_cache_dir()
+
+def _classifiers_cache_fresh():
+    fetched = _read_cache_validators().get('fetched', 0)
+    return 0 <= time.time() - fetched < CLASSIFIERS_TTL
+
+
+def _write_cache_file(cache_dir: Path, name, content: bytes):
     try:
-        cache_dir.mkdir(parents=True)
-    except (FileExistsError, PermissionError):
+        with (cache_dir / name).open('wb') as f:
+            f.write(content)
+    except (PermissionError, FileNotFoundError):
+        # cache file could not be created
         pass
     except OSError as e:
         # readonly mounted file raises OSError, only these should be captured
         if e.errno != errno.EROFS:
             raise
 
+
+def _download_and_cache_classifiers():
+    """Get the list of valid trove classifiers from PyPI
+
+    If we have a cached copy, this makes a conditional request, so the list
+    is only downloaded again if it has changed.
+    """
+    log.info('Fetching list of valid trove classifiers')
+    validators = _read_cache_validators()
+    headers = {}
+    if 'etag' in validators:
+        headers['If-None-Match'] = validators['etag']
+    if 'last_modified' in validators:
+        headers['If-Modified-Since'] = validators['last_modified']
+    resp = requests.get(CLASSIFIERS_URL, headers=headers)
+    resp.raise_for_status()
+
+    cache_dir = get_cache_dir()
     try:
-        with (cache_dir / 'classifiers.lst').open('wb') as f:
-            f.write(resp.content)
-    except (PermissionError, FileNotFoundError):
-        # cache file could not be created
+        cache_dir.mkdir(parents=True)
+    except (FileExistsError, PermissionError):
         pass
     except OSError as e:
         # readonly mounted file raises OSError, only these should be captured
         if e.errno != errno.EROFS:
             raise
 
-    valid_classifiers = set(l.strip() for l in resp.text.splitlines())
+    valid_classifiers = None
+    if resp.status_code == 304:
+        log.debug("Cached list of classifiers is up to date")
+        try:
+            valid_classifiers = _read_classifiers_cached()
+        except OSError:
+            # Cached list disappeared; get it again unconditionally
+            resp = requests.get(CLASSIFIERS_URL)
+            resp.raise_for_status()
+
+    if valid_classifiers is None:
+        _write_cache_file(cache_dir, 'classifiers.lst', resp.content)
+        valid_classifiers = set(l.strip() for l in resp.text.splitlines())
+        valid_classifiers.discard('')
+
+    if resp.status_code != 304:
+        validators = {}
+    validators['fetched'] = time.time()
+    for key, header in [('etag', 'ETag'), ('last_modified', 'Last-Modified')]:
+        if resp.headers.get(header):
+            validators[key] = resp.headers[header]
+    _write_cache_file(cache_dir, 'classifiers.json',
+                      json.dumps(validators).encode('utf-8'))
     return valid_classifiers
 
 
@@ -91,28 +166,28 @@ def _verify_classifiers(classifiers, valid_classifiers):
 def validate_classifiers(classifiers):
     """Verify trove classifiers from config file.
 
-    Fetches and caches a list of known classifiers from PyPI. Setting the
-    environment variable FLIT_NO_NETWORK=1 will skip this if the classifiers
-    are not already cached.
+    Checks against the classifiers shipped with flit, and a list fetched from
+    PyPI and cached. The list is only fetched if there are classifiers we
+    don't recognise, and it's more than CLASSIFIERS_TTL since it was last
+    fetched. Setting the environment variable FLIT_NO_NETWORK=1 will skip
+    fetching it.
     """
     if not classifiers:
         return []
 
-    problems = []
     classifiers = set(classifiers)
+    valid_classifiers = _read_bundled_classifiers() | CUSTOM_CLASSIFIERS
     try:
-        valid_classifiers = _read_classifiers_cached()
-        valid_classifiers.update(CUSTOM_CLASSIFIERS)
-        problems = _verify_classifiers(classifiers, valid_classifiers)
+        valid_classifiers |= _read_classifiers_cached()
     except (FileNotFoundError, PermissionError) as e1:
         # We haven't yet got the classifiers cached or couldn't read it
         pass
-    else:
-        if not problems:
-            return []
+    problems = _verify_classifiers(classifiers, valid_classifiers)
+    if not problems or _classifiers_cache_fresh():
+        return problems
 
-    # Either we don't have the list, or there were unexpected classifiers
-    # which might have been added since we last fetched it. Fetch and cache.
+    # There were unexpected classifiers which might have been added since we
+    # last fetched the list. Check for an updated list.
 
     if os.environ.get('FLIT_NO_NETWORK', ''):
         log.warning(
@@ -121,13 +196,12 @@ def validate_classifiers(classifiers):
 
     # Try to download up-to-date list of classifiers
     try:
-        valid_classifiers = _download_and_cache_classifiers()
-    except requests.ConnectionError:
+        valid_classifiers |= _download_and_cache_classifiers()
+    except requests.RequestException as e:
         # The error you get on a train, going through Oregon, without wifi
         log.warning(
-            "Couldn't get list of valid classifiers to check against")
+            "Couldn't get list of valid classifiers to check against (%s)", e)
         return problems
-    valid_classifiers.update(CUSTOM_CLASSIFIERS)
     return _verify_classifiers(classifiers, valid_classifiers)
 
 
@@ -261,7 +335,8 @@ def validate_readme_rst(metadata):
     if mimetype != 'text/x-rst':
         return []
 
-    # rst check
+    # rst check. Importing docutils is slow, so only do it when it's needed.
+    from .vendorized.readme.rst import render
     raw_desc = metadata.get('description', '')
     stream = io.StringIO()
     res = render(raw_desc, stream)
@@ -275,19 +350,140 @@ def validate_readme_rst(metadata):
     return []  # rst rendered OK
 
 
+#: How many check results to keep in the validation cache
+RESULTS_CACHE_SIZE = 256
+
+
+def _checks(config_info):
+    """The checks to run on a config, as (name, function, input, deps) tuples
+
+    For metadata checks, the input is only the fields that check looks at, so
+    changing one field only invalidates the cached results of checks using it.
+    deps are distributions whose version can change a check's results, or
+    None if the results shouldn't be cached.
+
+    The checks are independent of each other, so they can run concurrently.
+    """
+    md = config_info.metadata
+
+    def fields(*names):
+        return {k: md[k] for k in names if k in md}
+
+    return [
+        ('classifiers', validate_classifiers, md.get('classifiers'), None),
+        ('entrypoints', validate_entrypoints, config_info.entrypoints, ()),
+        ('name', validate_name, fields('name'), ()),
+        ('requires_python', validate_requires_python, fields('requires_python'), ()),
+        ('requires_dist', validate_requires_dist, fields('requires_dist'), ()),
+        ('home_page', validate_url, md.get('home_page', None), ()),
+        ('project_urls', validate_project_urls, fields('project_urls'), ()),
+        ('readme', validate_readme_rst,
+         fields('description', 'description_content_type'), ('docutils',)),
+    ]
+
+
+def _dist_version(name):
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def _results_cache_key(name, inputs, deps):
+    from . import __version__
+    versions = {d: _dist_version(d) for d in deps}
+    versions['flit'] = __version__
+    data = json.dumps([name, versions, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _read_results_cache():
+    try:
+        with (get_cache_dir() / 'validation.json').open(encoding='utf-8') as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return results if isinstance(results, dict) else {}
+
+
+def _write_results_cache(results):
+    # Entries are in the order they were added; drop the oldest
+    entries = list(results.items())[-RESULTS_CACHE_SIZE:]
+    cache_dir = get_cache_dir()
+    tmp = cache_dir / f'validation.json.{os.getpid()}.tmp'
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tmp.open('w', encoding='utf-8') as f:
+            json.dump(dict(entries), f)
+        # Replace it atomically, in case another flit process is reading it
+        os.replace(tmp, cache_dir / 'validation.json')
+    except OSError as e:
+        log.debug("Could not write validation cache (%s)", e)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def _run_check(name, check, inputs):
+    start = time.perf_counter()
+    with tracing.span(f'validate {name}'):
+        res = check(inputs)
+    log.debug("%s check took %.1f ms", name, (time.perf_counter() - start) * 1000)
+    return res
+
+
 def validate_config(config_info):
-    i = config_info
-    problems = sum([
-        validate_classifiers(i.metadata.get('classifiers')),
-        validate_entrypoints(i.entrypoints),
-        validate_name(i.metadata),
-        validate_requires_python(i.metadata),
-        validate_requires_dist(i.metadata),
-        validate_url(i.metadata.get('home_page', None)),
-        validate_project_urls(i.metadata),
-        validate_readme_rst(i.metadata)
-                   ], [])
+    """Check the config, logging and returning a list of problems
+
+    Apart from the classifiers, which are checked against a list that can
+    change, the results of each check are cached on disk, keyed by a hash of
+    that check's inputs and the versions of flit (and docutils for the
+    README). So only checks whose inputs have changed are run again.
 
+    Checks which do need to run are run in threads, so fetching the list of
+    classifiers doesn't hold up rendering the README. Problems are returned
+    in the same order regardless.
+    """
+    with tracing.span('validate'):
+        return _validate_config(config_info)
+
+
+def _validate_config(config_info):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = _read_results_cache()
+    results = {}  # name -> problems, in the order of the checks
+    to_run = []
+    for name, check, inputs, deps in _checks(config_info):
+        key = None if deps is None else _results_cache_key(name, inputs, deps)
+        if key in cache:
+            log.debug("Using cached results for %s check", name)
+            results[name] = cache[key]
+        else:
+            results[name] = None  # Filled in below
+            to_run.append((name, check, inputs, key))
+
+    if len(to_run) > 1:
+        with ThreadPoolExecutor(max_workers=len(to_run)) as pool:
+            futures = [(name, pool.submit(_run_check, name, check, inputs))
+                       for name, check, inputs, _ in to_run]
+        for name, fut in futures:
+            results[name] = fut.result()
+    else:
+        for name, check, inputs, _ in to_run:
+            results[name] = _run_check(name, check, inputs)
+
+    new_results = {key: results[name] for name, _, _, key in to_run
+                   if key is not None}
+    if new_results:
+        cache.update(new_results)
+        _write_results_cache(cache)
+
+    problems = []
+    for res in results.values():
+        problems.extend(res)
     for p in problems:
         log.error(p)
     return problems
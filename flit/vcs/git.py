@@ -13,3 +13,15 @@ def list_untracked_deleted_files(directory):
                          '--exclude-standard', '-z'],
                         cwd=str(directory))
     return [os.fsdecode(l) for l in outb.strip(b'\0').split(b'\0') if l]
+
+def list_untracked_files(directory):
+    """List untracked files, including ignored ones
+
+    This deliberately doesn't pass --exclude-standard: .gitignore doesn't
+    apply when building an sdist, so every untracked path, ignored or not,
+    may need an exclude rule. Directories with no tracked files are listed
+    once, with a trailing slash, rather than listing everything inside them.
+    """
+    outb = check_output(['git', 'ls-files', '--others', '--directory', '-z'],
+                        cwd=str(directory))
+    return [os.fsdecode(l) for l in outb.strip(b'\0').split(b'\0') if l]
@@ -0,0 +1,308 @@
+"""Check built wheels & sdists before publishing them
+
+Each file in each wheel is decompressed and hashed as a stream, and checked
+against the sizes & hashes in RECORD. Sdists are read through once, to list
+their files and find PKG-INFO. Then each wheel's METADATA is compared with
+PKG-INFO from the sdist of the same version, and the files in the wheel are
+checked against the files in the sdist.
+
+The sha256 digest of each file is reported too: wheels use the digests
+recorded when flit built them (if they haven't changed since), and sdists are
+hashed as they're read through, and checked against any recorded digest.
+
+Artifacts are checked in parallel on threads: zlib and hashlib release the GIL
+while working on large buffers. Memory use doesn't depend on the size of the
+files, as they're read in chunks.
+"""
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from email.parser import Parser
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+import tarfile
+import time
+import zipfile
+import zlib
+
+from flit_core.common import normalise_core_metadata_name
+from flit_core.config import tomllib
+from flit_core.digests import lookup_digests
+
+from .artifacts import InvalidDistribution, parse_metadata
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactReport:
+    """What we found checking one wheel or sdist"""
+    def __init__(self, path: Path):
+        self.path = path
+        self.problems = []
+        self.files = set()
+        # Raw METADATA (wheel) or PKG-INFO (sdist)
+        self.metadata = None
+        # The sdist's pyproject.toml, to find the external data directory
+        self.pyproject = None
+        # Size & sha256 of the whole file, if known
+        self.digests = None
+
+    @property
+    def is_wheel(self):
+        return self.path.suffix == '.whl'
+
+    def problem(self, msg):
+        self.problems.append(msg)
+
+
+def _hash_member(f, algorithm, keep=False):
+    """Hash a file object in chunks; returns (digest, size, content or None)"""
+    h = hashlib.new(algorithm)
+    size = 0
+    kept = [] if keep else None
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        h.update(chunk)
+        size += len(chunk)
+        if keep:
+            kept.append(chunk)
+    digest = urlsafe_b64encode(h.digest()).decode('ascii').rstrip('=')
+    return digest, size, (b''.join(kept) if keep else None)
+
+
+class _HashingReader:
+    """Hash a file as it's read through"""
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+def _is_dist_info_file(name, filename):
+    parts = name.split('/')
+    return len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == filename
+
+
+def _read_record(data: bytes):
+    """Parse RECORD into {path: (hash, size)}"""
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    return {row[0]: (row[1], row[2]) for row in reader if row}
+
+
+def verify_wheel(path: Path) -> ArtifactReport:
+    report = ArtifactReport(path)
+    report.digests = lookup_digests(path)
+    try:
+        with zipfile.ZipFile(path) as zf:
+            infos = [zi for zi in zf.infolist() if not zi.is_dir()]
+            records = [zi.filename for zi in infos
+                       if _is_dist_info_file(zi.filename, 'RECORD')]
+            if len(records) != 1:
+                report.problem(f"Expected 1 .dist-info/RECORD file, found {len(records)}")
+                return report
+            record_name = records[0]
+            record = _read_record(zf.read(record_name))
+            record.pop(record_name, None)
+
+            for zi in infos:
+                name = zi.filename
+                report.files.add(name)
+                if name == record_name:
+                    continue
+                if name not in record:
+                    report.problem(f"{name} is not listed in RECORD")
+                    continue
+                hash_spec, size_spec = record.pop(name)
+                algorithm, _, expected_digest = hash_spec.partition('=')
+                if not expected_digest or algorithm not in hashlib.algorithms_guaranteed:
+                    report.problem(f"{name} has no usable hash in RECORD ({hash_spec!r})")
+                    continue
+                keep = _is_dist_info_file(name, 'METADATA')
+                with zf.open(zi) as f:
+                    digest, size, content = _hash_member(f, algorithm, keep)
+                if keep:
+                    report.metadata = content
+                if digest != expected_digest:
+                    report.problem(f"{name} does not match its hash in RECORD")
+                if size_spec and int(size_spec) != size:
+                    report.problem(
+                        f"{name} is {size} bytes, but RECORD says {size_spec}"
+                    )
+
+            for name in record:
+                report.problem(f"{name} is listed in RECORD but not in the wheel")
+    except (zipfile.BadZipFile, zlib.error, EOFError, ValueError) as e:
+        report.problem(f"Could not read wheel: {e}")
+    if report.metadata is None and not report.problems:
+        report.problem("No .dist-info/METADATA found")
+    return report
+
+
+def verify_sdist(path: Path) -> ArtifactReport:
+    report = ArtifactReport(path)
+    top_dirs = set()
+    try:
+        # Stream mode reads the compressed data once, from start to end
+        with path.open('rb') as f:
+            reader = _HashingReader(f)
+            with tarfile.open(fileobj=reader, mode='r|gz') as tf:
+                for member in tf:
+                    top, _, rel = member.name.partition('/')
+                    top_dirs.add(top)
+                    if not (rel and member.isfile()):
+                        continue
+                    report.files.add(rel)
+                    if rel in ('PKG-INFO', 'pyproject.toml'):
+                        content = tf.extractfile(member).read()
+                        if rel == 'PKG-INFO':
+                            report.metadata = content
+                        else:
+                            report.pyproject = content
+            while reader.read(CHUNK_SIZE):
+                pass  # Anything after the end of the tar data
+    except (tarfile.TarError, zlib.error, EOFError) as e:
+        report.problem(f"Could not read sdist: {e}")
+        return report
+
+    report.digests = {'size': reader.size, 'sha256': reader.sha256.hexdigest()}
+    recorded = lookup_digests(path)
+    if recorded is not None and recorded['sha256'] != report.digests['sha256']:
+        report.problem("sha256 digest differs from the one recorded when it was built")
+
+    if len(top_dirs) != 1:
+        report.problem(f"Expected 1 top-level folder, found {len(top_dirs)}")
+    if report.metadata is None:
+        report.problem("No PKG-INFO found")
+    return report
+
+
+def verify_artifact(path: Path) -> ArtifactReport:
+    if path.suffix == '.whl':
+        report = verify_wheel(path)
+    elif path.name.endswith('.tar.gz'):
+        report = verify_sdist(path)
+    else:
+        raise InvalidDistribution(f"Unknown distribution type: {path}")
+
+    if report.metadata is not None:
+        try:
+            report.metadata.decode('utf-8')
+        except UnicodeDecodeError as e:
+            name = 'METADATA' if report.is_wheel else 'PKG-INFO'
+            report.problem(f"{name} is not valid UTF-8: {e}")
+            report.metadata = None  # Skip checks comparing the metadata
+    return report
+
+
+def _metadata_fields(raw: bytes):
+    msg = Parser().parsestr(raw.decode('utf-8'))
+    fields = {k: sorted(msg.get_all(k)) for k in set(msg.keys())}
+    fields['Description (body)'] = (msg.get_payload() or '').strip()
+    return fields
+
+
+def _external_data_dir(sdist: ArtifactReport):
+    if sdist.pyproject is None:
+        return None
+    try:
+        d = tomllib.loads(sdist.pyproject.decode('utf-8'))
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError):
+        return None
+    return d.get('tool', {}).get('flit', {}).get('external-data', {}).get('directory')
+
+
+def cross_check(wheel: ArtifactReport, sdist: ArtifactReport):
+    """Check a wheel against the sdist it should have been built from"""
+    wheel_md = _metadata_fields(wheel.metadata)
+    sdist_md = _metadata_fields(sdist.metadata)
+    differ = sorted(k for k in wheel_md.keys() | sdist_md.keys()
+                    if wheel_md.get(k) != sdist_md.get(k))
+    if differ:
+        wheel.problem(
+            f"METADATA differs from PKG-INFO in {sdist.path.name}: " + ", ".join(differ)
+        )
+
+    data_dir = _external_data_dir(sdist)
+    missing = []
+    for name in sorted(wheel.files):
+        top, _, rel = name.partition('/')
+        if top.endswith('.dist-info'):
+            continue  # Generated when building the wheel
+        if top.endswith('.data'):
+            scheme, _, rel = rel.partition('/')
+            if data_dir and scheme == 'data' and f'{data_dir}/{rel}' in sdist.files:
+                continue
+        elif name in sdist.files or f'src/{name}' in sdist.files:
+            continue
+        missing.append(name)
+    if missing:
+        wheel.problem(
+            f"Files not in {sdist.path.name}: " + ", ".join(missing)
+        )
+
+
+def _name_version(report: ArtifactReport):
+    md = parse_metadata(io.BytesIO(report.metadata))
+    return normalise_core_metadata_name(md.name), md.version
+
+
+def verify_dists(paths, jobs=None):
+    """Check wheels & sdists; returns a list of ArtifactReport objects"""
+    jobs = jobs or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        reports = list(pool.map(verify_artifact, paths))
+
+    sdists = {}
+    for r in reports:
+        if not r.is_wheel and r.metadata is not None:
+            try:
+                sdists[_name_version(r)] = r
+            except InvalidDistribution as e:
+                r.problem(str(e))
+    for r in reports:
+        if r.is_wheel and r.metadata is not None:
+            try:
+                sdist = sdists.get(_name_version(r))
+            except InvalidDistribution as e:
+                r.problem(str(e))
+                continue
+            if sdist is not None:
+                cross_check(r, sdist)
+            else:
+                log.warning("No sdist to compare %s with", r.path.name)
+    return reports
+
+
+def main(dist_dir: Path, jobs=None):
+    """Check the artifacts in dist_dir; returns True if there are no problems"""
+    paths = sorted(dist_dir.glob('*.whl')) + sorted(dist_dir.glob('*.tar.gz'))
+    if not paths:
+        raise InvalidDistribution(f"No distributions to check found in {dist_dir}")
+
+    start = time.perf_counter()
+    reports = verify_dists(paths, jobs)
+    for r in reports:
+        if r.problems:
+            log.error("%s: %d problem(s)", r.path.name, len(r.problems))
+            for msg in r.problems:
+                log.error("    %s", msg)
+        elif r.digests:
+            log.info("%s: OK (%d files, sha256 %s)", r.path.name, len(r.files),
+                     r.digests['sha256'])
+        else:
+            log.info("%s: OK (%d files)", r.path.name, len(r.files))
+    log.info("Checked %d files in %.2f s", len(reports), time.perf_counter() - start)
+    return not any(r.problems for r in reports)
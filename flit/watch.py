@@ -0,0 +1,345 @@
+"""Rebuild or reinstall a project whenever its files change
+
+``flit build --watch`` and ``flit install --watch`` keep running, and watch the
+module, the external data directory, pyproject.toml and the files it refers to
+(such as the readme). On Linux, inotify reports changes as they happen;
+elsewhere, the files are checked a few times a second.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import os.path as osp
+from pathlib import Path
+import select
+import shutil
+import struct
+import sys
+import time
+
+from flit_core import common
+
+log = logging.getLogger(__name__)
+
+#: Seconds between checks when polling, and to wait before checking for stop
+POLL_INTERVAL = 0.25
+#: Changes closer together than this (seconds) are handled together
+DEBOUNCE = 0.05
+
+
+def _ignored(path):
+    name = osp.basename(path)
+    return (
+        '__pycache__' in Path(path).parts
+        or name.endswith(('.pyc', '.pyo', '~', '.swp'))
+        or name.startswith('.#')  # Emacs lock files
+    )
+
+
+def watch_roots(ini_path, ini_info):
+    """Files & folders to watch for a project, as absolute paths"""
+    directory = ini_path.parent
+    module = common.Module(ini_info.module, directory)
+    roots = [ini_path, module.path]
+    roots.extend(directory / f for f in ini_info.referenced_files)
+    if ini_info.data_directory:
+        roots.append(ini_info.data_directory)
+    return [Path(osp.abspath(r)) for r in roots]
+
+
+class PollingWatcher:
+    """Find changes by checking the modification time of every file"""
+    def __init__(self, roots, interval=POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self):
+        state = {}
+
+        def add(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+            state[path] = (st.st_mtime_ns, st.st_size)
+
+        for root in map(str, self.roots):
+            if osp.isdir(root):
+                for dirpath, dirnames, filenames in os.walk(root):
+                    dirnames[:] = [d for d in dirnames if d != '__pycache__']
+                    for f in filenames:
+                        add(osp.join(dirpath, f))
+            else:
+                add(root)
+        return state
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for changes; returns the changed paths"""
+        deadline = time.monotonic() + timeout
+        while True:
+            new = self._scan()
+            changed = {p for p in new.keys() | self._state.keys()
+                       if new.get(p) != self._state.get(p) and not _ignored(p)}
+            self._state = new
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM
+               | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+               | IN_MOVE_SELF)
+_event_header = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Find changes with Linux's inotify API, without scanning any files
+
+    inotify watches folders, not whole trees, so each folder in a watched
+    tree is added, including ones created later. Single files (e.g. the
+    readme) are watched through their parent folder.
+    """
+    def __init__(self, roots):
+        self.roots = roots
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs = {}  # Watch descriptor -> folder path
+        self._tree_dirs = set()
+        self._files = set()
+        try:
+            for root in map(str, roots):
+                if osp.isdir(root):
+                    self._watch_tree(root)
+                else:
+                    self._files.add(root)
+                    self._watch_dir(osp.dirname(root))
+        except BaseException:
+            self.close()
+            raise
+
+    def _watch_dir(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._dirs[wd] = path
+
+    def _watch_tree(self, top):
+        """Watch top & folders inside it; returns the files already there"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if d != '__pycache__']
+            self._tree_dirs.add(dirpath)
+            self._watch_dir(dirpath)
+            files.extend(osp.join(dirpath, f) for f in filenames)
+        return files
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for changes; returns the changed paths"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        buf = os.read(self._fd, 64 * 1024)
+        changed = set()
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _cookie, length = _event_header.unpack_from(buf, pos)
+            pos += _event_header.size
+            name = os.fsdecode(buf[pos:pos + length].rstrip(b'\0'))
+            pos += length
+
+            if mask & IN_Q_OVERFLOW:
+                log.debug("inotify queue overflowed; treating everything as changed")
+                changed.update(map(str, self.roots))
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:  # The folder was deleted
+                del self._dirs[wd]
+                self._tree_dirs.discard(directory)
+                continue
+
+            path = osp.join(directory, name) if name else directory
+            if directory in self._tree_dirs:
+                if (mask & IN_ISDIR) and (mask & (IN_CREATE | IN_MOVED_TO)):
+                    try:
+                        if osp.basename(path) != '__pycache__':
+                            changed.update(self._watch_tree(path))
+                    except OSError:
+                        pass  # Already deleted again
+                changed.add(path)
+            elif path in self._files:
+                changed.add(path)
+
+        return {p for p in changed if not _ignored(p)}
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(roots):
+    """Use inotify if we can, or poll for changes if not"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            log.debug("Can't use inotify (%s); polling for changes instead", e)
+    return PollingWatcher(roots)
+
+
+def wait_for_changes(watcher, stop=None, debounce=DEBOUNCE):
+    """Wait for files to change, and for a burst of changes to finish
+
+    Saving in an editor, or switching git branches, can change several files
+    in quick succession. Returns the set of changed paths, or None if stop
+    (a threading.Event) was set first.
+    """
+    changed = set()
+    while not changed:
+        if stop is not None and stop.is_set():
+            return None
+        changed = watcher.wait(POLL_INTERVAL)
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def _watch_loop(ini_path, update, stop=None):
+    """Call update(changed_paths) when files change, until stopped
+
+    update() should return the project's config (a LoadedConfig), which is
+    used to find what to watch. If it fails, the error is shown, and we keep
+    watching for another change to fix it.
+    """
+    roots = watch_roots(ini_path, update(None))
+    watcher = make_watcher(roots)
+    log.info("Watching for changes with %s (Ctrl-C to stop)", type(watcher).__name__)
+    try:
+        while True:
+            changed = wait_for_changes(watcher, stop)
+            if changed is None:
+                return
+            log.debug("Changed: %s", ', '.join(sorted(changed)))
+            try:
+                new_roots = watch_roots(ini_path, update(changed))
+            except Exception as e:
+                log.error("%s: %s", type(e).__name__, e)
+                continue
+            if new_roots != roots:
+                watcher.close()
+                roots = new_roots
+                watcher = make_watcher(roots)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def watch_build(ini_path, formats=None, use_vcs=False, stop=None):
+    """Build the project, then build it again each time its files change
+
+    The config & metadata are kept between builds, and only loaded again if
+    the files they come from change. Unlike a normal ``flit build``, the wheel
+    is built from the source tree, not from the unpacked sdist.
+    """
+    from flit_core.project import Project
+    from .build import ALL_FORMATS
+    from .sdist import SdistBuilder
+
+    formats = formats or ALL_FORMATS
+    project = Project(ini_path)
+    dist_dir = project.directory / 'dist'
+    dist_dir.mkdir(parents=True, exist_ok=True)
+
+    def build(changed):
+        start = time.perf_counter()
+        config, module, metadata = project.load()
+        if 'sdist' in formats:
+            sb = SdistBuilder.from_loaded(project.ini_path, config, module, metadata)
+            sb.use_vcs = use_vcs
+            sb.build(dist_dir)
+        if 'wheel' in formats:
+            project.build_wheel(dist_dir)
+        log.info("Built in %.0f ms", (time.perf_counter() - start) * 1000)
+        return config
+
+    _watch_loop(project.ini_path, build, stop)
+
+
+def _remove_stale(old_files, new_files):
+    """Remove files written by a previous install which the new one didn't"""
+    stale = set(map(str, old_files)) - set(map(str, new_files))
+    for path in stale:
+        if osp.lexists(path):
+            log.info("Removing %s", path)
+            os.unlink(path)
+
+
+def watch_install(ini_path, make_installer, stop=None):
+    """Install the project, then update the install each time its files change
+
+    make_installer() is called to make a new Installer when the config
+    changes. Changed module & data files are copied (or linked) into place
+    individually; changes to the config (or the module's version) mean
+    installing again. Requirements are only installed again if they change.
+    """
+    ini_path = Path(osp.abspath(ini_path))
+    installer = None
+
+    def config_files(inst):
+        files = [ini_path]
+        files.extend(ini_path.parent / f for f in inst.ini_info.referenced_files)
+        if inst.ini_info.dynamic_metadata:
+            files.extend(inst.module.version_files)
+        return {osp.abspath(f) for f in files}
+
+    def update(changed):
+        nonlocal installer
+        start = time.perf_counter()
+        if installer is None:
+            installer = make_installer()
+            installer.install_directly()
+        elif changed & config_files(installer):
+            new = make_installer()
+            deps_changed = (new.requirements_to_install()
+                            != installer.requirements_to_install())
+            new.install_directly(install_deps=deps_changed)
+            if new.dist_info_path() != installer.dist_info_path():
+                # e.g. the version number changed
+                shutil.rmtree(installer.dist_info_path())
+            _remove_stale(installer.installed_files, new.installed_files)
+            installer = new
+        else:
+            installer.update_installed_files(changed)
+        log.info("Installed in %.0f ms", (time.perf_counter() - start) * 1000)
+        return installer.ini_info
+
+    _watch_loop(ini_path, update, stop)
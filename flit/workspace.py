@@ -0,0 +1,200 @@
+"""flit workspace - build or install many projects in one go
+
+Projects are found from glob patterns and/or a file listing them. Builds run
+in parallel in a pool of worker processes, and their logs are shown together
+for each project as it finishes. Installs collect all the projects'
+dependencies into a single pip command, before installing the projects
+themselves.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import glob
+import logging
+import os
+from pathlib import Path
+import re
+from subprocess import CalledProcessError
+from typing import List
+
+from flit_core.common import normalise_core_metadata_name
+
+log = logging.getLogger(__name__)
+
+
+class NoProjectsError(Exception):
+    pass
+
+
+def _as_ini_path(path: Path):
+    if path.is_dir():
+        path = path / 'pyproject.toml'
+    return path if path.is_file() else None
+
+
+def discover_projects(patterns=(), list_file=None, root=Path()):
+    """Find pyproject.toml files for a workspace
+
+    patterns are glob patterns (relative to root) matching project directories
+    or their pyproject.toml files. list_file is a text file with one such path
+    per line; blank lines and lines starting with '#' are skipped.
+    """
+    candidates = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.join(str(root), pattern), recursive=True))
+        candidates.extend(Path(m) for m in matches)
+
+    if list_file is not None:
+        list_file = Path(list_file)
+        for line in list_file.read_text('utf-8').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                # Relative paths are relative to the list file
+                candidates.append(list_file.parent / line)
+
+    ini_paths = []
+    for candidate in candidates:
+        ini_path = _as_ini_path(candidate)
+        if ini_path is None:
+            log.debug("No pyproject.toml found at %s", candidate)
+        elif ini_path.resolve() not in {p.resolve() for p in ini_paths}:
+            ini_paths.append(ini_path)
+
+    if not ini_paths:
+        raise NoProjectsError("No projects found for the workspace")
+    return ini_paths
+
+
+@dataclass
+class ProjectResult:
+    ini_path: Path
+    ok: bool = False
+    files: List[Path] = field(default_factory=list)
+    logs: list = field(default_factory=list)  # (levelno, logger name, message)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.name, self.format(record)))
+
+
+def _build_project(ini_path, formats, use_vcs, log_level):
+    """Build one project in a worker process, capturing its logs"""
+    from .build import main as build_main
+
+    result = ProjectResult(ini_path)
+    root_logger = logging.getLogger()
+    root_logger.handlers = [_ListHandler(result.logs)]
+    root_logger.setLevel(log_level)
+
+    try:
+        built = build_main(ini_path, formats=formats, use_vcs=use_vcs)
+    except (Exception, SystemExit) as e:
+        log.error("Build failed: %s", e, exc_info=log_level <= logging.DEBUG)
+    else:
+        result.ok = True
+        result.files = [info.file for info in (built.sdist, built.wheel)
+                        if info is not None]
+    return result
+
+
+def build_projects(ini_paths, formats=None, use_vcs=False, jobs=None):
+    """Build the wheel and/or sdist for several projects in parallel
+
+    Returns a list of ProjectResult objects, in the same order as ini_paths.
+    """
+    log_level = logging.getLogger().getEffectiveLevel()
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(_build_project, ini_path, formats, use_vcs, log_level): ini_path
+            for ini_path in ini_paths
+        }
+        for fut in as_completed(futures):
+            ini_path = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as e:  # e.g. the worker process crashed
+                result = ProjectResult(ini_path, logs=[(logging.ERROR, __name__, str(e))])
+            results[ini_path] = result
+            _show_result(result)
+
+    return [results[p] for p in ini_paths]
+
+
+def _show_result(result: ProjectResult):
+    status = "OK" if result.ok else "FAILED"
+    log.info("--- %s: %s", result.ini_path.parent, status)
+    for levelno, logger_name, message in result.logs:
+        logging.getLogger(logger_name).log(levelno, "  %s", message)
+
+
+def _requirement_name(req):
+    m = re.match(r'\s*([A-Z0-9._-]+)', req, re.IGNORECASE)
+    return normalise_core_metadata_name(m.group(1)) if m else None
+
+
+def merged_requirements(installers):
+    """Combine the requirements to install for several projects
+
+    Requirements on the projects being installed are left out, and exact
+    duplicates are only listed once.
+    """
+    own_names = {normalise_core_metadata_name(i.ini_info.metadata['name'])
+                 for i in installers}
+    requirements = []
+    for installer in installers:
+        for req in installer.requirements_to_install():
+            if _requirement_name(req) not in own_names and req not in requirements:
+                requirements.append(req)
+    return requirements
+
+
+def install_projects(ini_paths, only_deps=False, **installer_kwargs):
+    """Install several projects, with one pip command for all dependencies
+
+    A project which can't be loaded or installed doesn't stop the others. If
+    installing the dependencies fails, no projects are installed.
+    Returns a list of ProjectResult objects, in the same order as ini_paths.
+    """
+    from .install import Installer
+
+    results = {p: ProjectResult(p) for p in ini_paths}
+    installers = []  # (ini_path, Installer) pairs
+    for ini_path in ini_paths:
+        try:
+            installer = Installer.from_ini_path(ini_path, **installer_kwargs)
+        except Exception as e:
+            log.error("--- %s: FAILED to load project: %s", ini_path.parent, e)
+        else:
+            installers.append((ini_path, installer))
+
+    if installers:
+        requirements = merged_requirements([i for _, i in installers])
+        log.info("Installing %d requirements for %d projects",
+                 len(requirements), len(installers))
+        try:
+            installers[0][1].pip_install_requirements(requirements)
+        except CalledProcessError as e:
+            # Without their dependencies, none of the projects count as installed
+            log.error("--- FAILED to install workspace requirements (%s):\n  %s",
+                      e, '\n  '.join(requirements))
+            return [results[p] for p in ini_paths]
+
+    for ini_path, installer in installers:
+        if not only_deps:
+            log.info("--- Installing %s", installer.directory)
+            installer.deps = 'none'  # Already installed above
+            installer.extras = ()
+            try:
+                installer.install()
+            except Exception as e:
+                log.error("--- %s: FAILED: %s", ini_path.parent, e,
+                          exc_info=log.isEnabledFor(logging.DEBUG))
+                continue
+        results[ini_path].ok = True
+
+    return [results[p] for p in ini_paths]
@@ -0,0 +1,95 @@
+"""Implementation of the PEP 517 hooks
+
+These are exposed through buildapi, which can forward them to a build server.
+"""
+import logging
+from pathlib import Path
+
+from .common import Module, get_docstring_and_version_via_ast
+from .config import read_flit_config
+from .project import Project
+from . import tracing
+
+log = logging.getLogger(__name__)
+
+__all__ = [
+    'get_requires_for_build_wheel',
+    'get_requires_for_build_sdist',
+    'get_requires_for_build_editable',
+    'prepare_metadata_for_build_wheel',
+    'prepare_metadata_for_build_editable',
+    'build_wheel',
+    'build_editable',
+    'build_sdist',
+]
+
+# PEP 517 specifies that the CWD will always be the source tree
+pyproj_toml = Path('pyproject.toml')
+
+def get_requires_for_build_wheel(config_settings=None):
+    """Returns a list of requirements for building, as strings"""
+    with tracing.hook_trace('get_requires_for_build', config_settings):
+        return _get_requires()
+
+def _get_requires():
+    info = read_flit_config(pyproj_toml)
+    # If we can get version & description from pyproject.toml (PEP 621), or
+    # by parsing the module (_via_ast), we don't need any extra
+    # dependencies. If not, we'll need to try importing it, so report any
+    # runtime dependencies as build dependencies.
+    docstring = None
+    version = None
+    want_summary = 'description' in info.dynamic_metadata
+    want_version = 'version' in info.dynamic_metadata
+
+    module = Module(info.module, Path.cwd())
+    if want_summary or want_version:
+        docstring, version = get_docstring_and_version_via_ast(module)
+
+    if (want_summary and not docstring) or (want_version and not version):
+        return info.metadata.get('requires_dist', [])
+    else:
+        return []
+
+# Requirements to build an sdist are the same as for a wheel
+get_requires_for_build_sdist = get_requires_for_build_wheel
+
+# Requirements to build an editable are the same as for a wheel
+get_requires_for_build_editable = get_requires_for_build_wheel
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):
+    """Creates {metadata_directory}/foo-1.2.dist-info"""
+    with tracing.hook_trace('prepare_metadata_for_build', config_settings):
+        return _prepare_metadata(metadata_directory)
+
+def _prepare_metadata(metadata_directory):
+    return Project(pyproj_toml).prepare_metadata(metadata_directory)
+
+# Metadata for editable are the same as for a wheel
+prepare_metadata_for_build_editable = prepare_metadata_for_build_wheel
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    """Builds a wheel, places it in wheel_directory"""
+    with tracing.hook_trace('build_wheel', config_settings):
+        path = Project(pyproj_toml).build_wheel(wheel_directory)
+    return path.name
+
+def build_editable(wheel_directory, config_settings=None, metadata_directory=None):
+    """Builds an "editable" wheel, places it in wheel_directory
+
+    By default, the wheel contains a .pth file adding the source directory to
+    sys.path. Pass ``editable-mode=import-hook`` in config_settings to use an
+    import hook which only maps the package's own name to its source instead.
+    """
+    editable_mode = (config_settings or {}).get('editable-mode', 'pth')
+    with tracing.hook_trace('build_editable', config_settings):
+        path = Project(pyproj_toml).build_wheel(
+            wheel_directory, editable=True, editable_mode=editable_mode
+        )
+    return path.name
+
+def build_sdist(sdist_directory, config_settings=None):
+    """Builds an sdist, places it in sdist_directory"""
+    with tracing.hook_trace('build_sdist', config_settings):
+        path = Project(pyproj_toml).build_sdist(sdist_directory)
+    return path.name
@@ -0,0 +1,54 @@
+"""Import hook for a package installed in editable mode
+
+The source of this module is copied into site-packages, with a call to
+install() added at the end, and imported by a .pth file. Unlike putting a
+directory on sys.path, this only makes the project's own import names
+importable from the source tree, so other top-level modules in the same folder
+aren't exposed, and other imports don't pay for an extra directory lookup.
+
+This must not import anything from flit_core, and it must work on any Python
+version supported by flit_core. It is imported at every interpreter startup,
+so it avoids importing importlib.util, which pulls in several other modules.
+"""
+import os
+import sys
+from importlib.machinery import ModuleSpec, SourceFileLoader
+
+
+class EditableFinder:
+    """Meta path finder mapping import names to source files or folders"""
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        # Parent packages of e.g. 'ns1.pkg', which are namespace packages
+        self.namespaces = set()
+        for name in self.mapping:
+            parts = name.split('.')
+            for i in range(1, len(parts)):
+                self.namespaces.add('.'.join(parts[:i]))
+
+    def find_spec(self, fullname, path=None, target=None):
+        location = self.mapping.get(fullname)
+        if location is None:
+            if fullname in self.namespaces:
+                # Only reached if no other namespace portion was found.
+                # Submodules are found through self.mapping, not __path__.
+                return ModuleSpec(fullname, None, is_package=True)
+            return None
+
+        is_package = os.path.isdir(location)
+        filename = os.path.join(location, '__init__.py') if is_package else location
+        spec = ModuleSpec(fullname, SourceFileLoader(fullname, filename),
+                          origin=filename, is_package=is_package)
+        spec.has_location = True  # Sets __file__ & __cached__
+        if is_package:
+            spec.submodule_search_locations = [location]
+        return spec
+
+    def invalidate_caches(self):
+        pass
+
+
+def install(mapping):
+    """Add a finder for mapping (import name -> path) to sys.meta_path"""
+    # Added at the end, like an entry in sys.path would be
+    sys.meta_path.append(EditableFinder(mapping))
@@ -0,0 +1,302 @@
+"""A long running server to run PEP 517 hooks in a warm process
+
+Starting Python and importing the build machinery for every hook call adds up
+when building many packages. Start a server with::
+
+    python -m flit_core.buildserver --socket /path/to/flit.sock
+
+and set FLIT_BUILD_SERVER=/path/to/flit.sock in the environment of the
+frontend (e.g. pip). flit_core.buildapi will then send hook calls over the
+Unix socket. Each request is handled in a process forked from the server, so
+concurrent requests run in parallel, and nothing a build does (changing
+directory, importing the project's module, etc.) affects the server or other
+requests.
+
+If the server can't be reached, doesn't respond in time or sends back something
+invalid, or it's running a different version of flit_core or Python, the hook
+runs in the calling process as usual. Anything the hook prints is sent back
+and printed by the calling process.
+
+This needs Unix sockets and os.fork(), so it's not available on Windows.
+"""
+from contextlib import contextmanager
+import json
+import logging
+import os
+import socket
+import sys
+
+from . import __version__
+
+log = logging.getLogger(__name__)
+
+HOOKS = {
+    'get_requires_for_build_wheel',
+    'get_requires_for_build_sdist',
+    'get_requires_for_build_editable',
+    'prepare_metadata_for_build_wheel',
+    'prepare_metadata_for_build_editable',
+    'build_wheel',
+    'build_editable',
+    'build_sdist',
+}
+
+
+#: Seconds to wait to connect to the server, and for it to run a hook. If the
+#: server doesn't respond in time, the hook is run locally instead.
+CONNECT_TIMEOUT = 10
+RESPONSE_TIMEOUT = 600
+
+
+class ServerUnavailable(Exception):
+    """The hook couldn't be run by the server, so it should be run locally"""
+
+
+class HookError(Exception):
+    """A hook raised an exception in the build server"""
+    def __init__(self, exc_type, message, server_traceback):
+        super().__init__(exc_type, message, server_traceback)
+        self.exc_type = exc_type
+        self.message = message
+        self.server_traceback = server_traceback
+
+    def __str__(self):
+        return (f"{self.exc_type}: {self.message}\n\n"
+                f"Traceback in build server:\n{self.server_traceback}")
+
+
+def _compat_info():
+    # Requests are only handled if these match between client & server.
+    return {
+        'flit_core': __version__,
+        'python': sys.implementation.cache_tag,
+    }
+
+
+# Client side -----------------------------------------------------------------
+
+def _send_request(address, request):
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ServerUnavailable("Unix sockets not supported on this platform")
+    try:
+        data = json.dumps(request).encode('utf-8') + b'\n'
+    except ValueError as e:  # e.g. UnicodeEncodeError
+        raise ServerUnavailable(f"Could not encode request: {e}")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(address)
+            sock.settimeout(RESPONSE_TIMEOUT)
+            sock.sendall(data)
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile('rb') as f:
+                response_line = f.readline()
+    except socket.timeout:
+        raise ServerUnavailable(f"Timed out waiting for build server at {address}")
+    except OSError as e:
+        raise ServerUnavailable(f"Could not connect to {address}: {e}")
+
+    if not response_line:
+        raise ServerUnavailable("Build server closed the connection without responding")
+    try:
+        response = json.loads(response_line)
+    except ValueError as e:  # Includes JSONDecodeError & UnicodeDecodeError
+        raise ServerUnavailable(f"Invalid response from build server: {e}")
+    if not (isinstance(response, dict) and 'status' in response):
+        raise ServerUnavailable("Invalid response from build server")
+    return response
+
+
+def forward_hook(address, hook_name, args):
+    """Run a PEP 517 hook in the build server listening at address
+
+    Relative paths in args are resolved from the current directory. Log
+    messages from the hook are re-emitted in this process. Raises
+    ServerUnavailable if the hook should be run locally instead.
+    """
+    request = {
+        'compat': _compat_info(),
+        'hook': hook_name,
+        'args': list(args),
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+        'sys_path': sys.path,
+        'log_level': logging.getLogger('flit_core').getEffectiveLevel(),
+    }
+    try:
+        response = _send_request(address, request)
+        if response['status'] == 'incompatible':
+            raise ServerUnavailable(
+                "Build server is incompatible (server {}, client {})".format(
+                    response['compat'], request['compat'])
+            )
+    except ServerUnavailable as e:
+        log.debug("Not using build server: %s", e)
+        raise
+
+    for levelno, logger_name, message in response.get('logs', []):
+        logging.getLogger(logger_name).log(levelno, "%s", message)
+    # Output the hook printed in the server, e.g. when importing the module
+    if response.get('stdout'):
+        sys.stdout.write(response['stdout'])
+        sys.stdout.flush()
+    if response.get('stderr'):
+        sys.stderr.write(response['stderr'])
+        sys.stderr.flush()
+
+    if response['status'] == 'error':
+        err = response['error']
+        raise HookError(err['type'], err['message'], err['traceback'])
+    return response['result']
+
+
+# Server side -----------------------------------------------------------------
+
+class _ListHandler(logging.Handler):
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.name, self.format(record)))
+
+
+def run_request(request):
+    """Handle one request in a forked process; returns the response dict"""
+    if request.get('compat') != _compat_info():
+        return {'status': 'incompatible', 'compat': _compat_info()}
+
+    hook_name = request['hook']
+    if hook_name not in HOOKS:
+        return {'status': 'error', 'error': {
+            'type': 'ValueError', 'message': f"Unknown hook {hook_name!r}",
+            'traceback': '',
+        }}
+
+    # Make this process look like the client's hook process
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    sys.path[:] = request['sys_path']
+
+    logs = []
+    root_logger = logging.getLogger()
+    root_logger.handlers = [_ListHandler(logs)]
+    root_logger.setLevel(request.get('log_level', logging.WARNING))
+
+    from . import _buildapi
+    try:
+        result = getattr(_buildapi, hook_name)(*request['args'])
+    except Exception as e:
+        import traceback
+        return {'status': 'error', 'logs': logs, 'error': {
+            'type': type(e).__name__, 'message': str(e),
+            'traceback': traceback.format_exc(),
+        }}
+    return {'status': 'ok', 'result': result, 'logs': logs}
+
+
+@contextmanager
+def _capture_output():
+    """Capture stdout & stderr at the file descriptor level
+
+    Yields a dict, which has the captured text under 'stdout' & 'stderr' once
+    the block exits, to send back to the client.
+    """
+    import tempfile
+    captured = {}
+    streams = [('stdout', sys.stdout, 1), ('stderr', sys.stderr, 2)]
+    saved = []
+    for name, stream, fd in streams:
+        stream.flush()
+        tmp = tempfile.TemporaryFile()
+        saved.append((tmp, os.dup(fd)))
+        os.dup2(tmp.fileno(), fd)
+    try:
+        yield captured
+    finally:
+        for (name, stream, fd), (tmp, saved_fd) in zip(streams, saved):
+            stream.flush()
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+            tmp.seek(0)
+            captured[name] = tmp.read().decode('utf-8', 'replace')
+            tmp.close()
+
+
+def make_server(address):
+    """Create a server listening at address; call .serve_forever() to run it"""
+    import socketserver
+
+    class ForkingUnixServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    class HookRequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            # This is a forked process, so the output would otherwise go to
+            # the server's terminal rather than the frontend
+            with _capture_output() as output:
+                response = run_request(request)
+            response.update(output)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    _remove_stale_socket(address)
+    # Only the user running the server should be able to connect to it
+    old_umask = os.umask(0o177)
+    try:
+        return ForkingUnixServer(address, HookRequestHandler)
+    finally:
+        os.umask(old_umask)
+
+
+def _remove_stale_socket(address):
+    import stat
+    try:
+        st = os.stat(address)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError(f"{address} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(address)
+        except ConnectionRefusedError:
+            os.unlink(address)  # Left over from a server which has stopped
+        else:
+            raise FileExistsError(f"A server is already listening at {address}")
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(
+        prog='python -m flit_core.buildserver',
+        description="Serve PEP 517 hook calls from flit_core.buildapi "
+                    "in a warm process",
+    )
+    ap.add_argument('--socket', required=True,
+        help="Path of the Unix socket to listen on. Set FLIT_BUILD_SERVER to "
+             "this path for tools running the build hooks."
+    )
+    args = ap.parse_args(argv)
+
+    if not (hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')):
+        sys.exit("The build server needs Unix sockets and os.fork()")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Import everything the hooks need now, so forked processes start warm
+    from . import _buildapi  # noqa: F401
+
+    server = make_server(args.socket)
+    log.info("Listening on %s (Ctrl-C to stop)", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
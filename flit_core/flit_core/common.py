@@ -1,15 +1,18 @@
 import ast
 from contextlib import contextmanager
 import hashlib
+import itertools
 import logging
 import os
 import sys
+import threading
 
 from pathlib import Path
 import re
 
 log = logging.getLogger(__name__)
 
+from . import tracing
 from .versionno import normalise_version
 
 class Module:
@@ -124,17 +127,38 @@ class VCSError(Exception):
         return f'{self.msg} ({self.directory})'
 
 
+# Builds on different threads load modules one at a time, so each one can
+# tell what changed while it was loading.
+_module_load_lock = threading.Lock()
+
+
 @contextmanager
 def _module_load_ctx():
     """Preserve some global state that modules might change at import time.
 
     - Handlers on the root logger.
+    - Entries in sys.modules: any module imported during the load (e.g. the
+      target's submodules) is removed, so a later load imports it afresh.
+
+    Rather than putting back the old state, this undoes the changes made
+    while loading. Changes made by another thread during that time, which
+    isn't loading a module itself, are undone as well.
     """
-    logging_handlers = logging.root.handlers[:]
-    try:
-        yield
-    finally:
-        logging.root.handlers = logging_handlers
+    with _module_load_lock:
+        handlers_before = logging.root.handlers[:]
+        modules_before = set(sys.modules)
+        try:
+            yield
+        finally:
+            for name in set(sys.modules) - modules_before:
+                sys.modules.pop(name, None)
+            handlers_after = logging.root.handlers[:]
+            for h in handlers_after:
+                if h not in handlers_before:
+                    logging.root.removeHandler(h)
+            for h in handlers_before:
+                if h not in handlers_after:
+                    logging.root.addHandler(h)
 
 def get_docstring_and_version_via_ast(target):
     """
@@ -167,9 +191,10 @@ def is_version_str_assignment(node):
 
 
 # To ensure we're actually loading the specified file, give it a unique name to
-# avoid any cached import. In normal use we'll only load one module per process,
-# so it should only matter for the tests, but we'll do it anyway.
-_import_i = 0
+# avoid any cached import. This matters for the tests, and when several builds
+# run in one process, possibly on different threads.
+_import_ids = itertools.count(1)
+_import_ids_lock = threading.Lock()
 
 
 def get_docstring_and_version_via_import(target):
@@ -178,24 +203,21 @@ def get_docstring_and_version_via_import(target):
     extracted by importing the module and pulling __doc__ & __version__
     from it.
     """
-    global _import_i
-    _import_i += 1
+    with _import_ids_lock:
+        import_id = next(_import_ids)
 
     log.debug("Loading module %s", target.file)
     from importlib.util import spec_from_file_location, module_from_spec
-    mod_name = f'flit_core.dummy.import{_import_i}'
+    mod_name = f'flit_core.dummy.import{import_id}'
     spec = spec_from_file_location(mod_name, target.file)
     with _module_load_ctx():
         m = module_from_spec(spec)
         # Add the module to sys.modules to allow relative imports to work.
         # importlib has more code around this to handle the case where two
-        # threads are trying to load the same module at the same time, but Flit
-        # should always be running a single thread, so we won't duplicate that.
+        # threads are trying to load the same module at the same time, but
+        # each load here has its own name, so threads never share a module.
         sys.modules[mod_name] = m
-        try:
-            spec.loader.exec_module(m)
-        finally:
-            sys.modules.pop(mod_name, None)
+        spec.loader.exec_module(m)
 
     docstring = m.__dict__.get('__doc__', None)
     version = m.__dict__.get('__version__', None)
@@ -462,10 +484,11 @@ class Metadata:
 
 
 def make_metadata(module, ini_info):
-    md_dict = {'name': module.name, 'provides': [module.name]}
-    md_dict.update(get_info_from_module(module, ini_info.dynamic_metadata))
-    md_dict.update(ini_info.metadata)
-    return Metadata(md_dict)
+    with tracing.span('make metadata', dynamic=sorted(ini_info.dynamic_metadata)):
+        md_dict = {'name': module.name, 'provides': [module.name]}
+        md_dict.update(get_info_from_module(module, ini_info.dynamic_metadata))
+        md_dict.update(ini_info.metadata)
+        return Metadata(md_dict)
 
 
 def normalise_core_metadata_name(name):
@@ -492,6 +515,22 @@ def dist_info_name(distribution, version):
     return f'{normalize_dist_name(distribution, version)}.dist-info'
 
 
+def editable_hook_files(module: Module):
+    """Make the files for an import hook pointing to the module's source
+
+    Returns a list of (filename, content) tuples, to be written to
+    site-packages: a module defining the finder, and a .pth file to load it.
+    """
+    mod_name = module.name.replace('.', '_')
+    finder_name = f'__editable___{mod_name}_finder'
+    template = Path(__file__).with_name('_editable_finder.py').read_text('utf-8')
+    mapping = {module.name: str(module.path.resolve())}
+    return [
+        (f'{finder_name}.py', f'{template}\ninstall({mapping!r})\n'),
+        (f'__editable__.{mod_name}.pth', f'import {finder_name}\n'),
+    ]
+
+
 def walk_data_dir(data_directory):
     """Iterate over the files in the given data directory.
 
@@ -19,6 +19,7 @@ except ImportError:
 
 from ._spdx_data import licenses
 from .common import normalise_core_metadata_name
+from . import tracing
 from .versionno import normalise_version
 
 log = logging.getLogger(__name__)
@@ -71,8 +72,9 @@ license_files_allowed_chars = re.compile(r'^[\w\-\.\/\*\?\[\] ]+$')
 def read_flit_config(path):
     """Read and check the `pyproject.toml` file with data about the package.
     """
-    d = tomllib.loads(path.read_text('utf-8'))
-    return prep_toml_config(d, path)
+    with tracing.span('read config', file=str(path)):
+        d = tomllib.loads(path.read_text('utf-8'))
+        return prep_toml_config(d, path)
 
 
 class EntryPointsConflict(ConfigError):
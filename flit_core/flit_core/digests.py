@@ -0,0 +1,216 @@
+"""Hash built files as they're written, and remember the digests
+
+Uploading a file to an index needs its md5 & sha256 digests. Rather than
+reading large wheels & sdists back from disk to hash them, the builders write
+them through a HashingWriter, and return the digests with the built file.
+``flit build`` and ``flit publish`` record them in a small JSON file
+(``.flit-digests.json``) in the dist folder. Tools uploading or checking the
+files can look the digests up there, so long as the file's size & modification
+time haven't changed since it was built. The PEP 517 hooks don't write this
+file, as the output folder belongs to the frontend.
+
+The manifest's name starts with a dot so that ``dist/*`` doesn't match it.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.flit-digests.json'
+MANIFEST_VERSION = 1
+
+#: Most data a seekable HashingWriter holds back before giving up on it
+MAX_PENDING = 16 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+_manifest_lock = threading.Lock()
+
+
+def _new_hashes():
+    hashes = {'sha256': hashlib.sha256()}
+    try:
+        hashes['md5'] = hashlib.md5()
+    except ValueError:
+        pass  # md5 is disabled on systems in FIPS mode
+    return hashes
+
+
+def _results(hashes, size):
+    d = {name: h.hexdigest() for name, h in hashes.items()}
+    d['size'] = size
+    return d
+
+
+def hash_file(path):
+    """Read a file to find its digests, if we don't already know them
+
+    Returns a dict with 'size', 'sha256' and (where available) 'md5' keys,
+    the same as HashingWriter.digests().
+    """
+    hashes = _new_hashes()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            for h in hashes.values():
+                h.update(chunk)
+            size += len(chunk)
+    return _results(hashes, size)
+
+
+class HashingWriter:
+    """Wrap a writable binary file, hashing the data as it's written
+
+    If the file can seek, the code writing it may go back and overwrite data
+    (zipfile does this to fill in each member's header). So data is held back
+    until the writer seeks to the end of the file again (where zipfile carries
+    on), and only then hashed. If more than max_pending bytes are held back,
+    or data which was already hashed is overwritten, the digests are lost, and
+    digests() returns None.
+
+    Pass seekable=False for code which only appends, such as gzip: the data is
+    then hashed as soon as it's written.
+    """
+    def __init__(self, fp, seekable=None, max_pending=MAX_PENDING):
+        self.fp = fp
+        if seekable is None:
+            seekable = fp.seekable()
+        self._seekable = seekable
+        self._max_pending = max_pending
+        self._hashes = _new_hashes()
+        self._start = fp.tell() if seekable else 0
+        self._pos = self._end = self._hashed = self._start
+        self._pending = bytearray()
+        self._lost = False
+
+    def seekable(self):
+        return self._seekable
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if not self._seekable:
+            raise io.UnsupportedOperation('seek')
+        self._pos = self.fp.seek(offset, whence)
+        if self._pos == self._end:
+            self._commit()
+        return self._pos
+
+    def write(self, data):
+        n = self.fp.write(data)
+        if n is None:  # Unbuffered file without room for the data
+            raise BlockingIOError("Non-blocking files are not supported")
+        written = memoryview(data)[:n]
+        if self._lost:
+            pass
+        elif not self._seekable:
+            for h in self._hashes.values():
+                h.update(written)
+        else:
+            offset = self._pos - self._hashed
+            if offset < 0 or offset > len(self._pending):
+                self._lose("data was overwritten after it was hashed")
+            else:
+                self._pending[offset:offset + n] = written
+                if len(self._pending) > self._max_pending:
+                    self._lose(f"more than {self._max_pending} bytes held back")
+        self._pos += n
+        self._end = max(self._end, self._pos)
+        return n
+
+    def flush(self):
+        self.fp.flush()
+
+    def _commit(self):
+        if self._pending:
+            for h in self._hashes.values():
+                h.update(self._pending)
+            self._hashed += len(self._pending)
+            self._pending = bytearray()
+
+    def _lose(self, reason):
+        log.debug("Can't hash %s as it's written: %s",
+                  getattr(self.fp, 'name', 'file'), reason)
+        self._lost = True
+        self._pending = bytearray()
+
+    def digests(self):
+        """Digests of all the data written, or None if they were lost
+
+        Call this once the file is complete. Returns a dict like hash_file().
+        """
+        if self._lost:
+            return None
+        self._commit()
+        return _results(self._hashes, self._end - self._start)
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            d = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not (isinstance(d, dict) and d.get('version') == MANIFEST_VERSION
+            and isinstance(d.get('files'), dict)):
+        return {}
+    return {k: v for k, v in d['files'].items() if isinstance(v, dict)}
+
+
+def record_digests(path, digests):
+    """Save the digests of a built file in the manifest in its folder
+
+    Entries for files which are no longer there are dropped. Errors writing
+    the manifest are logged, not raised, as it's only there to save time.
+    The lock only covers threads in this process: if two processes record
+    digests in the same folder at once, one entry may be lost, which only
+    means that file is hashed again when it's needed.
+    """
+    path = Path(path)
+    dist_dir = path.parent
+    try:
+        st = path.stat()
+        with _manifest_lock:
+            files = {name: entry for name, entry
+                     in _read_manifest(dist_dir / MANIFEST_NAME).items()
+                     if (dist_dir / name).is_file()}
+            files[path.name] = dict(digests, mtime_ns=st.st_mtime_ns)
+            fd, tmp_path = tempfile.mkstemp(prefix=MANIFEST_NAME, dir=str(dist_dir))
+            try:
+                with open(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MANIFEST_VERSION, 'files': files}, f,
+                              indent=2, sort_keys=True)
+                os.replace(tmp_path, str(dist_dir / MANIFEST_NAME))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+    except OSError as e:
+        log.warning("Couldn't record digests for %s: %s", path.name, e)
+
+
+def lookup_digests(path):
+    """Get the digests recorded for a built file
+
+    Returns a dict like hash_file(), or None if there are no digests recorded,
+    or the file has changed since they were.
+    """
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    entry = _read_manifest(path.parent / MANIFEST_NAME).get(path.name)
+    if (entry is None or entry.get('size') != st.st_size
+            or entry.get('mtime_ns') != st.st_mtime_ns
+            or not isinstance(entry.get('sha256'), str)):
+        return None
+    return {k: v for k, v in entry.items() if k in ('size', 'sha256', 'md5')}
@@ -0,0 +1,202 @@
+"""Load a project once, and build it repeatedly in the same process
+
+Each PEP 517 hook reads pyproject.toml, finds the module and works out the
+metadata from scratch. That's fine when every hook runs in a new process,
+but a long-lived tool building the same project many times can use a
+Project instead::
+
+    from flit_core.project import Project
+
+    proj = Project('path/to/pyproject.toml')
+    proj.metadata.version
+    proj.build_wheel('dist', editable=True)
+    proj.build_sdist('dist')
+"""
+import hashlib
+import logging
+import os
+import os.path as osp
+from pathlib import Path
+import threading
+
+from . import common
+from .config import read_flit_config
+from .sdist import SdistBuilder
+from .wheel import WheelBuilder, _make_wheel_in, _write_wheel_file
+
+log = logging.getLogger(__name__)
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                return h.hexdigest()
+            h.update(chunk)
+
+
+def _file_state(path):
+    """(mtime, size, hash) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, _file_hash(path)
+    except FileNotFoundError:
+        return None
+
+
+class _Snapshot:
+    """The state of the files something cached was loaded from"""
+    def __init__(self, paths=()):
+        self.files = {}
+        self.add(paths)
+
+    def add(self, paths):
+        for p in paths:
+            self.files[str(p)] = _file_state(p)
+
+    def changed(self):
+        """Check if any of the files have changed since the snapshot
+
+        Files are only hashed again if their modification time or size is
+        different, so touching a file doesn't count as changing it.
+        """
+        for path, old in self.files.items():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                if old is None:
+                    continue
+                return True
+            if old is None:
+                return True
+
+            mtime, size, digest = old
+            if (st.st_mtime_ns, st.st_size) == (mtime, size):
+                continue
+            if st.st_size != size or _file_hash(path) != digest:
+                log.debug("%s has changed", path)
+                return True
+            self.files[path] = (st.st_mtime_ns, size, digest)
+        return False
+
+
+class Project:
+    """A project to build, loaded from its pyproject.toml
+
+    The config, module and metadata are loaded when they're first needed,
+    and kept for later. Each time they're used, the files they were loaded
+    from are checked, and anything depending on a changed file is loaded
+    again. A file has changed if its content is different; its hash is only
+    calculated again if the modification time or size has changed.
+
+    Only files which were read are checked. E.g. a new file matching a
+    ``license-files`` pattern won't be noticed; call :meth:`invalidate` to
+    load everything again. The objects returned are shared between builds,
+    so don't modify them.
+
+    A Project can be used from several threads at once, e.g. to build a
+    wheel and an sdist concurrently. Loading is done by one thread at a time;
+    building runs in parallel. Unlike the PEP 517 hooks, a Project doesn't
+    depend on the current directory, so threads can build different projects.
+    """
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / 'pyproject.toml'
+        # Absolute, so the project still works if the current directory changes
+        self.ini_path = path.absolute()
+        self.directory = self.ini_path.parent
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    def __repr__(self):
+        return f"<Project {self.directory}>"
+
+    def invalidate(self):
+        """Forget everything loaded, so it's loaded again when next used"""
+        with self._lock:
+            self._config = self._config_files = None
+            self._metadata = self._metadata_files = None
+            self._metadata_from = None
+
+    def _load_config(self):
+        if self._config is None or self._config_files.changed():
+            # Record the state of pyproject.toml before reading it, so a
+            # change while it's being read is seen next time.
+            files = _Snapshot([self.ini_path])
+            config = read_flit_config(self.ini_path)
+            files.add(self.directory / f for f in config.referenced_files)
+            self._config, self._config_files = config, files
+        return self._config
+
+    def load(self):
+        """Get the config, module & metadata, loading any that have changed
+
+        Returns a tuple of (LoadedConfig, Module, Metadata).
+        """
+        with self._lock:
+            config = self._load_config()
+            # Finding the module only takes a few stat calls, so it's not cached
+            module = common.Module(config.module, self.directory)
+
+            if (self._metadata is None
+                    or self._metadata_from != (config, module.path)
+                    or self._metadata_files.changed()):
+                # Version & description can come from the module's code
+                version_files = module.version_files if config.dynamic_metadata else []
+                files = _Snapshot(version_files)
+                self._metadata = common.make_metadata(module, config)
+                self._metadata_files = files
+                self._metadata_from = (config, module.path)
+            return config, module, self._metadata
+
+    @property
+    def config(self):
+        return self.load()[0]
+
+    @property
+    def module(self):
+        return self.load()[1]
+
+    @property
+    def metadata(self):
+        return self.load()[2]
+
+    def prepare_metadata(self, metadata_directory):
+        """Write a .dist-info folder in metadata_directory; returns its name"""
+        config, module, metadata = self.load()
+        dist_info = osp.join(metadata_directory,
+                             common.dist_info_name(metadata.name, metadata.version))
+        os.mkdir(dist_info)
+
+        with open(osp.join(dist_info, 'WHEEL'), 'w', encoding='utf-8') as f:
+            _write_wheel_file(f, supports_py2=metadata.supports_py2)
+
+        with open(osp.join(dist_info, 'METADATA'), 'w', encoding='utf-8') as f:
+            metadata.write_metadata_file(f)
+
+        if config.entrypoints:
+            with open(osp.join(dist_info, 'entry_points.txt'), 'w', encoding='utf-8') as f:
+                common.write_entry_points(config.entrypoints, f)
+
+        return osp.basename(dist_info)
+
+    def build_wheel(self, wheel_directory, editable=False, editable_mode='pth'):
+        """Build a wheel in wheel_directory; returns its path"""
+        def get_builder():
+            config, module, metadata = self.load()
+            return WheelBuilder(
+                self.directory, module, metadata, config.entrypoints, None,
+                config.data_directory,
+            )
+        return _make_wheel_in(
+            get_builder, Path(wheel_directory), editable, editable_mode
+        ).file
+
+    def build_sdist(self, sdist_directory):
+        """Build an sdist in sdist_directory; returns its path"""
+        config, module, metadata = self.load()
+        builder = SdistBuilder.from_loaded(self.ini_path, config, module, metadata)
+        return builder.build(Path(sdist_directory))
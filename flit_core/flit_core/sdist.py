@@ -11,6 +11,8 @@ from posixpath import join as pjoin
 import tarfile
 
 from . import common
+from . import tracing
+from .digests import HashingWriter
 
 log = logging.getLogger(__name__)
 
@@ -82,15 +84,22 @@ class SdistBuilder:
         self.data_directory = data_directory
         self.includes = FilePatterns(include_patterns, str(cfgdir))
         self.excludes = FilePatterns(exclude_patterns, str(cfgdir))
+        # Set by build(): size, sha256 & md5 of the sdist
+        self.digests = None
 
     @classmethod
     def from_ini_path(cls, ini_path: Path):
         # Local import so bootstrapping doesn't try to load toml
         from .config import read_flit_config
         ini_info = read_flit_config(ini_path)
-        srcdir = ini_path.parent
-        module = common.Module(ini_info.module, srcdir)
+        module = common.Module(ini_info.module, ini_path.parent)
         metadata = common.make_metadata(module, ini_info)
+        return cls.from_loaded(ini_path, ini_info, module, metadata)
+
+    @classmethod
+    def from_loaded(cls, ini_path: Path, ini_info, module, metadata):
+        """Make an SdistBuilder from config, module & metadata already loaded"""
+        srcdir = ini_path.parent
         extra_files = [ini_path.name, *map(osp.normpath, ini_info.referenced_files)]
         return cls(
             module, metadata, srcdir, ini_info.reqs_by_extra,
@@ -160,37 +169,52 @@ class SdistBuilder:
         target = target_dir / f'{self.dir_name}.tar.gz'
         source_date_epoch = os.environ.get('SOURCE_DATE_EPOCH', '')
         mtime = int(source_date_epoch) if source_date_epoch else None
-        # For the gzip timestamp, default to 2016-1-1 00:00 (UTC)
-        # This makes the sdist reproducible even without SOURCE_DATE_EPOCH,
-        # if the source file mtimes don't change, i.e. from the same checkout.
-        gz = GzipFile(str(target), mode='wb', mtime=(mtime or 1451606400))
-        tf = tarfile.TarFile(str(target), mode='w', fileobj=gz,
-                             format=tarfile.PAX_FORMAT)
-
-        try:
-            files_to_add = self.apply_includes_excludes(self.select_files())
-
-            for relpath in files_to_add:
-                path = str(self.cfgdir / relpath)
-                ti = tf.gettarinfo(path, arcname=pjoin(self.dir_name, relpath))
-                ti = clean_tarinfo(ti, mtime)
-
-                if ti.isreg():
-                    with open(path, 'rb') as f:
-                        tf.addfile(ti, f)
-                else:
-                    tf.addfile(ti)  # Symlinks & ?
-
-            stream = io.StringIO()
-            self.metadata.write_metadata_file(stream)
-            pkg_info = stream.getvalue().encode()
-            ti = tarfile.TarInfo(pjoin(self.dir_name, 'PKG-INFO'))
-            ti.size = len(pkg_info)
-            tf.addfile(ti, io.BytesIO(pkg_info))
-
-        finally:
-            tf.close()
-            gz.close()
+        with open(str(target), 'wb') as raw:
+            # Hash the compressed data on its way to disk, so it needn't be read back
+            hw = HashingWriter(raw, seekable=False)
+            # For the gzip timestamp, default to 2016-1-1 00:00 (UTC)
+            # This makes the sdist reproducible even without SOURCE_DATE_EPOCH,
+            # if the source file mtimes don't change, i.e. from the same checkout.
+            gz = GzipFile(str(target), mode='wb', fileobj=hw, mtime=(mtime or 1451606400))
+            tf = tarfile.TarFile(str(target), mode='w', fileobj=gz,
+                                 format=tarfile.PAX_FORMAT)
+
+            try:
+                with tracing.span('find sdist files') as sp:
+                    files_to_add = self.apply_includes_excludes(self.select_files())
+                    sp['files'] = len(files_to_add)
+
+                with tracing.span('sdist gzip', file=target.name) as sp:
+                    bytes_in = 0
+                    for relpath in files_to_add:
+                        path = str(self.cfgdir / relpath)
+                        ti = tf.gettarinfo(path, arcname=pjoin(self.dir_name, relpath))
+                        ti = clean_tarinfo(ti, mtime)
+
+                        if ti.isreg():
+                            with open(path, 'rb') as f:
+                                tf.addfile(ti, f)
+                            bytes_in += ti.size
+                        else:
+                            tf.addfile(ti)  # Symlinks & ?
+
+                    stream = io.StringIO()
+                    self.metadata.write_metadata_file(stream)
+                    pkg_info = stream.getvalue().encode()
+                    ti = tarfile.TarInfo(pjoin(self.dir_name, 'PKG-INFO'))
+                    ti.size = len(pkg_info)
+                    tf.addfile(ti, io.BytesIO(pkg_info))
+
+                    tf.close()
+                    gz.close()
+                    sp['bytes_in'] = bytes_in + len(pkg_info)
+                    sp['bytes_out'] = hw.tell()
+
+            finally:
+                tf.close()
+                gz.close()
+
+        self.digests = hw.digests()
 
         log.info("Built sdist: %s", target)
         return target
@@ -0,0 +1,256 @@
+"""Optional tracing of where flit spends its time
+
+Tracing is off unless the ``FLIT_TRACE`` environment variable (or
+``trace-dir`` in a PEP 517 hook's config_settings) names a directory. Each
+flit command or build hook then writes a file there in the Chrome trace event
+format, which can be loaded in chrome://tracing or https://ui.perfetto.dev,
+or aggregated with other traces. Each span records its duration, any byte
+counts the code adds to it, and the peak memory allocated while it ran (from
+tracemalloc; set ``FLIT_TRACE_MEMORY=0`` to skip this, as it slows things
+down).
+
+Code marks spans like this::
+
+    with tracing.span('compress', file=name) as sp:
+        ...
+        sp['bytes_out'] = size
+
+When tracing is off, ``span()`` does almost nothing.
+"""
+import json
+import os
+import os.path as osp
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import __version__
+
+# enable() sets a tracer for the whole process, so spans in any thread are
+# recorded. Build hooks may run concurrently in one process, so each hook's
+# tracer is kept in a context variable instead, visible only to that call.
+_tracer = None
+_hook_tracer = ContextVar('flit_core_hook_tracer', default=None)
+
+# Tracers sharing tracemalloc; it's stopped when the last one finishes
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def _current_tracer():
+    return _hook_tracer.get() or _tracer
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}  # Anything added to this is thrown away
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        if self.tracer.memory:
+            self.tracer._memory_enter()
+        self.start = time.perf_counter_ns()
+        return self.args
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = time.perf_counter_ns() - self.start
+        if self.tracer.memory:
+            self.args['peak_memory'] = self.tracer._memory_exit()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.add_event(self.name, self.start, duration, self.args)
+
+
+class Tracer:
+    """Collects spans as Chrome trace events"""
+    def __init__(self, label, memory=True):
+        self.label = label
+        self.memory = memory
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if memory:
+            import tracemalloc  # Not imported unless it's used
+            self._tracemalloc = tracemalloc
+            self._use_tracemalloc()
+        # Timestamps are in microseconds since the epoch, so traces from
+        # different processes line up.
+        self._start_ns = time.perf_counter_ns()
+        self._epoch_offset_ns = time.time_ns() - self._start_ns
+
+    def _use_tracemalloc(self):
+        global _tracemalloc_users, _tracemalloc_started
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not self._tracemalloc.is_tracing():
+                self._tracemalloc.start()
+                _tracemalloc_started = True
+            _tracemalloc_users += 1
+
+    def _release_tracemalloc(self):
+        global _tracemalloc_users, _tracemalloc_started
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                self._tracemalloc.stop()
+                _tracemalloc_started = False
+
+    def span(self, name, args):
+        return _Span(self, name, args)
+
+    def add_event(self, name, start_ns, duration_ns, args):
+        event = {
+            'name': name, 'cat': 'flit', 'ph': 'X',
+            'ts': (start_ns + self._epoch_offset_ns) / 1000,
+            'dur': duration_ns / 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    # tracemalloc only tracks one peak for the process. To get the peak for
+    # nested spans, we reset it at the start & end of each span, and keep the
+    # highest value seen so far for each span on a stack. With several threads,
+    # the peaks include memory allocated by other threads.
+    def _memory_stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _memory_enter(self):
+        tracemalloc = self._tracemalloc
+        stack = self._memory_stack()
+        if stack:
+            stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+        stack.append(tracemalloc.get_traced_memory()[0])
+        if hasattr(tracemalloc, 'reset_peak'):  # Python >= 3.9
+            tracemalloc.reset_peak()
+
+    def _memory_exit(self):
+        tracemalloc = self._tracemalloc
+        stack = self._memory_stack()
+        peak = max(stack.pop(), tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1] = max(stack[-1], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return peak
+
+    def finish(self, trace_dir):
+        """Stop tracing and write the trace file; returns its path"""
+        end_ns = time.perf_counter_ns()
+        if self.memory:
+            self._release_tracemalloc()
+        self.add_event(self.label, self._start_ns, end_ns - self._start_ns, {
+            'argv': sys.argv, 'cwd': os.getcwd(),
+        })
+        pid = os.getpid()
+        data = {
+            'traceEvents': [
+                {'name': 'process_name', 'ph': 'M', 'pid': pid,
+                 'args': {'name': self.label}},
+            ] + self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'flit_core_version': __version__,
+                'python_version': sys.version,
+                'platform': sys.platform,
+            },
+        }
+        os.makedirs(trace_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '-' for c in self.label)
+        path = osp.join(trace_dir, 'flit-{}-{}-{}.json'.format(
+            safe_label, pid, self._start_ns + self._epoch_offset_ns,
+        ))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        return path
+
+
+def span(name, **args):
+    """Record how long a block of code takes, if tracing is enabled
+
+    Used as a context manager; it gives a dict for adding details to the span.
+    """
+    tracer = _current_tracer()
+    if tracer is None:
+        return _null_span
+    return tracer.span(name, args)
+
+
+def is_enabled():
+    return _current_tracer() is not None
+
+
+def trace_dir_setting(config_settings=None):
+    """Get the directory to write traces to, or None if tracing is off"""
+    trace_dir = (config_settings or {}).get('trace-dir') \
+                or os.environ.get('FLIT_TRACE', '')
+    return trace_dir or None
+
+
+def _new_tracer(label):
+    return Tracer(label, memory=os.environ.get('FLIT_TRACE_MEMORY', '1') != '0')
+
+
+def enable(label, trace_dir):
+    """Start tracing, if it's not already enabled
+
+    Returns a function to stop tracing & write the trace file, or None if it
+    was already enabled.
+    """
+    global _tracer
+    if is_enabled():
+        return None
+    tracer = _tracer = _new_tracer(label)
+
+    def finish():
+        global _tracer
+        _tracer = None
+        return tracer.finish(trace_dir)
+
+    return finish
+
+
+@contextmanager
+def hook_trace(hook_name, config_settings=None):
+    """Trace a build hook, if tracing is requested
+
+    Each call gets its own tracer (and trace file), so hooks running
+    concurrently in one process don't interfere. If tracing is already on,
+    the hook is recorded as a span in the current trace.
+    """
+    trace_dir = trace_dir_setting(config_settings)
+    if not trace_dir or is_enabled():
+        with span(hook_name):
+            yield
+        return
+
+    tracer = _new_tracer(hook_name)
+    token = _hook_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _hook_tracer.reset(token)
+        tracer.finish(trace_dir)
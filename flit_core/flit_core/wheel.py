@@ -10,6 +10,7 @@ import logging
 import os
 import os.path as osp
 import stat
+import sys
 import tempfile
 from pathlib import Path
 from types import SimpleNamespace
@@ -17,6 +18,8 @@ import zipfile
 
 from flit_core import __version__
 from . import common
+from . import tracing
+from .digests import HashingWriter, hash_file
 
 log = logging.getLogger(__name__)
 
@@ -60,11 +63,19 @@ def zip_timestamp_from_env() -> tuple[int, int, int, int, int, int] | None:
         return 1980, 1, 1, 0, 0, 0
 
 
+#: Size of the chunks used to copy files into the wheel
+COPY_BUFSIZE = 1024 * 1024
+
+
 class WheelBuilder:
     def __init__(
             self, directory, module, metadata, entrypoints, target_fp, data_directory
     ):
         """Build a wheel from a module/package
+
+        target_fp can be any writable binary file object, including pipes &
+        sockets which can't seek. It can also be None, and passed to build()
+        later, e.g. to check the wheel_filename first.
         """
         self.directory = directory
         self.module = module
@@ -75,12 +86,18 @@ class WheelBuilder:
         self.records = []
         self.source_time_stamp = zip_timestamp_from_env()
 
-        # Open the zip file ready to write
+        self.wheel_zip = None
+        if target_fp is not None:
+            self._open_zip(target_fp)
+
+    def _open_zip(self, target_fp):
+        # If target_fp can't seek, zipfile writes the sizes & CRC of each file
+        # after its data (in a 'data descriptor'), so it never needs to go back.
         self.wheel_zip = zipfile.ZipFile(target_fp, 'w',
                              compression=zipfile.ZIP_DEFLATED)
 
     @classmethod
-    def from_ini_path(cls, ini_path, target_fp):
+    def from_ini_path(cls, ini_path, target_fp=None):
         from .config import read_flit_config
         directory = ini_path.parent
         ini_info = read_flit_config(ini_path)
@@ -109,14 +126,17 @@ class WheelBuilder:
             # RECORD
             rel_path = rel_path.replace(os.sep, '/')
 
+        st = os.stat(full_path)
         if self.source_time_stamp is None:
             zinfo = zipfile.ZipInfo.from_file(full_path, rel_path)
         else:
             # Set timestamps in zipfile for reproducible build
             zinfo = zipfile.ZipInfo(rel_path, self.source_time_stamp)
+        # Declaring the size up front lets zipfile use ZIP64 for large files
+        zinfo.file_size = st.st_size
 
         # Normalize permission bits to either 755 (executable) or 644
-        st_mode = os.stat(full_path).st_mode
+        st_mode = st.st_mode
         new_mode = common.normalize_file_permissions(st_mode)
         _set_zinfo_mode(zinfo, new_mode & 0xFFFF)  # Unix attributes
 
@@ -126,15 +146,19 @@ class WheelBuilder:
         zinfo.compress_type = zipfile.ZIP_DEFLATED
 
         hashsum = hashlib.sha256()
-        with open(full_path, 'rb') as src, self.wheel_zip.open(zinfo, 'w') as dst:
-            while True:
-                buf = src.read(1024 * 8)
-                if not buf:
-                    break
-                hashsum.update(buf)
-                dst.write(buf)
-
-        size = os.stat(full_path).st_size
+        with tracing.span('compress', file=rel_path) as sp:
+            with open(full_path, 'rb') as src, self.wheel_zip.open(zinfo, 'w') as dst:
+                # Copy in chunks, so memory use doesn't depend on file size
+                while True:
+                    buf = src.read(COPY_BUFSIZE)
+                    if not buf:
+                        break
+                    hashsum.update(buf)
+                    dst.write(buf)
+            sp['bytes_in'] = zinfo.file_size
+            sp['bytes_out'] = zinfo.compress_size
+
+        size = zinfo.file_size  # Bytes actually written
         hash_digest = urlsafe_b64encode(hashsum.digest()).decode('ascii').rstrip('=')
         self.records.append((rel_path, hash_digest, size))
 
@@ -161,7 +185,10 @@ class WheelBuilder:
         log.info('Copying package file(s) from %s', self.module.path)
         source_dir = str(self.module.source_dir)
 
-        for full_path in self.module.iter_files():
+        with tracing.span('find module files') as sp:
+            files = list(self.module.iter_files())
+            sp['files'] = len(files)
+        for full_path in files:
             rel_path = osp.relpath(full_path, source_dir)
             self._add_file(full_path, rel_path)
 
@@ -169,6 +196,11 @@ class WheelBuilder:
         with self._write_to_zip(self.module.name + ".pth") as f:
             f.write(str(self.module.source_dir.resolve()))
 
+    def add_import_hook(self):
+        for filename, content in common.editable_hook_files(self.module):
+            with self._write_to_zip(filename) as f:
+                f.write(content)
+
     def add_data_directory(self):
         dist_name = common.normalize_dist_name(self.metadata.name, self.metadata.version)
         for full_path in common.walk_data_dir(self.data_directory):
@@ -194,16 +226,23 @@ class WheelBuilder:
     def write_record(self):
         log.info('Writing the record of files')
         # Write a record of the files in the wheel
-        with self._write_to_zip(f'{self.dist_info}/RECORD') as f:
+        with tracing.span('write RECORD', entries=len(self.records)), \
+                self._write_to_zip(f'{self.dist_info}/RECORD') as f:
             writer = csv.writer(f)
             for path, hash, size in self.records:
                 writer.writerow((path, f'sha256={hash}', size))
             # RECORD itself is recorded with no hash or size
             writer.writerow((f'{self.dist_info}/RECORD', '', ''))
 
-    def build(self, editable=False):
+    def build(self, editable=False, editable_mode='pth', target_fp=None):
+        if target_fp is not None:
+            self._open_zip(target_fp)
+        elif self.wheel_zip is None:
+            raise ValueError("No file to write the wheel to")
         try:
-            if editable:
+            if editable and editable_mode == 'import-hook':
+                self.add_import_hook()
+            elif editable:
                 self.add_pth()
             else:
                 self.copy_module()
@@ -213,15 +252,29 @@ class WheelBuilder:
         finally:
             self.wheel_zip.close()
 
-def make_wheel_in(ini_path, wheel_directory, editable=False):
+EDITABLE_MODES = {'pth', 'import-hook'}
+
+def make_wheel_in(ini_path, wheel_directory, editable=False, editable_mode='pth'):
+    return _make_wheel_in(
+        lambda: WheelBuilder.from_ini_path(ini_path),
+        wheel_directory, editable, editable_mode,
+    )
+
+
+def _make_wheel_in(get_builder, wheel_directory, editable, editable_mode):
+    if editable_mode not in EDITABLE_MODES:
+        raise ValueError(f"Unknown editable mode: {editable_mode!r}")
     # We don't know the final filename until metadata is loaded, so write to
     # a temporary_file, and rename it afterwards.
     (fd, temp_path) = tempfile.mkstemp(suffix='.whl', dir=str(wheel_directory))
     try:
-        with open(fd, 'w+b') as fp:
-            wb = WheelBuilder.from_ini_path(ini_path, fp)
-            wb.build(editable)
+        with open(fd, 'w+b') as fp, tracing.span('build wheel') as sp:
+            wb = get_builder()
+            hw = HashingWriter(fp)
+            wb.build(editable, editable_mode, target_fp=hw)
+            sp['bytes_out'] = fp.tell()
 
+        digests = hw.digests() or hash_file(temp_path)
         wheel_path = wheel_directory / wb.wheel_filename
         os.replace(temp_path, str(wheel_path))
     except:
@@ -229,7 +282,24 @@ def make_wheel_in(ini_path, wheel_directory, editable=False):
         raise
 
     log.info("Built wheel: %s", wheel_path)
-    return SimpleNamespace(builder=wb, file=wheel_path)
+    return SimpleNamespace(builder=wb, file=wheel_path, digests=digests)
+
+
+def make_wheel_to(ini_path, target_fp, editable=False, editable_mode='pth'):
+    """Build a wheel and write it to a writable binary file object
+
+    Unlike make_wheel_in(), this doesn't need a directory or a seekable file,
+    so the wheel can be written to a pipe, a socket or an in-memory buffer.
+    Returns the WheelBuilder; its wheel_filename attribute is the name the
+    wheel should be saved as.
+    """
+    if editable_mode not in EDITABLE_MODES:
+        raise ValueError(f"Unknown editable mode: {editable_mode!r}")
+    with tracing.span('build wheel'):
+        wb = WheelBuilder.from_ini_path(ini_path)
+        log.info("Writing wheel %s to stream", wb.wheel_filename)
+        wb.build(editable, editable_mode, target_fp=target_fp)
+    return wb
 
 
 def main(argv=None):
@@ -247,10 +317,26 @@ def main(argv=None):
         '-o',
         help='output directory (defaults to {srcdir}/dist)',
     )
+    parser.add_argument(
+        '--stdout',
+        action='store_true',
+        help='write the wheel to stdout; its filename is printed to stderr',
+    )
     args = parser.parse_args(argv)
+    pyproj_toml = args.srcdir / 'pyproject.toml'
+    if args.stdout:
+        if args.outdir is not None:
+            parser.error("--outdir and --stdout can't be used together")
+        out = sys.stdout.buffer
+        wb = WheelBuilder.from_ini_path(pyproj_toml)
+        # The filename comes first, so whatever reads the wheel can use it
+        print(wb.wheel_filename, file=sys.stderr, flush=True)
+        wb.build(target_fp=out)
+        out.flush()
+        return
+
     outdir = args.srcdir / 'dist' if args.outdir is None else Path(args.outdir)
     print("Building wheel from", args.srcdir)
-    pyproj_toml = args.srcdir / 'pyproject.toml'
     outdir.mkdir(parents=True, exist_ok=True)
     info = make_wheel_in(pyproj_toml, outdir)
     print("Wheel built", outdir / info.file.name)
@@ -71,6 +71,19 @@ def test_build_editable():
             assert "module1.py" not in zip.namelist()
             assert "module1.pth" in zip.namelist()
 
+def test_build_editable_import_hook():
+    with TemporaryDirectory() as td, cwd(osp.join(samples_dir,'pep517')):
+        filename = buildapi.build_editable(
+            td, config_settings={'editable-mode': 'import-hook'}
+        )
+        with zipfile.ZipFile(osp.join(td, filename)) as zip:
+            names = zip.namelist()
+            assert "module1.py" not in names
+            assert "module1.pth" not in names
+            assert "__editable___module1_finder.py" in names
+            pth = zip.read("__editable__.module1.pth").decode('utf-8')
+            assert pth.strip() == "import __editable___module1_finder"
+
 def test_build_sdist():
     with TemporaryDirectory() as td, cwd(osp.join(samples_dir,'pep517')):
         filename = buildapi.build_sdist(td)
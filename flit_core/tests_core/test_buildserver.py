@@ -0,0 +1,185 @@
+import os
+import os.path as osp
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+
+import pytest
+from testpath import assert_isfile
+
+from flit_core import buildapi, buildserver
+
+samples_dir = osp.join(osp.dirname(__file__), 'samples')
+
+pytestmark = pytest.mark.skipif(
+    not (hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')),
+    reason="Build server needs Unix sockets and fork()"
+)
+
+
+@pytest.fixture(scope='module')
+def server_address(tmp_path_factory):
+    address = str(tmp_path_factory.mktemp('buildserver') / 'flit.sock')
+    env = os.environ.copy()
+    env['PYTHONPATH'] = osp.dirname(osp.dirname(buildserver.__file__))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'flit_core.buildserver', '--socket', address],
+        env=env,
+    )
+    try:
+        for _ in range(100):
+            if osp.exists(address):
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail("Build server didn't start")
+        yield address
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def test_forward_build_wheel(server_address, tmp_path, monkeypatch):
+    monkeypatch.chdir(osp.join(samples_dir, 'pep517'))
+    filename = buildserver.forward_hook(
+        server_address, 'build_wheel', (str(tmp_path), None, None)
+    )
+    assert filename.endswith('.whl'), filename
+    with zipfile.ZipFile(tmp_path / filename) as zf:
+        assert "module1.py" in zf.namelist()
+
+
+def test_forward_relative_paths(server_address, tmp_path, monkeypatch):
+    # Paths are relative to the client's working directory
+    shutil.copytree(osp.join(samples_dir, 'pep517'), tmp_path / 'proj')
+    (tmp_path / 'dist').mkdir()
+    monkeypatch.chdir(tmp_path / 'proj')
+    rel_dist = osp.join('..', 'dist')
+    dirname = buildserver.forward_hook(
+        server_address, 'prepare_metadata_for_build_wheel', (rel_dist, None)
+    )
+    assert_isfile(tmp_path / 'dist' / dirname / 'METADATA')
+
+
+def test_forward_error(server_address, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # No pyproject.toml here
+    with pytest.raises(buildserver.HookError) as exc_info:
+        buildserver.forward_hook(server_address, 'build_sdist', (str(tmp_path), None))
+    assert exc_info.value.exc_type == 'FileNotFoundError'
+    assert 'Traceback' in exc_info.value.server_traceback
+
+
+def test_forward_unknown_hook(server_address):
+    with pytest.raises(buildserver.HookError):
+        buildserver.forward_hook(server_address, 'rm_rf', ())
+
+
+def test_incompatible_server(server_address, monkeypatch):
+    monkeypatch.setattr(buildserver, '_compat_info', lambda: {'flit_core': '0.1'})
+    with pytest.raises(buildserver.ServerUnavailable):
+        buildserver.forward_hook(server_address, 'get_requires_for_build_wheel', (None,))
+
+
+def test_concurrent_requests(server_address, tmp_path):
+    # Separate client processes, like a frontend running several builds
+    code = ("import sys; from flit_core.buildserver import forward_hook; "
+            "print(forward_hook(sys.argv[1], 'build_wheel', (sys.argv[2], None, None)))")
+    env = os.environ.copy()
+    env['PYTHONPATH'] = osp.dirname(osp.dirname(buildserver.__file__))
+    projects = ['pep517', 'pep621', 'pep621_nodynamic', 'ns1-pkg']
+    procs = [subprocess.Popen(
+        [sys.executable, '-c', code, server_address, str(tmp_path)],
+        cwd=osp.join(samples_dir, project), env=env, stdout=subprocess.PIPE,
+    ) for project in projects]
+    filenames = [p.communicate()[0].decode().strip() for p in procs]
+
+    assert [p.returncode for p in procs] == [0] * len(projects)
+    assert len(set(filenames)) == len(projects)
+    for filename in filenames:
+        assert_isfile(tmp_path / filename)
+
+
+def test_buildapi_uses_server(server_address, tmp_path, monkeypatch):
+    monkeypatch.setenv('FLIT_BUILD_SERVER', server_address)
+    monkeypatch.chdir(osp.join(samples_dir, 'pep517'))
+    filename = buildapi.build_sdist(str(tmp_path))
+    assert_isfile(tmp_path / filename)
+
+
+def test_buildapi_fallback(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLIT_BUILD_SERVER', str(tmp_path / 'missing.sock'))
+    monkeypatch.chdir(osp.join(samples_dir, 'pep517'))
+    filename = buildapi.build_wheel(str(tmp_path))
+    assert_isfile(tmp_path / filename)
+
+
+@pytest.fixture
+def bad_server(tmp_path):
+    """A server which reads a request and replies with the given bytes
+
+    With reply=None, it never replies.
+    """
+    address = str(tmp_path / 'bad.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen()
+    conns = []
+
+    def serve(reply):
+        def run():
+            conn, _ = listener.accept()
+            conns.append(conn)
+            conn.makefile('rb').readline()
+            if reply is not None:
+                conn.sendall(reply)
+                conn.close()
+        threading.Thread(target=run, daemon=True).start()
+        return address
+
+    yield serve
+    for conn in conns:
+        conn.close()
+    listener.close()
+
+
+@pytest.mark.parametrize('reply', [b'{"status": "ok", "res\n', b'\xff\n', b'[]\n'])
+def test_invalid_response(bad_server, reply):
+    address = bad_server(reply)
+    with pytest.raises(buildserver.ServerUnavailable):
+        buildserver.forward_hook(address, 'get_requires_for_build_wheel', (None,))
+
+
+def test_response_timeout(bad_server, monkeypatch):
+    monkeypatch.setattr(buildserver, 'RESPONSE_TIMEOUT', 0.2)
+    address = bad_server(None)
+    with pytest.raises(buildserver.ServerUnavailable):
+        buildserver.forward_hook(address, 'get_requires_for_build_wheel', (None,))
+
+
+def test_buildapi_fallback_invalid_response(bad_server, tmp_path, monkeypatch):
+    monkeypatch.setenv('FLIT_BUILD_SERVER', bad_server(b'garbage\n'))
+    monkeypatch.chdir(osp.join(samples_dir, 'pep517'))
+    filename = buildapi.build_wheel(str(tmp_path))
+    assert_isfile(tmp_path / filename)
+
+
+def test_forward_output(server_address, tmp_path, monkeypatch, capfd):
+    # The version isn't a literal, so the module is imported in the server
+    (tmp_path / 'pyproject.toml').write_text(
+        '[build-system]\nrequires = ["flit_core"]\nbuild-backend = "flit_core.buildapi"\n'
+        '[project]\nname = "noisy"\ndynamic = ["version", "description"]\n'
+    )
+    (tmp_path / 'noisy.py').write_text(
+        '"""Prints when imported"""\nprint("Hello from noisy")\n'
+        '__version__ = str(1) + ".0"\n'
+    )
+    monkeypatch.chdir(tmp_path)
+    capfd.readouterr()
+    buildserver.forward_hook(
+        server_address, 'prepare_metadata_for_build_wheel', (str(tmp_path), None)
+    )
+    assert 'Hello from noisy' in capfd.readouterr().out
@@ -2,6 +2,7 @@ import email.parser
 import email.policy
 from io import StringIO
 from pathlib import Path
+import sys
 import pytest
 from unittest import TestCase
 
@@ -9,6 +10,7 @@ from flit_core import config
 from flit_core.common import (
     Module, get_info_from_module, InvalidVersion, NoVersionError, check_version,
     normalize_file_permissions, Metadata, make_metadata,
+    get_docstring_and_version_via_import,
 )
 
 samples_dir = Path(__file__).parent / 'samples'
@@ -238,3 +240,20 @@ def test_metadata_license(value, expected_license, expected_license_expression):
     assert msg.get('License') == expected_license
     assert msg.get('License-Expression') == expected_license_expression
     assert not msg.defects
+
+
+def test_import_leaves_no_modules(tmp_path, monkeypatch):
+    # Modules imported while loading the target are removed afterwards, so
+    # loading again after they change doesn't see the old ones
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'loadme.py').write_text(
+        '"""Doc"""\nfrom loadme_helper import VERSION as __version__\n'
+    )
+    helper = tmp_path / 'loadme_helper.py'
+    helper.write_text('VERSION = "1.0"\n')
+    module = Module('loadme', tmp_path)
+    assert get_docstring_and_version_via_import(module) == ('Doc', '1.0')
+    assert 'loadme_helper' not in sys.modules
+
+    helper.write_text('VERSION = "2.0.dev1"\n')  # A different size
+    assert get_docstring_and_version_via_import(module) == ('Doc', '2.0.dev1')
@@ -0,0 +1,118 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+import zipfile
+
+import pytest
+
+from flit_core import digests
+from flit_core.sdist import SdistBuilder
+from flit_core.wheel import make_wheel_in
+
+samples_dir = Path(__file__).parent / 'samples'
+
+
+def expected(data):
+    return {
+        'size': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'md5': hashlib.md5(data).hexdigest(),
+    }
+
+
+def test_hashing_writer_append_only():
+    buf = io.BytesIO()
+    hw = digests.HashingWriter(buf, seekable=False)
+    hw.write(b'abc')
+    hw.write(memoryview(b'def'))
+    assert hw.tell() == 6
+    with pytest.raises(io.UnsupportedOperation):
+        hw.seek(0)
+    assert hw.digests() == expected(b'abcdef')
+
+
+def test_hashing_writer_zipfile():
+    # zipfile goes back to fill in the header of each member
+    buf = io.BytesIO()
+    hw = digests.HashingWriter(buf)
+    with zipfile.ZipFile(hw, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('a.txt', b'a' * 100_000)
+        with zf.open('b.bin', 'w') as f:
+            for _ in range(10):
+                f.write(os.urandom(10_000))
+    assert hw.digests() == expected(buf.getvalue())
+    # It's a normal zip file, without data descriptors
+    assert not any(zi.flag_bits & 0x08 for zi in zipfile.ZipFile(buf).infolist())
+
+
+def test_hashing_writer_lost():
+    buf = io.BytesIO()
+    hw = digests.HashingWriter(buf)
+    hw.write(b'abc')
+    hw.seek(3)  # Back at the end: everything so far is hashed
+    hw.seek(0)
+    hw.write(b'x')
+    assert hw.digests() is None
+
+    hw = digests.HashingWriter(io.BytesIO(), max_pending=5)
+    hw.write(b'abcdef')
+    assert hw.digests() is None
+
+
+def test_make_wheel_digests(tmp_path):
+    info = make_wheel_in(samples_dir / 'pep621' / 'pyproject.toml', tmp_path)
+    assert info.digests == expected(info.file.read_bytes())
+
+
+def test_make_sdist_digests(tmp_path):
+    builder = SdistBuilder.from_ini_path(samples_dir / 'pep621' / 'pyproject.toml')
+    path = builder.build(tmp_path)
+    assert builder.digests == expected(path.read_bytes())
+
+
+def test_buildapi_no_manifest(tmp_path):
+    # The output folder belongs to the frontend, so only the built files go there
+    from flit_core import buildapi
+    old_cwd = os.getcwd()
+    os.chdir(samples_dir / 'pep621')
+    try:
+        wheel = buildapi.build_wheel(str(tmp_path))
+        sdist = buildapi.build_sdist(str(tmp_path))
+    finally:
+        os.chdir(old_cwd)
+    assert sorted(os.listdir(tmp_path)) == sorted([wheel, sdist])
+
+
+def test_lookup_digests_changed(tmp_path):
+    file = tmp_path / 'foo-1.0.tar.gz'
+    file.write_bytes(b'abc')
+    assert digests.lookup_digests(file) is None
+    digests.record_digests(file, digests.hash_file(file))
+    assert digests.lookup_digests(file) == expected(b'abc')
+
+    file.write_bytes(b'abcd')
+    assert digests.lookup_digests(file) is None
+
+
+def test_record_digests_drops_missing(tmp_path):
+    for name in ('a.whl', 'b.whl'):
+        (tmp_path / name).write_bytes(name.encode())
+        digests.record_digests(tmp_path / name, digests.hash_file(tmp_path / name))
+    (tmp_path / 'a.whl').unlink()
+    (tmp_path / 'c.whl').write_bytes(b'c')
+    digests.record_digests(tmp_path / 'c.whl', digests.hash_file(tmp_path / 'c.whl'))
+
+    manifest = json.loads((tmp_path / digests.MANIFEST_NAME).read_text('utf-8'))
+    assert sorted(manifest['files']) == ['b.whl', 'c.whl']
+    assert sorted(os.listdir(tmp_path)) == [digests.MANIFEST_NAME, 'b.whl', 'c.whl']
+
+
+def test_bad_manifest(tmp_path):
+    file = tmp_path / 'a.whl'
+    file.write_bytes(b'a')
+    (tmp_path / digests.MANIFEST_NAME).write_text('{not json', 'utf-8')
+    assert digests.lookup_digests(file) is None
+    digests.record_digests(file, digests.hash_file(file))
+    assert digests.lookup_digests(file) == expected(b'a')
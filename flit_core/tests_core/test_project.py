@@ -0,0 +1,101 @@
+import os
+from pathlib import Path
+import shutil
+import tarfile
+from zipfile import ZipFile
+
+import pytest
+
+from flit_core import common, project
+from flit_core.project import Project
+
+samples_dir = Path(__file__).parent / 'samples'
+
+
+@pytest.fixture()
+def proj_dir(tmp_path):
+    shutil.copytree(samples_dir / 'pep621', tmp_path / 'proj')
+    return tmp_path / 'proj'
+
+
+@pytest.fixture()
+def load_counts(monkeypatch):
+    counts = {'config': 0, 'metadata': 0}
+
+    def counting(name, func):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(project, 'read_flit_config',
+                        counting('config', project.read_flit_config))
+    monkeypatch.setattr(common, 'make_metadata',
+                        counting('metadata', common.make_metadata))
+    return counts
+
+
+def test_build_repeatedly(proj_dir, tmp_path, load_counts):
+    for d in ['dist', 'editable']:
+        (tmp_path / d).mkdir()
+    proj = Project(proj_dir)
+    assert proj.metadata.version == '0.1'
+    assert proj.prepare_metadata(str(tmp_path)) == 'module1-0.1.dist-info'
+    wheel = proj.build_wheel(tmp_path / 'dist')
+    editable = proj.build_wheel(tmp_path / 'editable', editable=True)
+    sdist = proj.build_sdist(tmp_path / 'dist')
+    assert load_counts == {'config': 1, 'metadata': 1}
+
+    assert wheel.name == editable.name == 'module1-0.1-py3-none-any.whl'
+    with ZipFile(wheel) as zf:
+        assert 'module1a.py' in zf.namelist()
+    with ZipFile(editable) as zf:
+        assert 'module1a.py' not in zf.namelist()
+    with tarfile.open(sdist) as tf:
+        assert 'module1-0.1/module1a.py' in tf.getnames()
+
+
+def test_reload_changed_config(proj_dir, load_counts):
+    proj = Project(proj_dir / 'pyproject.toml')
+    assert proj.metadata.keywords == 'example,test'
+
+    pyproj = proj_dir / 'pyproject.toml'
+    pyproj.write_text(pyproj.read_text('utf-8').replace('"test"', '"other"'), 'utf-8')
+    assert proj.metadata.keywords == 'example,other'
+    assert load_counts == {'config': 2, 'metadata': 2}
+
+
+def test_reload_changed_readme(proj_dir, load_counts):
+    proj = Project(proj_dir)
+    assert 'Sample description' not in proj.metadata.description
+    (proj_dir / 'README.rst').write_text('Sample description\n', 'utf-8')
+    assert proj.metadata.description.strip() == 'Sample description'
+    assert load_counts == {'config': 2, 'metadata': 2}
+
+
+def test_reload_changed_module(proj_dir, load_counts):
+    proj = Project(proj_dir)
+    assert proj.metadata.version == '0.1'
+    mod_file = proj_dir / 'module1a.py'
+    mod_file.write_text(mod_file.read_text('utf-8').replace("'0.1'", "'0.2'"), 'utf-8')
+    assert proj.metadata.version == '0.2'
+    # pyproject.toml hasn't changed, so the config isn't reloaded
+    assert load_counts == {'config': 1, 'metadata': 2}
+
+
+def test_touched_not_changed(proj_dir, load_counts):
+    proj = Project(proj_dir)
+    md = proj.metadata
+    for name in ['pyproject.toml', 'README.rst', 'module1a.py']:
+        st = os.stat(proj_dir / name)
+        os.utime(proj_dir / name, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert proj.metadata is md
+    assert load_counts == {'config': 1, 'metadata': 1}
+
+
+def test_invalidate(proj_dir, load_counts):
+    proj = Project(proj_dir)
+    md = proj.metadata
+    proj.invalidate()
+    assert proj.metadata is not md
+    assert load_counts == {'config': 2, 'metadata': 2}
@@ -0,0 +1,118 @@
+"""Run many builds at once on threads
+
+These are most useful on a free-threaded build of Python (e.g. 3.14t), where
+threads really run in parallel. With the GIL, a short switch interval makes
+threads swap more often, so races are more likely to show up.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from pathlib import Path
+import sys
+import threading
+
+import pytest
+
+from flit_core import common
+from flit_core.project import Project
+from flit_core.wheel import make_wheel_in
+
+samples_dir = Path(__file__).parent / 'samples'
+
+N_THREADS = 8
+SAMPLES = ['pep621', 'constructed_version', 'imported_version', 'with_data_dir']
+
+IMPORT_SOURCE = '''\
+"""Module {i}, which fiddles with logging when it's imported"""
+import logging
+import time
+handler = logging.NullHandler()
+logging.getLogger().addHandler(handler)
+time.sleep(0.001)
+__version__ = "{i}." + "0"
+'''
+
+
+@pytest.fixture(autouse=True)
+def switch_often():
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        yield
+    finally:
+        sys.setswitchinterval(old)
+
+
+def run_together(n, fn):
+    """Call fn(i) for i in range(n), starting them all at the same moment"""
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(run, range(n)))
+
+
+def test_import_concurrently(tmp_path):
+    root_handlers = logging.root.handlers[:]
+    modules = []
+    for i in range(N_THREADS * 4):
+        path = tmp_path / f'mod{i}.py'
+        path.write_text(IMPORT_SOURCE.format(i=i), 'utf-8')
+        modules.append(common.Module(f'mod{i}', tmp_path))
+
+    def load(i):
+        return [common.get_docstring_and_version_via_import(m)
+                for m in modules[i::N_THREADS]]
+
+    results = [r for rs in run_together(N_THREADS, load) for r in rs]
+    versions = sorted(int(v.split('.')[0]) for _, v in results)
+    assert versions == list(range(N_THREADS * 4))
+    # Every handler added while loading a module has been removed again
+    assert logging.root.handlers == root_handlers
+    assert not [m for m in sys.modules if m.startswith('flit_core.dummy.')]
+
+
+def test_build_wheels_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1633007882')
+    expected = {}
+    for name in SAMPLES:
+        (tmp_path / 'serial' / name).mkdir(parents=True)
+        info = make_wheel_in(samples_dir / name / 'pyproject.toml',
+                             tmp_path / 'serial' / name)
+        expected[name] = info.file.read_bytes()
+
+    def build(i):
+        name = SAMPLES[i % len(SAMPLES)]
+        outdir = tmp_path / f'thread{i}'
+        outdir.mkdir()
+        info = make_wheel_in(samples_dir / name / 'pyproject.toml', outdir)
+        return name, info.file.read_bytes()
+
+    for name, whl in run_together(N_THREADS * 2, build):
+        assert whl == expected[name], name
+
+
+def test_shared_project(tmp_path, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1633007882')
+    proj = Project(samples_dir / 'constructed_version')
+
+    def build(i):
+        outdir = tmp_path / f'thread{i}'
+        outdir.mkdir()
+        if i % 3 == 0:
+            path = proj.build_sdist(outdir)
+        else:
+            path = proj.build_wheel(outdir, editable=(i % 3 == 2))
+        return path.name, path.read_bytes()
+
+    results = run_together(N_THREADS * 2, build)
+    assert {name for name, _ in results} == {
+        'module1-1.2.3.tar.gz', 'module1-1.2.3-py2.py3-none-any.whl'
+    }
+    # Builds of the same kind made the same bytes
+    by_kind = {}
+    for i, (name, data) in enumerate(results):
+        by_kind.setdefault(i % 3, set()).add(data)
+    assert all(len(outputs) == 1 for outputs in by_kind.values())
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os.path as osp
+import threading
+
+import pytest
+
+from flit_core import buildapi, tracing
+from .test_buildapi import cwd
+
+samples_dir = osp.join(osp.dirname(__file__), 'samples')
+
+
+def load_trace(trace_dir):
+    files = list(trace_dir.iterdir())
+    assert len(files) == 1
+    with files[0].open(encoding='utf-8') as f:
+        return json.load(f)
+
+
+def spans(trace):
+    return {e['name']: e for e in trace['traceEvents'] if e['ph'] == 'X'}
+
+
+def test_span_disabled():
+    assert not tracing.is_enabled()
+    with tracing.span('nothing', x=1) as sp:
+        sp['bytes'] = 10  # Ignored
+
+
+def test_nested_spans(tmp_path):
+    finish = tracing.enable('test', str(tmp_path))
+    assert tracing.enable('again', str(tmp_path)) is None
+    with tracing.span('outer', a=1):
+        with tracing.span('inner') as sp:
+            data = bytearray(1_000_000)
+            sp['bytes_out'] = len(data)
+        del data
+    with pytest.raises(ValueError):
+        with tracing.span('fails'):
+            raise ValueError
+    path = finish()
+    assert not tracing.is_enabled()
+
+    trace = load_trace(tmp_path)
+    assert osp.samefile(path, next(tmp_path.iterdir()))
+    s = spans(trace)
+    assert set(s) == {'test', 'outer', 'inner', 'fails'}
+    assert s['inner']['args']['bytes_out'] == 1_000_000
+    assert s['inner']['args']['peak_memory'] >= 1_000_000
+    assert s['outer']['args']['peak_memory'] >= s['inner']['args']['peak_memory']
+    assert s['outer']['args']['a'] == 1
+    assert s['fails']['args']['error'] == 'ValueError'
+    # The inner span is within the outer span
+    assert s['outer']['ts'] <= s['inner']['ts']
+    assert s['inner']['ts'] + s['inner']['dur'] <= s['outer']['ts'] + s['outer']['dur']
+
+
+def test_no_memory(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLIT_TRACE_MEMORY', '0')
+    finish = tracing.enable('test', str(tmp_path))
+    with tracing.span('a'):
+        pass
+    finish()
+    assert 'peak_memory' not in spans(load_trace(tmp_path))['a']['args']
+
+
+def test_trace_build_hook(tmp_path, monkeypatch):
+    monkeypatch.delenv('FLIT_TRACE', raising=False)
+    with cwd(osp.join(samples_dir, 'pep517')):
+        buildapi.build_wheel(str(tmp_path), {'trace-dir': str(tmp_path / 'trace')})
+
+    s = spans(load_trace(tmp_path / 'trace'))
+    for name in ['build_wheel', 'read config', 'make metadata', 'compress',
+                 'write RECORD', 'build wheel']:
+        assert name in s
+    assert s['compress']['args']['bytes_in'] > 0
+    assert s['build wheel']['args']['bytes_out'] > 0
+
+
+def test_trace_build_hook_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLIT_TRACE', str(tmp_path / 'trace'))
+    with cwd(osp.join(samples_dir, 'pep517')):
+        buildapi.build_sdist(str(tmp_path))
+
+    s = spans(load_trace(tmp_path / 'trace'))
+    assert s['sdist gzip']['args']['bytes_out'] > 0
+    assert s['find sdist files']['args']['files'] > 0
+
+
+def test_concurrent_hook_traces(tmp_path):
+    # The first hook to finish mustn't stop tracing for the other one
+    both_started = threading.Barrier(2)
+    first_done = threading.Event()
+
+    def hook(name, wait_for=None):
+        with tracing.hook_trace(name, {'trace-dir': str(tmp_path / name)}):
+            both_started.wait(timeout=5)
+            if wait_for is not None:
+                assert wait_for.wait(timeout=5)
+            with tracing.span(f'{name} work'):
+                pass
+            assert tracing.is_enabled()
+
+    with ThreadPoolExecutor(2) as pool:
+        second = pool.submit(hook, 'second', first_done)
+        pool.submit(hook, 'first').result()
+        first_done.set()
+        second.result()
+
+    assert not tracing.is_enabled()
+    for name in ['first', 'second']:
+        assert set(spans(load_trace(tmp_path / name))) == {name, f'{name} work'}
@@ -1,9 +1,16 @@
+import io
+import os
 from pathlib import Path
+import shutil
+import subprocess
+import sys
+import zipfile
 from zipfile import ZipFile
 
+import pytest
 from testpath import assert_isfile
 
-from flit_core.wheel import make_wheel_in, main
+from flit_core.wheel import WheelBuilder, make_wheel_in, make_wheel_to, main
 
 samples_dir = Path(__file__).parent / 'samples'
 
@@ -53,3 +60,102 @@ def test_license_files(tmp_path):
     with ZipFile(info.file, 'r') as zf:
         assert 'module1-0.1.dist-info/licenses/LICENSE' in zf.namelist()
         assert 'module1-0.1.dist-info/licenses/module/vendor/LICENSE_VENDOR' in zf.namelist()
+
+
+class UnseekableWriter(io.RawIOBase):
+    """Like a pipe: can be written to, but not seek or tell"""
+    def __init__(self):
+        self.buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.buf += b
+        return len(b)
+
+
+def test_wheel_to_buffer(tmp_path):
+    buf = io.BytesIO()
+    wb = make_wheel_to(samples_dir / 'pep621' / 'pyproject.toml', buf)
+    assert wb.wheel_filename == 'module1-0.1-py3-none-any.whl'
+
+    info = make_wheel_in(samples_dir / 'pep621' / 'pyproject.toml', tmp_path)
+    with ZipFile(buf) as zf:
+        assert zf.namelist() == ZipFile(info.file).namelist()
+
+
+def test_wheel_to_unseekable():
+    wb = WheelBuilder.from_ini_path(samples_dir / 'with_data_dir' / 'pyproject.toml')
+    assert wb.wheel_filename == 'module1-0.1-py3-none-any.whl'
+    out = UnseekableWriter()
+    wb.build(target_fp=out)
+
+    with ZipFile(io.BytesIO(bytes(out.buf))) as zf:
+        assert zf.testzip() is None
+        assert 'module1-0.1.data/data/share/man/man1/foo.1' in zf.namelist()
+        # Sizes & CRC are written after the data, in data descriptors
+        assert all(zi.flag_bits & 0x08 for zi in zf.infolist())
+        record = zf.read('module1-0.1.dist-info/RECORD').decode()
+    assert 'module1-0.1.data/data/share/man/man1/foo.1,sha256=' in record
+
+
+def test_build_without_target():
+    wb = WheelBuilder.from_ini_path(samples_dir / 'pep621' / 'pyproject.toml')
+    with pytest.raises(ValueError):
+        wb.build()
+
+
+def test_main_stdout():
+    res = subprocess.run(
+        [sys.executable, '-m', 'flit_core.wheel', '--stdout',
+         str(samples_dir / 'pep621')],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+        cwd=str(samples_dir.parent.parent),
+    )
+    assert res.stderr.decode().strip() == 'module1-0.1-py3-none-any.whl'
+    with ZipFile(io.BytesIO(res.stdout)) as zf:
+        assert 'module1a.py' in zf.namelist()
+
+
+BUILD_AND_REPORT_RSS = """\
+import resource, sys
+from pathlib import Path
+from flit_core.wheel import make_wheel_in
+make_wheel_in(Path(sys.argv[1]), Path(sys.argv[2]))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def _build_with_data_file(src, outdir, size):
+    os.truncate(src / 'data' / 'share' / 'big.bin', size)  # Sparse file
+    outdir.mkdir()
+    env = dict(os.environ, SOURCE_DATE_EPOCH='1633007882')
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    out = subprocess.check_output(
+        [sys.executable, '-c', BUILD_AND_REPORT_RSS, str(src / 'pyproject.toml'), str(outdir)],
+        env=env, text=True,
+    )
+    return int(out)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Needs the resource module")
+def test_large_data_file(tmp_path):
+    src = tmp_path / 'src'
+    shutil.copytree(samples_dir / 'with_data_dir', src)
+    (src / 'data' / 'share' / 'big.bin').touch()
+
+    small_rss = _build_with_data_file(src, tmp_path / 'small', 1024)
+    # Bigger than zipfile will write without ZIP64 extensions
+    size = zipfile.ZIP64_LIMIT + 1024 * 1024
+    big_rss = _build_with_data_file(src, tmp_path / 'big', size)
+
+    [whl] = (tmp_path / 'big').glob('*.whl')
+    with ZipFile(whl) as zf:
+        assert zf.getinfo('module1-0.1.data/data/share/big.bin').file_size == size
+        record = zf.read('module1-0.1.dist-info/RECORD').decode()
+    assert 'module1-0.1.data/data/share/big.bin,sha256=' in record
+    assert f',{size}\n' in record.replace('\r\n', '\n')
+
+    # Files are copied in chunks, so memory use is independent of file size.
+    # ru_maxrss is in kB on Linux & bytes on macOS; either way this is small.
+    assert big_rss - small_rss < 50 * 1024 * (1024 if sys.platform == 'darwin' else 1)
@@ -0,0 +1,30 @@
+# Call with the path to an unpacked trove-classifiers wheel or checkout, e.g.:
+#   pip download --no-deps trove-classifiers && unzip trove_classifiers-*.whl -d tc
+#   python prepare_classifier_list.py tc
+
+import os.path
+import sys
+from pathlib import Path
+
+sys.path.insert(0, sys.argv[1])
+import trove_classifiers
+
+try:
+    from importlib.metadata import version
+    tc_version = version('trove-classifiers')
+except Exception:
+    tc_version = 'unknown'
+
+lines = []
+prev = ''
+for classifier in sorted(trove_classifiers.classifiers):
+    # Front coding: length of the prefix shared with the previous line, then
+    # the rest of the classifier.
+    n = len(os.path.commonprefix([prev, classifier]))
+    lines.append(f"{n} {classifier[n:]}")
+    prev = classifier
+
+with Path('flit', 'classifiers.txt').open('w', encoding='utf-8') as f:
+    f.write("# Generated from trove-classifiers; don't edit it manually.\n")
+    f.write(f"# version: {tc_version}\n")
+    f.write("\n".join(lines) + "\n")
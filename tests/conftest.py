@@ -1,9 +1,20 @@
+import base64
+import email.parser
+import email.policy
+import hashlib
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 import pytest
+import re
 from shutil import copytree
+import threading
+import time
 
 samples_dir = Path(__file__).parent / 'samples'
 
+CHUNKED_CONTENT_TYPE = 'application/vnd.pypi.upload.v2+json'
+
 @pytest.fixture
 def copy_sample(tmp_path):
     """Copy a subdirectory from the samples dir to a temp dir"""
@@ -13,3 +24,192 @@ def copy_sample(tmp_path):
         return dst
 
     return copy
+
+
+def parse_form_data(content_type, body):
+    """Parse a multipart/form-data body to a dict of lists of values"""
+    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+    )
+    fields = {}
+    for part in msg.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        fields.setdefault(name, []).append(part.get_payload(decode=True))
+        if part.get_filename():
+            fields.setdefault(name + '.filename', []).append(part.get_filename())
+    return fields
+
+
+class _IndexHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, headers=(), body=b''):
+        self.send_response(status)
+        for k, v in dict(headers).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        index = self.server.index
+        with index.lock:
+            index.active += 1
+            index.max_active = max(index.max_active, index.active)
+            response = index.queued_responses.pop(0) if index.queued_responses else None
+        try:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(index.upload_delay)
+        finally:
+            # Before responding, as the client can start another upload as
+            # soon as it gets the response.
+            with index.lock:
+                index.active -= 1
+        if len(body) < int(self.headers['Content-Length']):
+            return  # The client stopped sending part way
+        if response is not None:
+            self._respond(*response)
+        elif self.headers['Content-Type'] == CHUNKED_CONTENT_TYPE:
+            self._start_chunked_upload(json.loads(body))
+        else:
+            index.add_upload(parse_form_data(self.headers['Content-Type'], body))
+            self._respond(200)
+
+    def _start_chunked_upload(self, request):
+        index = self.server.index
+        if not index.chunked_api:
+            self._respond(400, {'Content-Type': 'text/plain'}, b'Invalid form data')
+            return
+        key = (request['filename'], request['hashes']['sha256'])
+        with index.lock:
+            if key not in index.chunked_uploads:
+                index.chunked_uploads[key] = {'request': request, 'data': bytearray()}
+            upload_id = list(index.chunked_uploads).index(key)
+        self._respond(201, {
+            'Content-Type': CHUNKED_CONTENT_TYPE, 'Location': f'/uploads/{upload_id}',
+        }, b'{}')
+
+    def _chunked_upload(self):
+        m = re.fullmatch(r'/uploads/(\d+)', self.path)
+        uploads = list(self.server.index.chunked_uploads.values())
+        if m is None or int(m.group(1)) >= len(uploads):
+            return None
+        return uploads[int(m.group(1))]
+
+    def do_HEAD(self):
+        upload = self._chunked_upload()
+        if upload is None:
+            self._respond(404)
+        else:
+            self._respond(204, {'Upload-Offset': str(len(upload['data']))})
+
+    def do_PATCH(self):
+        index = self.server.index
+        upload = self._chunked_upload()
+        if upload is None:
+            return self._respond(404)
+        chunk = self.rfile.read(int(self.headers['Content-Length']))
+        index.patch_requests += 1
+
+        if int(self.headers['Upload-Offset']) != len(upload['data']):
+            return self._respond(409)
+        digest = 'sha-256=:{}:'.format(
+            base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+        )
+        if self.headers['Content-Digest'] != digest:
+            return self._respond(400)
+        upload['data'] += chunk
+
+        if index.patch_requests in index.drop_patches:
+            # Simulate the connection failing after the chunk was received
+            self.close_connection = True
+            return
+
+        if self.headers['Upload-Complete'] == '?1':
+            req = upload['request']
+            if hashlib.sha256(upload['data']).hexdigest() != req['hashes']['sha256']:
+                return self._respond(400)
+            fields = {k: [str(x).encode() for x in (v if isinstance(v, list) else [v])]
+                      for k, v in req['metadata'].items()}
+            fields['content'] = [bytes(upload['data'])]
+            fields['content.filename'] = [req['filename']]
+            index.add_upload(fields)
+            return self._respond(201)
+        self._respond(204, {'Upload-Offset': str(len(upload['data']))})
+
+    def do_GET(self):
+        # Simple repository API, in JSON (PEP 691) or HTML (PEP 503)
+        index = self.server.index
+        index.get_requests.append(self.path)
+        m = re.fullmatch(r'/simple/([^/]+)/', self.path)
+        if m is None or m.group(1) not in index.files:
+            self.send_error(404)
+            return
+
+        files = index.files[m.group(1)]
+        if index.json_api and 'json' in self.headers.get('Accept', ''):
+            content_type = 'application/vnd.pypi.simple.v1+json'
+            body = json.dumps({'meta': {'api-version': '1.0'}, 'files': [
+                {'filename': f, 'url': f'/files/{f}', 'hashes': {'sha256': h}}
+                for f, h in files.items()
+            ]}).encode()
+        else:
+            content_type = 'text/html'
+            body = ''.join(
+                f'<a href="/files/{f}#sha256={h}">{f}</a><br/>\n'
+                for f, h in files.items()
+            ).encode()
+        self._respond(200, {'Content-Type': content_type}, body)
+
+
+class IndexServer:
+    """A stand-in package index, running in a thread, which records uploads
+
+    Put (status, headers) pairs in queued_responses to send them in reply to
+    the next requests instead of accepting the uploads. Set upload_delay to
+    make each request take longer. files maps project names to the files
+    listed by the simple API, as {filename: sha256}; uploads are added to it.
+
+    If chunked_api is True, it also accepts chunked uploads (see
+    flit.chunked_upload). PATCH requests are counted from 1; those numbered in
+    drop_patches store the chunk but then close the connection without
+    responding.
+    """
+    def __init__(self):
+        self.uploads = []  # Form fields of each accepted upload
+        self.queued_responses = []
+        self.upload_delay = 0
+        self.files = {}
+        self.json_api = True
+        self.get_requests = []
+        self.chunked_api = False
+        self.chunked_uploads = {}  # (filename, sha256) -> dict
+        self.patch_requests = 0
+        self.drop_patches = set()
+        self.lock = threading.Lock()
+        self.active = self.max_active = 0
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _IndexHandler)
+        self.httpd.index = self
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/legacy/'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def add_upload(self, fields):
+        with self.lock:
+            self.uploads.append(fields)
+            name = fields['name'][0].decode().lower()
+            self.files.setdefault(name, {})[fields['content.filename'][0]] = \
+                fields['sha256_digest'][0].decode()
+
+
+@pytest.fixture
+def index_server():
+    """A local HTTP server standing in for a package index"""
+    server = IndexServer()
+    server.thread.start()
+    try:
+        yield server
+    finally:
+        server.httpd.shutdown()
+        server.httpd.server_close()
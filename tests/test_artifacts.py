@@ -0,0 +1,85 @@
+import hashlib
+import io
+
+import pytest
+from unittest.mock import patch
+
+from flit import artifacts, build, upload
+
+
+def test_read_built_metadata(copy_sample):
+    td = copy_sample('extras')
+    built = build.main(td / 'pyproject.toml', use_vcs=False)
+    expected = built.wheel.builder.metadata
+
+    for path in (built.wheel.file, built.sdist.file):
+        md = artifacts.read_metadata(path)
+        assert md.name == 'module1'
+        assert md.version == expected.version
+        assert md.summary == expected.summary
+        assert md.author_email == 'Sir Robin <robin@camelot.uk>'
+        assert sorted(md.provides_extra) == ['custom', 'test']
+        expected_data = upload.build_post_data('file_upload', expected)
+        del expected_data['provides']  # Not written to METADATA
+        assert upload.build_post_data('file_upload', md) == expected_data
+
+
+def test_parse_metadata():
+    md = artifacts.parse_metadata(io.BytesIO(
+        "Metadata-Version: 2.1\n"
+        "Name: foo\n"
+        "Version: 1.0\n"
+        "Author: Jürgen\n"
+        "Classifier: A :: B\n"
+        "Classifier: C :: D\n"
+        "Project-URL: Home, https://example.com\n"
+        "X-Unknown: ignored\n"
+        "Description-Content-Type: text/markdown\n"
+        "\n"
+        "# Foo\n\nThe foo package.\n".encode('utf-8')
+    ))
+    assert md.name == 'foo'
+    assert md.metadata_version == '2.1'
+    assert md.author == 'Jürgen'
+    assert md.classifiers == ['A :: B', 'C :: D']
+    assert md.project_urls == ['Home, https://example.com']
+    assert md.description == '# Foo\n\nThe foo package.'
+    assert md.description_content_type == 'text/markdown'
+
+
+def test_parse_metadata_missing_version():
+    with pytest.raises(artifacts.InvalidDistribution):
+        artifacts.parse_metadata(io.BytesIO(b"Metadata-Version: 2.1\nName: foo\n"))
+
+
+def test_find_dists(copy_sample, tmp_path):
+    td = copy_sample('module1_toml')
+    build.main(td / 'pyproject.toml', use_vcs=False)
+
+    found = artifacts.find_dists(td / 'dist')
+    assert [p.suffix for p, _ in found] == ['.whl', '.gz']
+    found = artifacts.find_dists(td / 'dist', formats={'sdist'})
+    assert [p.suffix for p, _ in found] == ['.gz']
+
+    (tmp_path / 'empty').mkdir()
+    with pytest.raises(artifacts.InvalidDistribution):
+        artifacts.find_dists(tmp_path / 'empty')
+
+
+def test_upload_dist_dir(copy_sample, index_server):
+    td = copy_sample('module1_toml')
+    build.main(td / 'pyproject.toml', use_vcs=False)
+    (td / 'pyproject.toml').unlink()  # Not needed to upload
+
+    repo = upload.RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo):
+        upload.main_dist_dir(td / 'dist', repo_name=None)
+
+    uploaded = {u['content.filename'][0]: u for u in index_server.uploads}
+    assert sorted(uploaded) == sorted(p.name for p in (td / 'dist').glob('module1-*'))
+    for filename, fields in uploaded.items():
+        assert fields['name'] == [b'module1']
+        content = (td / 'dist' / filename).read_bytes()
+        assert fields['content'] == [content]
+        # The digests recorded when building match the files
+        assert fields['sha256_digest'] == [hashlib.sha256(content).hexdigest().encode()]
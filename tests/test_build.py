@@ -6,6 +6,7 @@ from tempfile import TemporaryDirectory
 from testpath import assert_isdir, MockCommand
 
 from flit_core import common
+from flit_core.digests import MANIFEST_NAME
 from flit import build
 
 samples_dir = Path(__file__).parent / 'samples'
@@ -40,8 +41,9 @@ def test_build_sdist_only(copy_sample):
         res = build.main(td / 'pyproject.toml', formats={'sdist'})
     assert res.wheel is None
 
-    # Compare str path to work around pathlib/pathlib2 mismatch on Py 3.5
-    assert [str(p) for p in (td / 'dist').iterdir()] == [str(res.sdist.file)]
+    assert sorted(p.name for p in (td / 'dist').iterdir()) == [
+        MANIFEST_NAME, res.sdist.file.name
+    ]
 
 def test_build_wheel_only(copy_sample):
     td = copy_sample('module1_toml')
@@ -52,8 +54,9 @@ def test_build_wheel_only(copy_sample):
         res = build.main(td / 'pyproject.toml', formats={'wheel'})
     assert res.sdist is None
 
-    # Compare str path to work around pathlib/pathlib2 mismatch on Py 3.5
-    assert [str(p) for p in (td / 'dist').iterdir()] == [str(res.wheel.file)]
+    assert sorted(p.name for p in (td / 'dist').iterdir()) == [
+        MANIFEST_NAME, res.wheel.file.name
+    ]
 
 def test_build_ns_main(copy_sample):
     td = copy_sample('ns1-pkg')
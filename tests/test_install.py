@@ -1,6 +1,9 @@
 import json
 import os
 import pathlib
+import re
+import shutil
+import subprocess
 import sys
 import tempfile
 from unittest import TestCase, SkipTest, skipIf
@@ -11,7 +14,7 @@ from testpath import (
     assert_isfile, assert_isdir, assert_islink, assert_not_path_exists, MockCommand
 )
 
-from flit import install
+from flit import install, editable_registry
 from flit.install import Installer, _requires_dist_to_pip_requirement, DependencyError
 
 tests_dir = pathlib.Path(__file__).parent
@@ -211,6 +214,144 @@ class InstallTests(TestCase):
         )
         assert_isdir(self.tmpdir / 'site-packages' / 'module1-0.1.dist-info')
 
+    def test_pth_compile_bytecode(self):
+        src_dir = self.tmpdir / 'src'
+        shutil.copytree(samples_dir / 'package1', src_dir)
+        Installer.from_ini_path(
+            src_dir / 'pyproject.toml', pth=True, compile_bytecode=True
+        ).install_directly()
+        pycache = src_dir / 'package1' / '__pycache__'
+        tag = sys.implementation.cache_tag
+        pyc = pycache / f'__init__.{tag}.pyc'
+        assert_isfile(pyc)
+        assert_isfile(src_dir / 'package1' / 'subpkg' / '__pycache__' / f'__init__.{tag}.pyc')
+        # Flags field: bit 0 = hash-based, bit 1 = check_source
+        assert int.from_bytes(pyc.read_bytes()[4:8], 'little') == 0b11
+
+        record = (self.tmpdir / 'site-packages' / 'package1-0.1.dist-info' / 'RECORD').read_text('utf-8')
+        assert '.pyc' not in record
+
+    def test_compile_bytecode_error_logged(self):
+        src_dir = self.tmpdir / 'src'
+        shutil.copytree(samples_dir / 'package1', src_dir)
+        (src_dir / 'package1' / 'broken.py').write_text('def (:\n', 'utf-8')
+        with self.assertLogs('flit.install', level='DEBUG') as logs:
+            Installer.from_ini_path(
+                src_dir / 'pyproject.toml', pth=True, compile_bytecode=True
+            ).install_directly()
+        output = '\n'.join(logs.output)
+        assert 'Could not compile bytecode' in output
+        # The compiler's error (from stderr) is in the debug log
+        assert 'SyntaxError' in output
+        # The other files are still compiled
+        tag = sys.implementation.cache_tag
+        assert_isfile(src_dir / 'package1' / '__pycache__' / f'__init__.{tag}.pyc')
+
+    def test_symlink_compile_bytecode_optimize(self):
+        if os.name == 'nt':
+            raise SkipTest("symlink")
+        src_dir = self.tmpdir / 'src'
+        shutil.copytree(samples_dir / 'package1', src_dir)
+        Installer.from_ini_path(
+            src_dir / 'pyproject.toml', symlink=True, compile_bytecode=True,
+            optimize_levels=(0, 2),
+        ).install_directly()
+        pycache = src_dir / 'package1' / '__pycache__'
+        tag = sys.implementation.cache_tag
+        assert_isfile(pycache / f'foo.{tag}.pyc')
+        assert_isfile(pycache / f'foo.{tag}.opt-2.pyc')
+        assert_not_path_exists(pycache / f'foo.{tag}.opt-1.pyc')
+
+    def _import_from_site_packages(self, mod_name):
+        # -S skips the normal site-packages; addsitedir() processes .pth files
+        code = (
+            "import site, sys; "
+            f"site.addsitedir({str(self.tmpdir / 'site-packages')!r}); "
+            f"import {mod_name} as m; "
+            "print(m.__file__); print(sys.path)"
+        )
+        out = subprocess.check_output([sys.executable, '-S', '-c', code], text=True)
+        mod_file, sys_path = out.splitlines()
+        return pathlib.Path(mod_file), sys_path
+
+    def test_import_hook_package(self):
+        Installer.from_ini_path(
+            samples_dir / 'package1' / 'pyproject.toml', import_hook=True
+        ).install()
+        site_pkgs = self.tmpdir / 'site-packages'
+        assert_isfile(site_pkgs / '__flit_editable__.pth')
+        assert_isfile(site_pkgs / '__flit_editable__.py')
+        assert_not_path_exists(site_pkgs / 'package1')
+        assert_isfile(self.tmpdir / 'scripts' / 'pkg_script')
+        self._assert_direct_url(
+            samples_dir / 'package1', 'package1', '0.1', expected_editable=True
+        )
+
+        mod_file, sys_path = self._import_from_site_packages('package1.subpkg')
+        assert mod_file == samples_dir / 'package1' / 'package1' / 'subpkg' / '__init__.py'
+        assert str(samples_dir / 'package1') not in sys_path
+
+    def test_import_hook_uses_core_finder(self):
+        # The hook is made from flit_core's finder, and can't import flit
+        from flit_core import _editable_finder
+        hook = editable_registry._hook_files()['__flit_editable__.py']
+        finder_src = pathlib.Path(_editable_finder.__file__).read_text('utf-8')
+        assert hook.startswith(finder_src)
+        assert 'class EditableFinder' not in hook[len(finder_src):]
+        assert not re.search(r'^\s*(import|from) flit', hook, flags=re.M)
+
+    def test_import_hook_ns_package_module(self):
+        Installer.from_ini_path(
+            samples_dir / 'ns1-pkg-mod' / 'pyproject.toml', import_hook=True
+        ).install_directly()
+        mod_file, _ = self._import_from_site_packages('ns1.module')
+        assert mod_file == samples_dir / 'ns1-pkg-mod' / 'ns1' / 'module.py'
+
+    def test_import_hook_shared_registry(self):
+        site_pkgs = self.tmpdir / 'site-packages'
+        for sample in ['package1', 'module1_toml']:
+            Installer.from_ini_path(
+                samples_dir / sample / 'pyproject.toml', import_hook=True
+            ).install_directly()
+        assert [p.name for p in site_pkgs.glob('*.pth')] == ['__flit_editable__.pth']
+        registry = editable_registry.read_registry(str(site_pkgs))
+        assert sorted(e[:2] for e in registry) == [
+            ('module1-0.1.dist-info', 'module1'),
+            ('package1-0.1.dist-info', 'package1'),
+        ]
+        mod_file, _ = self._import_from_site_packages('module1')
+        assert mod_file == samples_dir / 'module1_toml' / 'module1.py'
+
+        # Reinstalling another way removes the entry from the registry
+        Installer.from_ini_path(
+            samples_dir / 'package1' / 'pyproject.toml', pth=True
+        ).install_directly()
+        registry = editable_registry.read_registry(str(site_pkgs))
+        assert [e[1] for e in registry] == ['module1']
+
+        # Removing the last project removes the hook & the registry too
+        Installer.from_ini_path(
+            samples_dir / 'module1_toml' / 'pyproject.toml', pth=True
+        ).install_directly()
+        assert not list(site_pkgs.glob('__flit_editable__*'))
+
+    def test_import_hook_uninstalled(self):
+        site_pkgs = self.tmpdir / 'site-packages'
+        Installer.from_ini_path(
+            samples_dir / 'module1_toml' / 'pyproject.toml', import_hook=True
+        ).install_directly()
+        # Uninstalling with another tool leaves the registry entry...
+        shutil.rmtree(site_pkgs / 'module1-0.1.dist-info')
+        with pytest.raises(subprocess.CalledProcessError):
+            self._import_from_site_packages('module1')
+
+        # ...which is cleaned up when another project is registered
+        Installer.from_ini_path(
+            samples_dir / 'package1' / 'pyproject.toml', import_hook=True
+        ).install_directly()
+        registry = editable_registry.read_registry(str(site_pkgs))
+        assert [e[1] for e in registry] == ['package1']
+
     def test_dist_name(self):
         Installer.from_ini_path(samples_dir / 'altdistname' / 'pyproject.toml').install_directly()
         assert_isdir(self.tmpdir / 'site-packages' / 'package1')
@@ -0,0 +1,91 @@
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from flit.sdist_rules import find_rules
+from flit.vcs.git import list_tracked_files, list_untracked_files
+
+
+def included_paths(paths, includes, excludes):
+    """Which paths do these rules put in the sdist? Excludes win over includes"""
+    def matches(path, rules):
+        return any(path == r or (r.endswith('/') and path.startswith(r))
+                   for r in rules)
+
+    return {p for p in paths if matches(p, includes) and not matches(p, excludes)}
+
+
+def test_include_folder_with_excludes():
+    tracked = ['docs/a.rst', 'docs/b.rst', 'docs/c.rst', 'README.rst']
+    untracked = ['docs/_build/', 'docs/notes.txt']
+    includes, excludes = find_rules(tracked, untracked)
+    assert includes == ['docs/', 'README.rst']
+    assert excludes == ['docs/_build/', 'docs/notes.txt']
+
+
+def test_list_files_rather_than_excluding_more():
+    tracked = ['docs/a.rst']
+    untracked = ['docs/x', 'docs/y']
+    assert find_rules(tracked, untracked) == (['docs/a.rst'], [])
+
+
+def test_dont_exclude_folder_with_tracked_files():
+    # Including 'a/' and excluding 'a/b/' would lose a/b/x
+    tracked = ['a/b/x'] + [f'a/f{i}' for i in range(5)]
+    untracked = ['a/b/y1', 'a/b/y2']
+    includes, excludes = find_rules(tracked, untracked)
+    assert included_paths(tracked + untracked, includes, excludes) == set(tracked)
+    assert len(includes) + len(excludes) == 3
+
+
+def test_auto_included():
+    tracked = ['pyproject.toml', 'pkg/__init__.py', 'pkg/mod.py', 'tests/test_a.py']
+    untracked = ['pkg/__pycache__/', 'tests/__pycache__/', 'tests/a.pyc', 'build/']
+    includes, excludes = find_rules(
+        tracked, untracked, auto_inc_files=['pyproject.toml'], auto_inc_dirs=['pkg'],
+    )
+    assert includes == ['tests/']
+    assert excludes == []
+
+
+def test_dont_exclude_folder_with_auto_included():
+    tracked = ['src/a', 'src/b', 'src/c']
+    untracked = ['src/gen/', 'src/x.so']
+    includes, excludes = find_rules(
+        tracked, untracked, auto_inc_files=['src/gen/readme.txt'],
+    )
+    assert includes == ['src/']
+    assert excludes == ['src/x.so']
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason="needs git")
+def test_ignored_file_in_included_folder(tmp_path):
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    (tmp_path / '.gitignore').write_text('*.log\n')
+    (tmp_path / 'docs').mkdir()
+    for name in ('a.rst', 'b.rst', 'c.rst'):
+        (tmp_path / 'docs' / name).write_text('')
+    (tmp_path / 'docs' / 'build.log').write_text('')  # Ignored by git
+    subprocess.run(['git', 'add', '.'], cwd=tmp_path, check=True)
+
+    untracked = list_untracked_files(tmp_path)
+    assert 'docs/build.log' in untracked
+    includes, excludes = find_rules(list_tracked_files(tmp_path), untracked)
+    assert 'docs/' in includes
+    assert excludes == ['docs/build.log']
+
+
+def test_random_trees():
+    rng = random.Random(1)
+    for _ in range(50):
+        tracked, untracked = set(), set()
+        for i in range(rng.randrange(1, 60)):
+            depth = rng.randrange(1, 5)
+            path = '/'.join(rng.choice('abc') for _ in range(depth)) + f'/f{i}'
+            (tracked if rng.random() < 0.7 else untracked).add(path)
+
+        includes, excludes = find_rules(sorted(tracked), sorted(untracked))
+        assert included_paths(tracked | untracked, includes, excludes) == tracked
+        assert len(includes) + len(excludes) <= len(tracked)
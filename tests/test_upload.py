@@ -13,6 +13,8 @@ from flit import upload
 from flit.build import ALL_FORMATS
 from flit.upload import get_repository, RepoDetails
 
+from .conftest import parse_form_data
+
 samples_dir = pathlib.Path(__file__).parent / 'samples'
 
 repo_settings = upload.RepoDetails(
@@ -154,3 +156,550 @@ def test_upload_invalid_pypirc_file(copy_sample):
                 repo_name="test123",
                 pypirc_path="./file.invalid",
             )
+
+
+def test_multipart_encoder(tmp_path):
+    file = tmp_path / 'foo-1.0.tar.gz'
+    content = os.urandom(100_000)
+    file.write_bytes(content)
+    fields = {'name': 'foo', 'classifiers': ['A :: B', 'C :: D']}
+
+    body = upload.MultipartEncoder(fields, 'content', file, chunk_size=4096)
+    expected_len = len(body)
+    chunks = []
+    while True:
+        chunk = body.read(1000)
+        if not chunk:
+            break
+        assert len(chunk) <= 1000
+        chunks.append(chunk)
+    encoded = b''.join(chunks)
+
+    assert len(encoded) == expected_len
+    parsed = parse_form_data(body.content_type, encoded)
+    assert parsed['name'] == [b'foo']
+    assert parsed['classifiers'] == [b'A :: B', b'C :: D']
+    assert parsed['content'] == [content]
+
+
+def test_file_digests(tmp_path):
+    import hashlib
+    file = tmp_path / 'foo-1.0.tar.gz'
+    content = os.urandom(10_000)
+    file.write_bytes(content)
+    assert upload.file_digests(file, chunk_size=1024) == {
+        'md5_digest': hashlib.md5(content).hexdigest(),
+        'sha256_digest': hashlib.sha256(content).hexdigest(),
+    }
+
+
+def test_file_digests_recorded(tmp_path):
+    from flit_core.digests import record_digests
+    file = tmp_path / 'foo-1.0.tar.gz'
+    file.write_bytes(b'abc')
+    record_digests(file, {'size': 3, 'md5': 'x', 'sha256': 'y'})
+    assert upload.file_digests(file) == {'md5_digest': 'x', 'sha256_digest': 'y'}
+
+    # Once the file changes, the recorded digests aren't used
+    file.write_bytes(b'abcd')
+    assert upload.file_digests(file)['sha256_digest'] == (
+        '88d4266fd4e6338d13b845fcf289579d209c897823b9217da3e161936f031589'
+    )
+
+
+@responses.activate
+def test_upload_file_streams(copy_sample):
+    responses.add(responses.POST, upload.PYPI, status=200)
+    td = copy_sample('module1_toml')
+    file = td / 'module1-0.1.tar.gz'
+    file.write_bytes(b'sdist contents')
+    metadata = upload.Metadata({'name': 'module1', 'version': '0.1'})
+
+    upload.upload_file(file, metadata, repo_settings)
+
+    req = responses.calls[0].request
+    # responses reads the streamed body to record it
+    assert req.headers['Content-Length'] == str(len(req.body))
+    parsed = parse_form_data(req.headers['Content-Type'], req.body)
+    assert parsed['content'] == [b'sdist contents']
+    assert parsed['filetype'] == [b'sdist']
+    assert parsed['sha256_digest'] == [
+        upload.file_digests(file)['sha256_digest'].encode()
+    ]
+
+
+@responses.activate
+def test_upload_file_closes_session(copy_sample):
+    responses.add(responses.POST, upload.PYPI, status=200)
+    file = copy_sample('module1_toml') / 'module1-0.1.tar.gz'
+    file.write_bytes(b'sdist contents')
+    metadata = upload.Metadata({'name': 'module1', 'version': '0.1'})
+
+    with patch('requests.Session.close', autospec=True) as close:
+        upload.upload_file(file, metadata, repo_settings)
+    assert close.call_count == 1
+
+
+def _make_dists(tmp_path, n):
+    files = []
+    for i in range(n):
+        file = tmp_path / f'pkg{i}-1.0.tar.gz'
+        file.write_bytes(os.urandom(1000))
+        files.append((file, upload.Metadata({'name': f'pkg{i}', 'version': '1.0'})))
+    return files
+
+
+def test_upload_files_concurrent(index_server, tmp_path):
+    index_server.upload_delay = 0.2
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    files = _make_dists(tmp_path, 6)
+
+    times = upload.upload_files(files, repo, jobs=3)
+
+    assert len(times) == 6
+    assert 1 < index_server.max_active <= 3
+    assert sorted(u['content.filename'][0] for u in index_server.uploads) == \
+           sorted(f.name for f, _ in files)
+
+
+def test_upload_retry_after(index_server, tmp_path):
+    index_server.queued_responses = [
+        (429, {'Retry-After': '0'}), (503, {'Retry-After': '0'}),
+    ]
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)
+
+    upload.upload_file(file, metadata, repo)
+
+    assert len(index_server.uploads) == 1
+    assert index_server.uploads[0]['content'] == [file.read_bytes()]
+
+
+def test_upload_rate_limited_gives_up(index_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, 'MAX_ATTEMPTS', 2)
+    index_server.queued_responses = [(429, {'Retry-After': '0'})] * 2
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)
+
+    with pytest.raises(upload.requests.HTTPError):
+        upload.upload_file(file, metadata, repo)
+    assert index_server.uploads == []
+
+
+def test_upload_files_error(index_server, tmp_path):
+    index_server.queued_responses = [(400, {})]
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+
+    with pytest.raises(upload.requests.HTTPError):
+        upload.upload_files(_make_dists(tmp_path, 3), repo, jobs=1)
+    # The other uploads still go ahead
+    assert len(index_server.uploads) == 2
+
+
+def test_retry_delay():
+    from email.utils import format_datetime
+    from datetime import datetime, timedelta, timezone
+
+    class FakeResponse:
+        def __init__(self, status_code, retry_after=None):
+            self.status_code = status_code
+            self.headers = {} if retry_after is None else {'Retry-After': retry_after}
+
+    assert upload.retry_delay(FakeResponse(200), 1) is None
+    assert upload.retry_delay(FakeResponse(503), 1) is None
+    assert upload.retry_delay(FakeResponse(429), 3) == 8
+    assert upload.retry_delay(FakeResponse(429, '12'), 1) == 12
+    assert upload.retry_delay(FakeResponse(503, '99999'), 1) == upload.MAX_RETRY_DELAY
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < upload.retry_delay(FakeResponse(429, format_datetime(later, usegmt=True)), 1) <= 30
+
+
+def test_upload_main_index_server(copy_sample, index_server):
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo):
+        upload.main(td / 'pyproject.toml', repo_name=None)
+
+    assert sorted(u['filetype'][0] for u in index_server.uploads) == \
+           [b'bdist_wheel', b'sdist']
+
+
+def wait_until(condition, timeout=10):
+    import time
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for condition"
+        time.sleep(0.01)
+
+
+def test_upload_main_pipelined(copy_sample, index_server):
+    from flit import build
+    real_make_wheel_in = build.make_wheel_in
+
+    def make_wheel_in(*args, **kwargs):
+        # The sdist is uploaded before the wheel is built
+        wait_until(lambda: len(index_server.uploads) == 1)
+        return real_make_wheel_in(*args, **kwargs)
+
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo), \
+            patch('flit.build.make_wheel_in', make_wheel_in):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False,
+                    pipeline=True)
+
+    assert [u['filetype'][0] for u in index_server.uploads] == [b'sdist', b'bdist_wheel']
+
+
+def test_upload_main_build_fails(copy_sample, index_server):
+    import time
+    # The sdist upload is waiting to retry when the wheel fails to build
+    index_server.queued_responses = [(429, {'Retry-After': '60'})]
+
+    def make_wheel_in(*args, **kwargs):
+        wait_until(lambda: not index_server.queued_responses)
+        raise RuntimeError("Build failed")
+
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    start = time.monotonic()
+    with patch('flit.upload.get_repository', return_value=repo), \
+            patch('flit.build.make_wheel_in', make_wheel_in), \
+            pytest.raises(RuntimeError):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False,
+                    pipeline=True)
+
+    assert time.monotonic() - start < 30
+    assert index_server.uploads == []
+
+
+def test_upload_main_build_fails_after_upload(copy_sample, index_server, caplog):
+    def make_wheel_in(*args, **kwargs):
+        wait_until(lambda: len(index_server.uploads) == 1)
+        raise RuntimeError("Build failed")
+
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo), \
+            patch('flit.build.make_wheel_in', make_wheel_in), \
+            pytest.raises(RuntimeError):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False,
+                    pipeline=True)
+
+    # The sdist can't be taken back, so the user is told about it
+    assert [u['filetype'][0] for u in index_server.uploads] == [b'sdist']
+    assert "uploaded before the failure" in caplog.text
+    assert "module1-0.1.tar.gz" in caplog.text
+
+
+def test_upload_main_builds_first(copy_sample, index_server):
+    # By default, nothing is uploaded unless all the builds succeed
+    def make_wheel_in(*args, **kwargs):
+        raise RuntimeError("Build failed")
+
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo), \
+            patch('flit.build.make_wheel_in', make_wheel_in), \
+            pytest.raises(RuntimeError):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False)
+    assert index_server.uploads == []
+
+    with patch('flit.upload.get_repository', return_value=repo):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False)
+    assert sorted(u['filetype'][0] for u in index_server.uploads) == \
+           [b'bdist_wheel', b'sdist']
+
+
+def test_upload_main_upload_fails(copy_sample, index_server):
+    import threading
+    import time
+    index_server.queued_responses = [(400, {})]
+    sdist_done = threading.Event()
+    real_do_upload = upload.do_upload
+
+    def do_upload(*args, **kwargs):
+        try:
+            return real_do_upload(*args, **kwargs)
+        finally:
+            sdist_done.set()
+
+    def make_wheel_in(ini_path, dist_dir):
+        sdist_done.wait(10)
+        time.sleep(0.1)  # For the future to be marked as done
+        return real_make_wheel_in(ini_path, dist_dir)
+
+    from flit import build
+    real_make_wheel_in = build.make_wheel_in
+    td = copy_sample('module1_toml')
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    with patch('flit.upload.get_repository', return_value=repo), \
+            patch('flit.upload.do_upload', do_upload), \
+            patch('flit.build.make_wheel_in', make_wheel_in), \
+            pytest.raises(upload.requests.HTTPError):
+        upload.main(td / 'pyproject.toml', repo_name=None, use_vcs=False,
+                    pipeline=True)
+
+    # The wheel isn't uploaded after the sdist failed
+    assert index_server.uploads == []
+
+
+def test_multipart_encoder_cancel(tmp_path):
+    import threading
+    file = tmp_path / 'foo-1.0.tar.gz'
+    file.write_bytes(os.urandom(10_000))
+    cancel = threading.Event()
+    enc = upload.MultipartEncoder({'name': 'foo'}, 'content', file,
+                                  chunk_size=1024, cancel=cancel)
+    enc.read(2048)
+    cancel.set()
+    with pytest.raises(upload.UploadCancelled):
+        enc.read()
+
+
+def test_simple_index_url():
+    from flit.simple_api import simple_index_url
+    assert simple_index_url(upload.PYPI) == 'https://pypi.org/simple/'
+    assert simple_index_url('https://test.pypi.org/legacy/') == \
+           'https://test.pypi.org/simple/'
+    assert simple_index_url('http://127.0.0.1:8000/legacy') == \
+           'http://127.0.0.1:8000/simple/'
+    assert simple_index_url('https://example.com/upload/') is None
+
+
+@pytest.mark.parametrize('json_api', [True, False])
+def test_upload_skip_existing(index_server, tmp_path, json_api):
+    index_server.json_api = json_api
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    files = _make_dists(tmp_path, 2)
+    upload.upload_files(files[:1], repo)
+    assert len(index_server.uploads) == 1
+
+    times = upload.upload_files(files, repo, skip_existing=True)
+
+    assert times[0] is None
+    assert times[1] is not None
+    assert [u['content.filename'][0] for u in index_server.uploads] == \
+           [files[0][0].name, files[1][0].name]
+    assert index_server.get_requests == ['/simple/pkg0/', '/simple/pkg1/']
+
+
+def test_upload_skip_existing_mismatch(index_server, tmp_path):
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    files = _make_dists(tmp_path, 2)
+    index_server.files['pkg1'] = {files[1][0].name: '0' * 64}
+
+    with pytest.raises(upload.ExistingFileMismatch):
+        upload.upload_files(files, repo, skip_existing=True)
+    assert index_server.uploads == []  # Failed before uploading anything
+
+
+def test_upload_chunked(index_server, tmp_path):
+    index_server.chunked_api = True
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)  # 1000 bytes
+
+    upload.upload_file(file, metadata, repo, chunk_size=300)
+
+    assert index_server.patch_requests == 4
+    [fields] = index_server.uploads
+    assert fields['content'] == [file.read_bytes()]
+    assert fields['name'] == [b'pkg0']
+    assert fields['filetype'] == [b'sdist']
+
+
+def test_upload_chunked_resume(index_server, tmp_path):
+    index_server.chunked_api = True
+    index_server.drop_patches = {2}
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)
+
+    upload.upload_file(file, metadata, repo, chunk_size=300)
+
+    # The second chunk was received, so only the remaining two are sent again
+    assert index_server.patch_requests == 4
+    [fields] = index_server.uploads
+    assert fields['content'] == [file.read_bytes()]
+
+
+def test_upload_chunked_resume_later(index_server, tmp_path):
+    # An interrupted upload carries on when flit is run again
+    index_server.chunked_api = True
+    index_server.drop_patches = {2, 3, 4, 5, 6}
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)
+
+    with pytest.raises(upload.requests.ConnectionError):
+        upload.upload_file(file, metadata, repo, chunk_size=300)
+    assert index_server.uploads == []
+
+    index_server.drop_patches = set()
+    upload.upload_file(file, metadata, repo, chunk_size=300)
+    [fields] = index_server.uploads
+    assert fields['content'] == [file.read_bytes()]
+
+
+def test_upload_chunked_fallback(index_server, tmp_path):
+    # This index only supports the legacy upload API
+    repo = RepoDetails(url=index_server.url, username='user', password='pw')
+    [(file, metadata)] = _make_dists(tmp_path, 1)
+
+    upload.upload_file(file, metadata, repo, chunk_size=300)
+
+    assert index_server.patch_requests == 0
+    [fields] = index_server.uploads
+    assert fields['content'] == [file.read_bytes()]
+
+
+def test_uploaded_offset_retries():
+    from types import SimpleNamespace
+    from unittest.mock import Mock
+    from flit.chunked_upload import uploaded_offset
+    repo = RepoDetails(url='https://example.com/legacy/', username='user', password='pw')
+    ok = SimpleNamespace(status_code=204, headers={'Upload-Offset': '300'},
+                         raise_for_status=lambda: None)
+    session = Mock()
+    session.head.side_effect = [upload.requests.ConnectionError("dropped"), ok]
+    assert uploaded_offset(session, repo, 'https://example.com/uploads/0') == 300
+    assert session.head.call_count == 2
+
+    session.head.side_effect = upload.requests.ConnectionError("dropped")
+    with pytest.raises(upload.requests.ConnectionError):
+        uploaded_offset(session, repo, 'https://example.com/uploads/0')
+
+
+@pytest.mark.parametrize(('args', 'pipeline'), [([], False), (['--pipeline'], True)])
+def test_publish_pipeline_option(args, pipeline, copy_sample, monkeypatch):
+    from flit import main
+    monkeypatch.chdir(copy_sample('module1_toml'))
+    with patch('flit.upload.main') as upload_main:
+        main(['publish'] + args)
+    assert upload_main.call_args.kwargs['pipeline'] is pipeline
+
+
+@pytest.mark.parametrize('option', ['--chunk-size', '--jobs'])
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_publish_option_must_be_positive(option, value, capsys):
+    from flit import main
+    with pytest.raises(SystemExit) as exc_info:
+        main(['publish', option, value])
+    assert exc_info.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
+
+
+@contextmanager
+def _fake_keyring_backend(passwords, delay=0):
+    """Fake keyring module recording lookups, & a backend to load explicitly"""
+    import time
+    from types import SimpleNamespace
+    calls = []
+
+    def get_password(service_name, username):
+        calls.append((service_name, username))
+        time.sleep(delay)
+        return passwords.get(username)
+
+    keyring_mod = SimpleNamespace(get_password=get_password)
+    explicit = SimpleNamespace(get_password=get_password, name='explicit')
+
+    def load_keyring(name):
+        calls.append(('load', name))
+        return explicit
+
+    class KeyringError(Exception):
+        pass
+
+    with patch.dict('sys.modules', {
+        'keyring': keyring_mod,
+        'keyring.errors': SimpleNamespace(KeyringError=KeyringError),
+        'keyring.core': SimpleNamespace(load_keyring=load_keyring),
+    }):
+        yield calls
+
+
+def test_keyring_lookup_cached(monkeypatch):
+    monkeypatch.delenv('FLIT_KEYRING_BACKEND', raising=False)
+    credentials = upload.KeyringLookup()
+    with _fake_keyring_backend({'pypi_token:user:fred': 'xyz'}) as calls:
+        for _ in range(3):
+            repo = RepoDetails(upload.PYPI, username='fred')
+            upload.resolve_password(repo, 'foo', credentials)
+            assert repo == RepoDetails(upload.PYPI, username='__token__', password='xyz')
+
+    assert sorted(calls) == [
+        (upload.PYPI, 'pypi_token:project:foo'), (upload.PYPI, 'pypi_token:user:fred'),
+    ]
+
+
+def test_keyring_timeout(monkeypatch):
+    monkeypatch.setenv('FLIT_KEYRING_TIMEOUT', '0.1')
+    monkeypatch.delenv('FLIT_KEYRING_BACKEND', raising=False)
+    credentials = upload.KeyringLookup()
+    assert credentials.timeout == 0.1
+    repo = RepoDetails(upload.PYPI, username='fred')
+    with _fake_keyring_backend({'pypi_token:user:fred': 'xyz'}, delay=2):
+        import time
+        start = time.perf_counter()
+        assert upload.find_token(repo, 'foo', credentials) is None
+        # After one timeout, it doesn't wait for keyring again
+        assert credentials.get_password(upload.PYPI, 'fred') is None
+        assert time.perf_counter() - start < 1
+
+
+def test_keyring_backend_env(monkeypatch):
+    monkeypatch.setenv('FLIT_KEYRING_BACKEND', 'some.backend.Keyring')
+    repo = RepoDetails(upload.PYPI, username='fred')
+    with _fake_keyring_backend({'fred': 's3cret'}) as calls:
+        upload.resolve_password(repo, 'foo')
+    assert repo.password == 's3cret'
+    assert calls[0] == ('load', 'some.backend.Keyring')
+
+    monkeypatch.setenv('FLIT_KEYRING_BACKEND', 'none')
+    repo = RepoDetails(upload.PYPI, username='fred')
+    with _fake_keyring_backend({'fred': 's3cret'}) as calls, \
+            patch('sys.stdin.isatty', return_value=False):
+        with pytest.raises(Exception, match="Could not find password"):
+            upload.resolve_password(repo, 'foo')
+    assert calls == []
+
+
+def test_keyring_backend_invalid(monkeypatch, caplog):
+    from types import SimpleNamespace
+    monkeypatch.setenv('FLIT_KEYRING_BACKEND', 'no.such.Keyring')
+    repo = RepoDetails(upload.PYPI, username='fred')
+
+    def load_keyring(name):
+        raise ImportError(f"No module named {name!r}")
+
+    with _fake_keyring_backend({'fred': 's3cret'}), \
+            patch.dict('sys.modules', {
+                'keyring.core': SimpleNamespace(load_keyring=load_keyring)
+            }), \
+            patch('sys.stdin.isatty', return_value=False):
+        with pytest.raises(Exception, match="Could not find password"):
+            upload.resolve_password(repo, 'foo')
+    assert "FLIT_KEYRING_BACKEND='no.such.Keyring'" in caplog.text
+    assert "Install keyring" not in caplog.text
+
+
+def test_no_keyring_installed(monkeypatch, caplog):
+    monkeypatch.delenv('FLIT_KEYRING_BACKEND', raising=False)
+    repo = RepoDetails(upload.PYPI, username='fred')
+    with patch.dict('sys.modules', {'keyring': None}), \
+            patch('sys.stdin.isatty', return_value=False):
+        with pytest.raises(Exception, match="Could not find password"):
+            upload.resolve_password(repo, 'foo')
+    assert "Install keyring" in caplog.text
+
+
+def test_get_repository_prefetch(monkeypatch):
+    monkeypatch.delenv('FLIT_PASSWORD', raising=False)
+    monkeypatch.delenv('FLIT_KEYRING_BACKEND', raising=False)
+    credentials = upload.KeyringLookup()
+    with _fake_keyring_backend({'fred': 'tops3cret'}) as calls:
+        repo = get_repository(pypirc_path=io.StringIO(pypirc2), project_name='foo',
+                              credentials=credentials, wait_for_password=False)
+        assert repo.password is None
+        upload.resolve_password(repo, 'foo', credentials)
+    assert repo.password == 'tops3cret'
+    assert len(calls) == 3  # Each key looked up once
@@ -241,3 +241,171 @@ def test_validate_readme_rst_code():
         print(p)
 
     assert problems == []
+
+
+def test_read_bundled_classifiers():
+    classifiers = fv._read_bundled_classifiers()
+    assert 'Programming Language :: Python :: 3' in classifiers
+    assert 'Development Status :: 5 - Production/Stable' in classifiers
+    assert len(classifiers) > 500
+
+
+@pytest.fixture
+def classifiers_server(monkeypatch, tmp_path):
+    """Stand-in for PyPI's list of classifiers, with ETag support"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            server.requests.append(dict(self.headers))
+            if server.status != 200:
+                self.send_response(server.status)
+                self.end_headers()
+                return
+            if self.headers.get('If-None-Match') == server.etag:
+                self.send_response(304)
+                self.send_header('ETag', server.etag)
+                self.end_headers()
+                return
+            body = '\n'.join(server.classifiers).encode()
+            self.send_response(200)
+            self.send_header('ETag', server.etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    server.status = 200
+    server.etag = '"v1"'
+    server.classifiers = ['Framework :: Flit :: 1']
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(fv, 'CLASSIFIERS_URL', f'http://127.0.0.1:{server.server_port}/')
+    monkeypatch.setattr(fv, 'get_cache_dir', lambda: tmp_path / 'cache')
+    monkeypatch.delenv('FLIT_NO_NETWORK', raising=False)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_validate_classifiers_bundled_offline(classifiers_server):
+    assert fv.validate_classifiers({'Programming Language :: Python :: 3'}) == []
+    assert classifiers_server.requests == []
+
+
+def test_validate_classifiers_refresh(classifiers_server, monkeypatch):
+    # Not in the bundled list, so fetch the list
+    assert fv.validate_classifiers({'Framework :: Flit :: 1'}) == []
+    assert len(classifiers_server.requests) == 1
+
+    # The cached list is fresh, so unknown classifiers don't trigger a fetch
+    assert len(fv.validate_classifiers({'Framework :: Flit :: 2'})) == 1
+    assert len(classifiers_server.requests) == 1
+
+    # When it's stale, check for updates with a conditional request
+    monkeypatch.setattr(fv, 'CLASSIFIERS_TTL', 0)
+    assert len(fv.validate_classifiers({'Framework :: Flit :: 2'})) == 1
+    assert len(classifiers_server.requests) == 2
+    assert classifiers_server.requests[1]['If-None-Match'] == '"v1"'
+    assert fv.validate_classifiers({'Framework :: Flit :: 1'}) == []
+
+    # The list changed on the server
+    classifiers_server.etag = '"v2"'
+    classifiers_server.classifiers.append('Framework :: Flit :: 2')
+    assert fv.validate_classifiers({'Framework :: Flit :: 2'}) == []
+    assert fv._read_cache_validators()['etag'] == '"v2"'
+
+
+def test_validate_classifiers_server_error(classifiers_server):
+    classifiers_server.status = 500
+    assert fv.validate_classifiers({'Framework :: Flit :: 1'}) == \
+           ["Unrecognised classifier: 'Framework :: Flit :: 1'"]
+
+
+def test_validate_config_cache(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+    monkeypatch.setattr(fv, 'get_cache_dir', lambda: tmp_path / 'cache')
+    calls = []
+
+    def counting(name):
+        check = getattr(fv, name)
+        def wrapper(inputs):
+            calls.append(name)  # Checks may run concurrently
+            return check(inputs)
+        monkeypatch.setattr(fv, name, wrapper)
+
+    counting('validate_readme_rst')
+    counting('validate_name')
+
+    cfg = SimpleNamespace(entrypoints={}, metadata={
+        'name': 'foo bar',
+        'description': 'Foo\n===\n\n`broken',
+        'description_content_type': 'text/x-rst',
+    })
+    problems = fv.validate_config(cfg)
+    assert problems[0] == "Invalid name: 'foo bar'"
+    assert len(problems) == 3  # Name + 2 for the README
+    assert sorted(calls) == ['validate_name', 'validate_readme_rst']
+    assert (tmp_path / 'cache' / 'validation.json').is_file()
+
+    # Same inputs: results come from the cache
+    assert fv.validate_config(cfg) == problems
+    assert len(calls) == 2
+
+    # Changing the README only reruns the README check
+    cfg.metadata['description'] = 'Foo\n===\n\nFixed'
+    assert fv.validate_config(cfg) == ["Invalid name: 'foo bar'"]
+    assert calls[2:] == ['validate_readme_rst']
+
+
+def test_validate_config_cache_size(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+    monkeypatch.setattr(fv, 'get_cache_dir', lambda: tmp_path / 'cache')
+    monkeypatch.setattr(fv, 'RESULTS_CACHE_SIZE', 10)
+
+    for i in range(5):
+        fv.validate_config(SimpleNamespace(entrypoints={}, metadata={
+            'name': f'foo{i}', 'description': f'Foo {i}',
+        }))
+    assert len(fv._read_results_cache()) == 10
+
+
+def test_validate_config_concurrent(monkeypatch, tmp_path, caplog):
+    import threading
+    import time
+    from types import SimpleNamespace
+    monkeypatch.setattr(fv, 'get_cache_dir', lambda: tmp_path / 'cache')
+    running = set()
+    overlapped = threading.Event()
+
+    def slow_classifiers(classifiers):
+        running.add('classifiers')
+        if 'readme' in running:
+            overlapped.set()
+        time.sleep(0.2)
+        return ['classifier problem']
+
+    def readme(metadata):
+        running.add('readme')
+        if 'classifiers' in running:
+            overlapped.set()
+        return ['readme problem']
+
+    monkeypatch.setattr(fv, 'validate_classifiers', slow_classifiers)
+    monkeypatch.setattr(fv, 'validate_readme_rst', readme)
+    caplog.set_level('DEBUG', logger='flit.validate')
+
+    cfg = SimpleNamespace(entrypoints={}, metadata={'name': 'foo bar'})
+    assert fv.validate_config(cfg) == [
+        'classifier problem', "Invalid name: 'foo bar'", 'readme problem'
+    ]
+    assert overlapped.is_set()
+    assert 'classifiers check took' in caplog.text
+    assert 'readme check took' in caplog.text
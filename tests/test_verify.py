@@ -0,0 +1,148 @@
+from base64 import urlsafe_b64encode
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import zipfile
+
+import pytest
+
+from flit import verify
+from flit.build import main as build_main
+
+core_samples_dir = Path(__file__).parent.parent / 'flit_core' / 'tests_core' / 'samples'
+
+
+@pytest.fixture()
+def dist_dir(tmp_path):
+    shutil.copytree(core_samples_dir / 'with_data_dir', tmp_path / 'proj')
+    build_main(tmp_path / 'proj' / 'pyproject.toml', use_vcs=False)
+    return tmp_path / 'proj' / 'dist'
+
+
+def _record_hash(data):
+    digest = urlsafe_b64encode(hashlib.sha256(data).digest()).decode('ascii').rstrip('=')
+    return f'sha256={digest}'
+
+
+def rewrite_wheel(path, changes, fix_record=True):
+    """Replace (or add) members of a wheel, optionally updating RECORD"""
+    with zipfile.ZipFile(path) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    members.update(changes)
+    record_name = next(n for n in members if n.endswith('.dist-info/RECORD'))
+    if fix_record:
+        lines = [f'{name},{_record_hash(data)},{len(data)}'
+                 for name, data in members.items() if name != record_name]
+        lines.append(f'{record_name},,')
+        members[record_name] = ('\n'.join(lines) + '\n').encode()
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def dists(dist_dir):
+    return sorted(dist_dir.glob('*.whl')) + sorted(dist_dir.glob('*.tar.gz'))
+
+
+def problems(dist_dir):
+    return {r.path.name: r.problems for r in verify.verify_dists(dists(dist_dir), jobs=2)}
+
+
+def test_valid(dist_dir):
+    res = problems(dist_dir)
+    assert res == {
+        'module1-0.1-py3-none-any.whl': [],
+        'module1-0.1.tar.gz': [],
+    }
+    assert verify.main(dist_dir) is True
+
+
+def test_hash_mismatch(dist_dir):
+    whl = dist_dir / 'module1-0.1-py3-none-any.whl'
+    rewrite_wheel(whl, {'module1.py': b'"""Changed"""\n__version__ = "0.1"\n'},
+                  fix_record=False)
+    msgs = problems(dist_dir)[whl.name]
+    assert msgs[0] == "module1.py does not match its hash in RECORD"
+    assert msgs[1].startswith("module1.py is 34 bytes, but RECORD says")
+    assert verify.main(dist_dir) is False
+
+
+def test_not_in_record(dist_dir):
+    whl = dist_dir / 'module1-0.1-py3-none-any.whl'
+    rewrite_wheel(whl, {'extra.py': b''}, fix_record=False)
+    assert problems(dist_dir)[whl.name] == [
+        "extra.py is not listed in RECORD",
+        "Files not in module1-0.1.tar.gz: extra.py",
+    ]
+
+
+def test_not_in_sdist(dist_dir):
+    whl = dist_dir / 'module1-0.1-py3-none-any.whl'
+    rewrite_wheel(whl, {'extra.py': b'', 'module1-0.1.data/data/new.txt': b''})
+    assert problems(dist_dir)[whl.name] == [
+        "Files not in module1-0.1.tar.gz: extra.py, module1-0.1.data/data/new.txt"
+    ]
+
+
+def test_metadata_mismatch(dist_dir):
+    whl = dist_dir / 'module1-0.1-py3-none-any.whl'
+    with zipfile.ZipFile(whl) as zf:
+        md = zf.read('module1-0.1.dist-info/METADATA')
+    md = md.replace(b'Requires-Dist: docutils\n', b'')
+    rewrite_wheel(whl, {'module1-0.1.dist-info/METADATA': md})
+    [msg] = problems(dist_dir)[whl.name]
+    assert msg == ("METADATA differs from PKG-INFO in module1-0.1.tar.gz: "
+                   "Requires-Dist")
+
+
+def test_metadata_not_utf8(dist_dir):
+    whl = dist_dir / 'module1-0.1-py3-none-any.whl'
+    with zipfile.ZipFile(whl) as zf:
+        md = zf.read('module1-0.1.dist-info/METADATA')
+    rewrite_wheel(whl, {'module1-0.1.dist-info/METADATA': md + b'\xff\n'})
+    [msg] = problems(dist_dir)[whl.name]
+    assert msg.startswith("METADATA is not valid UTF-8")
+    assert verify.main(dist_dir) is False
+
+
+def test_corrupt_sdist(dist_dir):
+    sdist = dist_dir / 'module1-0.1.tar.gz'
+    data = sdist.read_bytes()
+    sdist.write_bytes(data[:len(data) // 2])
+    res = problems(dist_dir)
+    assert res[sdist.name][0].startswith("Could not read sdist")
+    assert res['module1-0.1-py3-none-any.whl'] == []
+
+
+def test_digests(dist_dir):
+    reports = {r.path.name: r for r in verify.verify_dists(dists(dist_dir))}
+    for name, r in reports.items():
+        data = (dist_dir / name).read_bytes()
+        assert r.digests['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+def test_sdist_differs_from_recorded(dist_dir):
+    sdist = dist_dir / 'module1-0.1.tar.gz'
+    st = sdist.stat()
+    with sdist.open('r+b') as f:
+        f.seek(st.st_size - 1)
+        f.write(b'\xff')  # Only changes the uncompressed size in the gzip trailer
+    os.utime(sdist, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert problems(dist_dir)[sdist.name] == [
+        "sha256 digest differs from the one recorded when it was built"
+    ]
+
+
+def test_no_dists(tmp_path):
+    with pytest.raises(verify.InvalidDistribution):
+        verify.main(tmp_path)
+
+
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_jobs_must_be_positive(value, capsys):
+    from flit import main
+    with pytest.raises(SystemExit) as exc_info:
+        main(['verify', '-j', value])
+    assert exc_info.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
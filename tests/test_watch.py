@@ -0,0 +1,166 @@
+import csv
+import os
+from pathlib import Path
+import shutil
+import sys
+import threading
+import time
+from unittest.mock import patch
+from zipfile import ZipFile
+
+import pytest
+
+from flit import watch
+from flit.install import Installer
+
+core_samples_dir = Path(__file__).parent.parent / 'flit_core' / 'tests_core' / 'samples'
+
+watcher_classes = [watch.PollingWatcher]
+if sys.platform.startswith('linux'):
+    watcher_classes.append(watch.InotifyWatcher)
+
+
+@pytest.fixture()
+def project(tmp_path):
+    shutil.copytree(core_samples_dir / 'with_data_dir', tmp_path / 'proj')
+    return tmp_path / 'proj'
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.02)
+
+
+def collect(watcher, n_waits=5):
+    changed = set()
+    for _ in range(n_waits):
+        changed |= watcher.wait(0.1)
+    return changed
+
+
+@pytest.mark.parametrize('watcher_cls', watcher_classes)
+def test_watcher(project, watcher_cls):
+    data_dir = project / 'data'
+    roots = [project / 'pyproject.toml', project / 'module1.py', data_dir]
+    watcher = watcher_cls(roots)
+    try:
+        assert watcher.wait(0.05) == set()
+
+        (project / 'module1.py').write_text('"""Changed"""\n__version__ = "1"\n')
+        (project / 'LICENSE').write_text('Not watched\n')
+        assert collect(watcher) == {str(project / 'module1.py')}
+
+        new_file = data_dir / 'share' / 'new' / 'thing.txt'
+        new_file.parent.mkdir()
+        new_file.write_text('New\n')
+        (data_dir / 'share' / 'man' / 'man1' / 'foo.1').unlink()
+        (data_dir / '__pycache__').mkdir()
+        (data_dir / '__pycache__' / 'x.pyc').write_bytes(b'')
+        changed = collect(watcher)
+        assert str(new_file) in changed
+        assert str(data_dir / 'share' / 'man' / 'man1' / 'foo.1') in changed
+        assert not any('__pycache__' in p for p in changed)
+    finally:
+        watcher.close()
+
+
+def test_wait_for_changes(project):
+    watcher = watch.PollingWatcher([project / 'module1.py', project / 'README.rst'])
+    stop = threading.Event()
+    stop.set()
+    assert watch.wait_for_changes(watcher, stop) is None
+
+    (project / 'module1.py').write_text('"""Changed"""\n__version__ = "1"\n')
+    (project / 'README.rst').write_text('Changed\n')
+    changed = watch.wait_for_changes(watcher, debounce=0.3)
+    assert changed == {str(project / 'module1.py'), str(project / 'README.rst')}
+
+
+@pytest.fixture()
+def stop_after():
+    stop = threading.Event()
+    threads = []
+
+    def start(fn, *args, **kwargs):
+        t = threading.Thread(target=fn, args=args, kwargs=dict(kwargs, stop=stop))
+        t.start()
+        threads.append(t)
+
+    yield start
+    stop.set()
+    for t in threads:
+        t.join(10)
+
+
+def test_watch_build(project, stop_after):
+    wheel = project / 'dist' / 'module1-0.1-py3-none-any.whl'
+    stop_after(watch.watch_build, project / 'pyproject.toml', formats={'wheel'})
+    wait_until(wheel.is_file)
+    first_build = wheel.stat().st_mtime_ns
+
+    (project / 'module1.py').write_text('"""Changed"""\n__version__ = "0.1"\n')
+    wait_until(lambda: wheel.stat().st_mtime_ns != first_build)
+    wait_until(lambda: b'Changed' in ZipFile(wheel).read('module1.py'))
+
+    # Changing the version builds a wheel with a new name
+    (project / 'module1.py').write_text('"""Changed"""\n__version__ = "0.2"\n')
+    wait_until((project / 'dist' / 'module1-0.2-py3-none-any.whl').is_file)
+
+
+def read_record(dist_info):
+    with (dist_info / 'RECORD').open(encoding='utf-8', newline='') as f:
+        return {row[0]: row[1] for row in csv.reader(f)}
+
+
+def test_watch_install(project, tmp_path, stop_after):
+    dirs = {
+        'scripts': str(tmp_path / 'scripts'),
+        'purelib': str(tmp_path / 'site-packages'),
+        'data': str(tmp_path / 'data'),
+    }
+    site_pkgs = tmp_path / 'site-packages'
+    with patch('flit.install.get_dirs', return_value=dirs):
+        stop_after(
+            watch.watch_install, project / 'pyproject.toml',
+            lambda: Installer.from_ini_path(project / 'pyproject.toml', deps='none'),
+        )
+        dist_info = site_pkgs / 'module1-0.1.dist-info'
+        wait_until((dist_info / 'RECORD').is_file)
+
+        # Changed & new files are copied, and RECORD is updated
+        new_data = project / 'data' / 'share' / 'new.txt'
+        new_data.write_text('New\n')
+        wait_until((tmp_path / 'data' / 'share' / 'new.txt').is_file)
+        wait_until(lambda: str(tmp_path / 'data' / 'share' / 'new.txt') in read_record(dist_info))
+
+        # Deleted files are removed
+        new_data.unlink()
+        wait_until(lambda: not (tmp_path / 'data' / 'share' / 'new.txt').exists())
+        wait_until(lambda: str(tmp_path / 'data' / 'share' / 'new.txt') not in read_record(dist_info))
+
+        # A new version means installing again, and removing the old dist-info
+        (project / 'module1.py').write_text('"""Changed"""\n__version__ = "0.2"\n')
+        wait_until((site_pkgs / 'module1-0.2.dist-info' / 'RECORD').is_file)
+        wait_until(lambda: not dist_info.exists())
+        assert 'Changed' in (site_pkgs / 'module1.py').read_text()
+
+
+def test_watch_install_editable(project, tmp_path):
+    dirs = {
+        'scripts': str(tmp_path / 'scripts'),
+        'purelib': str(tmp_path / 'site-packages'),
+        'data': str(tmp_path / 'data'),
+    }
+    with patch('flit.install.get_dirs', return_value=dirs):
+        ins = Installer.from_ini_path(project / 'pyproject.toml', deps='none', pth=True)
+        ins.install_directly()
+        (project / 'module1.py').write_text('"""Changed"""\n__version__ = "0.1"\n')
+        ins.update_installed_files({str(project / 'module1.py')})
+
+    # The module is used from the source folder, so it isn't copied
+    assert not (tmp_path / 'site-packages' / 'module1.py').exists()
+    record = read_record(tmp_path / 'site-packages' / 'module1-0.1.dist-info')
+    assert len([p for p in record if p.endswith('METADATA')]) == 1
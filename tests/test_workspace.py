@@ -0,0 +1,154 @@
+from pathlib import Path
+import shutil
+from subprocess import CalledProcessError
+from unittest.mock import patch
+
+import pytest
+from testpath import assert_isfile, MockCommand
+
+import flit
+from flit import workspace
+
+samples_dir = Path(__file__).parent / 'samples'
+
+
+@pytest.fixture
+def ws_dir(tmp_path):
+    for sample in ['package1', 'module1_toml', 'extras']:
+        shutil.copytree(samples_dir / sample, tmp_path / 'projects' / sample)
+    return tmp_path
+
+
+def test_discover_projects(ws_dir):
+    found = workspace.discover_projects(['projects/*'], root=ws_dir)
+    assert [p.parent.name for p in found] == ['extras', 'module1_toml', 'package1']
+
+    list_file = ws_dir / 'projects.txt'
+    list_file.write_text(
+        "# Some comment\n"
+        "projects/package1\n"
+        "\n"
+        "projects/module1_toml/pyproject.toml\n"
+        "projects/package1/\n"  # Duplicate
+        "projects/nonexistant\n"
+    )
+    found = workspace.discover_projects(list_file=list_file)
+    assert [p.parent.name for p in found] == ['package1', 'module1_toml']
+
+    with pytest.raises(workspace.NoProjectsError):
+        workspace.discover_projects(['nothing/*'], root=ws_dir)
+
+
+def test_build_projects(ws_dir):
+    broken = ws_dir / 'projects' / 'broken'
+    broken.mkdir()
+    (broken / 'pyproject.toml').write_text('[project]\n')
+
+    ini_paths = workspace.discover_projects(['projects/*'], root=ws_dir)
+    results = workspace.build_projects(ini_paths, formats={'wheel'}, jobs=2)
+
+    assert [r.ini_path for r in results] == ini_paths
+    assert [r.ok for r in results] == [False, True, True, True]
+    assert any('name must be specified' in msg for (_, _, msg) in results[0].logs)
+    for r in results[1:]:
+        assert [f.suffix for f in r.files] == ['.whl']
+        assert_isfile(r.files[0])
+
+
+def test_workspace_build_exit_status(ws_dir, monkeypatch):
+    monkeypatch.chdir(ws_dir)
+    flit.main(['workspace', 'build', '--format', 'wheel', 'projects/*'])
+
+    broken = ws_dir / 'projects' / 'broken'
+    broken.mkdir()
+    (broken / 'pyproject.toml').write_text('[project]\n')
+    with pytest.raises(SystemExit) as exc_info:
+        flit.main(['workspace', 'build', '--format', 'wheel', 'projects/*'])
+    assert exc_info.value.code == 1
+
+
+def test_merged_requirements(ws_dir):
+    from flit.install import Installer
+
+    # package1 requires nothing, 'extras' requires toml; make module1 require
+    # both toml and package1, which is part of the workspace.
+    pyproj = ws_dir / 'projects' / 'module1_toml' / 'pyproject.toml'
+    pyproj.write_text(pyproj.read_text().replace(
+        '[project]\n', '[project]\ndependencies = ["toml", "Package1 >=0.1"]\n'
+    ))
+    installers = [
+        Installer.from_ini_path(p, user=False, deps='production')
+        for p in workspace.discover_projects(['projects/*'], root=ws_dir)
+    ]
+    assert workspace.merged_requirements(installers) == ['toml ;']
+
+
+def test_install_projects_one_pip_call(ws_dir):
+    ini_paths = workspace.discover_projects(['projects/*'], root=ws_dir)
+    with MockCommand('mock_python') as mock_py:
+        workspace.install_projects(
+            ini_paths, only_deps=True, python='mock_python', user=False, deps='all'
+        )
+    calls = mock_py.get_calls()
+    assert len(calls) == 1
+    assert calls[0]['argv'][1:5] == ['-m', 'pip', 'install', '-r']
+
+
+def test_install_projects_failures(ws_dir, monkeypatch):
+    from flit.install import Installer
+    broken = ws_dir / 'projects' / 'broken'
+    broken.mkdir()
+    (broken / 'pyproject.toml').write_text('[project]\n')
+
+    installed = []
+
+    def fake_install(self):
+        if self.directory.name == 'extras':
+            raise RuntimeError("Install failed")
+        installed.append(self.directory.name)
+
+    ini_paths = workspace.discover_projects(['projects/*'], root=ws_dir)
+    with MockCommand('mock_python'), patch.object(Installer, 'install', fake_install):
+        results = workspace.install_projects(
+            ini_paths, python='mock_python', user=False, deps='all'
+        )
+    # The other projects are still installed
+    assert [r.ok for r in results] == [False, False, True, True]
+    assert installed == ['module1_toml', 'package1']
+
+    monkeypatch.chdir(ws_dir)
+    with MockCommand('mock_python'), patch.object(Installer, 'install', fake_install), \
+            pytest.raises(SystemExit) as exc_info:
+        flit.main(['workspace', 'install', '--python', 'mock_python', 'projects/*'])
+    assert exc_info.value.code == 1
+
+
+def test_install_projects_requirements_fail(ws_dir, monkeypatch, caplog):
+    from flit.install import Installer
+    installed = []
+
+    def fail_pip(self, requirements):
+        raise CalledProcessError(1, ['pip', 'install'])
+
+    ini_paths = workspace.discover_projects(['projects/*'], root=ws_dir)
+    with patch.object(Installer, 'pip_install_requirements', fail_pip), \
+            patch.object(Installer, 'install', lambda self: installed.append(self)):
+        results = workspace.install_projects(
+            ini_paths, python='mock_python', user=False, deps='all'
+        )
+        assert [r.ok for r in results] == [False, False, False]
+        assert installed == []
+        assert 'FAILED to install workspace requirements' in caplog.text
+
+        monkeypatch.chdir(ws_dir)
+        with MockCommand('mock_python'), pytest.raises(SystemExit) as exc_info:
+            flit.main(['workspace', 'install', '--python', 'mock_python', 'projects/*'])
+        assert exc_info.value.code == 1
+
+
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_build_jobs_must_be_positive(value, capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        flit.main(['workspace', 'build', '-j', value, 'projects/*'])
+    assert exc_info.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err